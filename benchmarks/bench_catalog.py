@@ -0,0 +1,109 @@
+"""
+Catalog index: build, query, save and load times.
+
+    python benchmarks/bench_catalog.py [--records N]
+
+Builds a CatalogIndex over synthetic records whose people, licenses and
+source tags are drawn from pools, so that lookups return a realistic
+handful of records, and compares lookups against a linear scan over the
+records.  The records are generated on the fly and not kept.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from matmeta.catalog import CatalogIndex, terms
+
+from synthetic import make_person
+
+
+def make_catalog(count, seed=0):
+    rng = random.Random(seed)
+    people = [
+        dict(make_person(rng, i), orcid='0000-%04d-%04d' % divmod(i, 10000))
+        for i in range(max(count // 4, 10))
+    ]
+    tags = ['tag%d' % i for i in range(1000)]
+    for index in range(count):
+        authors = rng.sample(people, 3)
+        yield {
+            'title': 'Dataset %d' % index,
+            'source': {'name': 'source', 'tags': rng.sample(tags, 2)},
+            'authors': authors,
+            'data_contacts': authors[:1],
+            'data_contributors': [rng.choice(people)],
+            'licenses': [{'name': 'CC-BY', 'url': 'http://example.org/license/%d' % (index % 20)}],
+            'links': {'landing_page': 'http://example.org/dataset/%d' % index},
+        }
+
+
+def _best(function, repeat=1000):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--scan', type=int, default=100000,
+                        help='number of records in the linear scan baseline')
+    args = parser.parse_args()
+
+    index = CatalogIndex()
+    start = time.perf_counter()
+    for record_id, record in enumerate(make_catalog(args.records)):
+        index.add(record_id, record)
+    build = time.perf_counter() - start
+    print('build      %10.2f s (%.1f us/record)' % (build, build * 1e6 / args.records))
+
+    sample = list(make_catalog(args.scan))
+    person = random.Random(1).choice(sample)['authors'][0]
+    queries = [
+        ('orcid', lambda: index.lookup('orcid', person['orcid'])),
+        ('family', lambda: index.lookup('family_name', person['family_name'].upper())),
+        ('link', lambda: index.lookup('link', 'http://example.org/dataset/7')),
+        ('tag+orcid', lambda: index.query(source_tag='tag1', orcid=person['orcid'])),
+        ('license', lambda: index.count('license_url', 'http://example.org/license/3')),
+    ]
+    for name, query in queries:
+        result = query()
+        print('%-10s %10.1f us (%d matches)' % (
+            name, _best(query) * 1e6, result if isinstance(result, int) else len(result)
+        ))
+    scan = _best(lambda: [
+        i for i, record in enumerate(sample) if ('orcid', person['orcid']) in terms(record)
+    ], repeat=1)
+    print('scan       %10.1f ms (linear scan of %d records for one ORCID)' % (scan * 1e3, args.scan))
+    del sample
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'catalog.index')
+    try:
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter() - start
+        del index
+        start = time.perf_counter()
+        loaded = CatalogIndex.load(path)
+        load = time.perf_counter() - start
+        assert len(loaded) == args.records
+        print('save       %10.2f s (%.1f MiB)' % (saved, os.path.getsize(path) / 2.0 ** 20))
+        print('load       %10.2f s' % load)
+        start = time.perf_counter()
+        loaded.remove(0)
+        print('first edit %10.2f s (rebuilds the per-record table)' % (time.perf_counter() - start))
+    finally:
+        os.remove(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
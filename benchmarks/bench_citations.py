@@ -0,0 +1,93 @@
+"""
+Citation formatting: direct vs. a cache keyed by the citation's hash.
+
+    python benchmarks/bench_citations.py [--records N] [--citations N]
+
+"hashed" is the LRU cache citations used to keep: every call dumps the
+citation to canonical JSON and hashes it to look up the formatted string,
+which costs more than formatting it.  "direct" formats every citation.
+Both are timed per citation and per MDF record.
+"""
+
+import argparse
+from collections import OrderedDict
+import hashlib
+import json
+import time
+
+from matmeta import citations
+from matmeta.payload_metaclass import MDFPayload
+
+from synthetic import make_records
+
+
+class HashedFormatter(citations.CitationFormatter):
+    """
+    The removed cache, for comparison.
+    """
+
+    def __init__(self, style=citations.DEFAULT_STYLE, maxsize=4096):
+        super(HashedFormatter, self).__init__(style)
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+
+    def format(self, citation):
+        key = hashlib.sha1(json.dumps(
+            citation, sort_keys=True, separators=(',', ':'), default=str
+        ).encode('utf-8')).hexdigest()
+        try:
+            output = self._cache[key]
+        except KeyError:
+            output = self._cache[key] = self.style.format(citation)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+        return output
+
+
+def _best(run, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=300)
+    parser.add_argument('--citations', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    records = make_records(args.records, citations=args.citations)
+    references = [citation for record in records for citation in record['citations']]
+
+    def format_all(formatter):
+        for citation in references:
+            formatter.format(citation)
+
+    def mdf(formatter):
+        citations._formatters[formatter.style.name] = formatter
+        for record in records:
+            MDFPayload(**record).metapayload
+
+    shared = citations.get_formatter()
+    timings = {}
+    try:
+        for name, formatter in (('hashed', HashedFormatter()), ('direct', citations.CitationFormatter())):
+            per_citation = _best(lambda: format_all(formatter), args.repeat)
+            per_record = _best(lambda: mdf(formatter), args.repeat)
+            timings[name] = per_record
+            print('%-8s %8.2f us/citation %8.1f us/MDF record' % (
+                name, per_citation * 1e6 / len(references), per_record * 1e6 / args.records
+            ))
+    finally:
+        citations._formatters[shared.style.name] = shared
+    print('speedup  %8.2fx' % (timings['hashed'] / timings['direct']))
+
+
+if __name__ == '__main__':
+    main()
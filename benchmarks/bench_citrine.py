@@ -0,0 +1,40 @@
+"""
+Citrine emission: direct dict emitter vs. the pypif reference path.
+
+    python benchmarks/bench_citrine.py [--records N] [--authors N] [--citations N]
+"""
+
+import argparse
+import time
+
+from matmeta.payload_metaclass import CITPayload
+
+from synthetic import make_records
+
+
+def _time(payloads, attribute):
+    start = time.perf_counter()
+    for payload in payloads:
+        getattr(payload, attribute)
+    return (time.perf_counter() - start) * 1e6 / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--authors', type=int, default=5)
+    parser.add_argument('--citations', type=int, default=3)
+    args = parser.parse_args()
+    payloads = [
+        CITPayload(**record)
+        for record in make_records(args.records, authors=args.authors, citations=args.citations)
+    ]
+    direct = _time(payloads, 'metapayload')
+    reference = _time(payloads, 'reference_metapayload')
+    print('direct emitter:  %8.1f us/record' % direct)
+    print('pypif reference: %8.1f us/record' % reference)
+    print('speedup:         %8.2fx' % (reference / direct))
+
+
+if __name__ == '__main__':
+    main()
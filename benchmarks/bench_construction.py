@@ -0,0 +1,75 @@
+"""
+Per-record construction cost with and without the cached service registry.
+
+    python benchmarks/bench_construction.py [--records N]
+
+The "uncached" run swaps in a registry that rebuilds the merged requirements
+and field template on every lookup, which is what every payload constructor
+used to do.  It is bound in every matmeta module that imported the
+registry (payload_metaclass, validation, ...), not only payload_metaclass.
+"""
+
+import argparse
+import sys
+import time
+
+from matmeta import payload_metaclass as pm
+from matmeta.frozen import freeze
+from matmeta.services import ServiceRegistry, _common_payload_fields
+
+from synthetic import make_records
+
+
+class UncachedRegistry(ServiceRegistry):
+    def requirements(self, services=None):
+        return self._build_requirements(self.resolve(services))
+
+    def all_fields(self):
+        return freeze(_common_payload_fields())
+
+
+def _bind_registry(old, new):
+    """
+    Replace old with new as the registry of every loaded matmeta module.
+    """
+    for name, module in list(sys.modules.items()):
+        if name.split('.')[0] == 'matmeta' and getattr(module, 'registry', None) is old:
+            module.registry = new
+
+
+def _run(records):
+    start = time.perf_counter()
+    for record in records:
+        for payload_class in (pm.CITPayload, pm.MDFPayload, pm.MCPayload):
+            payload_class(**record)
+        pm.MDFPayload(**record).metapayload
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    args = parser.parse_args()
+    records = make_records(args.records)
+
+    cached = pm.registry
+    uncached = UncachedRegistry()
+    for name in cached.services:
+        uncached.register(name, cached._services[name])
+
+    _bind_registry(cached, uncached)
+    try:
+        slow = _run(records)
+    finally:
+        _bind_registry(uncached, cached)
+    fast = _run(records)
+
+    per_record = 1e6 / args.records
+    print('records:            %d' % args.records)
+    print('uncached registry:  %8.1f us/record' % (slow * per_record))
+    print('cached registry:    %8.1f us/record' % (fast * per_record))
+    print('speedup:            %8.2fx' % (slow / fast))
+
+
+if __name__ == '__main__':
+    main()
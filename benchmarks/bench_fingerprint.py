@@ -0,0 +1,79 @@
+"""
+Repeat batch runs with a fingerprint cache: cold vs. warm throughput.
+
+    python benchmarks/bench_fingerprint.py [--records N] [--changed FRACTION]
+
+"uncached" runs emit_stream over the records without a cache; "cold" fills
+an empty FingerprintCache; "warm" runs again after --changed of the records
+were modified, so that only those are converted and the rest are read
+from the cache.  "warm, skip" passes skip_unchanged, as a job that only
+republishes changed records would, so unchanged payloads are not read.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from matmeta.batch import emit_stream
+from matmeta.fingerprint import FingerprintCache
+
+from synthetic import make_records
+
+
+def _run(records, cache=None, skip_unchanged=False):
+    changed = 0
+    for result in emit_stream(records, cache=cache, skip_unchanged=skip_unchanged):
+        changed += result.changed
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--authors', type=int, default=3)
+    parser.add_argument('--citations', type=int, default=2)
+    parser.add_argument('--changed', type=float, default=0.01)
+    args = parser.parse_args()
+    records = make_records(args.records, authors=args.authors, citations=args.citations)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'cache.sqlite')
+
+    try:
+        timings = {}
+        start = time.perf_counter()
+        _run(records)
+        timings['uncached'] = time.perf_counter() - start
+
+        with FingerprintCache(path) as cache:
+            start = time.perf_counter()
+            _run(records, cache)
+            timings['cold'] = time.perf_counter() - start
+
+        rng = random.Random(1)
+        for index in rng.sample(range(args.records), int(args.records * args.changed)):
+            records[index] = dict(records[index], description='changed')
+        with FingerprintCache(path) as cache:
+            start = time.perf_counter()
+            changed = _run(records, cache)
+            timings['warm'] = time.perf_counter() - start
+            size = cache.cache_info().size
+        with FingerprintCache(path) as cache:
+            start = time.perf_counter()
+            _run(records, cache, skip_unchanged=True)
+            timings['warm, skip'] = time.perf_counter() - start
+
+        for name in ('uncached', 'cold', 'warm', 'warm, skip'):
+            print('%-12s %10.0f records/s' % (name, args.records / timings[name]))
+        print('changed      %10d records' % changed)
+        for name in ('warm', 'warm, skip'):
+            print('speedup      %10.2fx (%s vs. uncached)' % (timings['uncached'] / timings[name], name))
+        print('cache        %10d entries, %.1f MiB' % (size, os.path.getsize(path) / 2.0 ** 20))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
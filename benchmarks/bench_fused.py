@@ -0,0 +1,60 @@
+"""
+All services at once: three payload constructions vs. emit_all.
+
+    python benchmarks/bench_fused.py [--records N] [--authors N] [--citations N]
+
+"separate" builds CITPayload, MDFPayload and MCPayload from each record and
+reads their metapayload, which copies and validates the inputs three times;
+"emit_all" validates once against the merged requirements and emits every
+service from one frozen copy of the inputs.
+"""
+
+import argparse
+import time
+
+from matmeta import payload_metaclass as pm
+from matmeta.fused import emit_all
+
+from synthetic import make_records
+
+PAYLOAD_CLASSES = (pm.CITPayload, pm.MDFPayload, pm.MCPayload)
+
+
+def _separate(records):
+    for record in records:
+        for payload_class in PAYLOAD_CLASSES:
+            payload_class(**record).metapayload
+
+
+def _fused(records):
+    for record in records:
+        emit_all(record)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=2000)
+    parser.add_argument('--authors', type=int, default=3)
+    parser.add_argument('--citations', type=int, default=2)
+    parser.add_argument('--licenses', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    records = make_records(
+        args.records, authors=args.authors, citations=args.citations, licenses=args.licenses
+    )
+
+    timings = {}
+    for name, run in (('separate', _separate), ('emit_all', _fused)):
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            run(records)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+        print('%-10s %8.1f us/record' % (name, best * 1e6 / args.records))
+    print('speedup    %8.2fx' % (timings['separate'] / timings['emit_all']))
+
+
+if __name__ == '__main__':
+    main()
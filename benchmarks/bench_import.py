@@ -0,0 +1,72 @@
+"""
+Cold-start import time, measured with python -X importtime.
+
+    python benchmarks/bench_import.py [--runs N] [--max-ms MS] [module ...]
+
+For each module (default: matmeta, matmeta.payload_metaclass and
+matmeta.cli) the cumulative import time is measured in fresh interpreters
+and the median is reported, together with any heavy dependency (pypif)
+that was imported.
+With --max-ms the script exits with status 1 if a median exceeds the budget,
+so it can guard against cold-start regressions.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pypif',)
+
+
+def import_profile(module):
+    """
+    Return ({module: cumulative microseconds}, [imported module names]) for
+    importing module in a fresh interpreter.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+        stderr=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        universal_newlines=True, check=True,
+    ).stderr
+    cumulative = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            cumulative[fields[2].strip()] = int(fields[1])
+        except ValueError:
+            continue  # the header line
+    return cumulative, list(cumulative)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        'modules', nargs='*', default=['matmeta', 'matmeta.payload_metaclass', 'matmeta.cli']
+    )
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--max-ms', type=float)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        times = []
+        imported = []
+        for _ in range(args.runs):
+            cumulative, imported = import_profile(module)
+            times.append(cumulative[module] / 1000.0)
+        median = statistics.median(times)
+        heavy = sorted(
+            name for name in imported if name.split('.')[0] in HEAVY_MODULES
+        )
+        print('%-30s %8.2f ms   heavy imports: %s' % (
+            module, median, ', '.join(heavy) or 'none'))
+        if args.max_ms is not None and median > args.max_ms:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
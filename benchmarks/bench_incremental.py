@@ -0,0 +1,56 @@
+"""
+Re-emission after a small edit: from scratch vs. PublishablePayload.apply_changes.
+
+    python benchmarks/bench_incremental.py [--authors N] [--citations N] [--edits N]
+
+A large record is emitted once, then edited repeatedly by adding one data
+contributor.  "full" builds a new payload and emits it, as callers had to
+before update() kept the cache current; "update" re-emits the affected
+sections and produces an RFC 6902 patch.
+"""
+
+import argparse
+import json
+import random
+import time
+
+from matmeta import payload_metaclass as pm
+
+from synthetic import make_person, make_record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--authors', type=int, default=200)
+    parser.add_argument('--citations', type=int, default=100)
+    parser.add_argument('--licenses', type=int, default=5)
+    parser.add_argument('--edits', type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    record = make_record(rng, authors=args.authors, citations=args.citations, licenses=args.licenses)
+    edits = [
+        {'data_contributors': record['data_contributors'] + [make_person(rng, 10 ** 6 + i)]}
+        for i in range(args.edits)
+    ]
+
+    print('%-26s %12s %12s %10s %14s' % ('service', 'full us', 'update us', 'speedup', 'patch/doc bytes'))
+    for payload_class in (pm.CITPayload, pm.MDFPayload, pm.MCPayload):
+        payload = payload_class(**record)
+        payload.metapayload
+        start = time.perf_counter()
+        for changes in edits:
+            payload_class(**dict(record, **changes)).metapayload
+        full = (time.perf_counter() - start) / args.edits
+
+        start = time.perf_counter()
+        for changes in edits:
+            patch = payload.apply_changes(changes)
+        update = (time.perf_counter() - start) / args.edits
+
+        print('%-26s %12.1f %12.1f %9.1fx %7d/%d' % (
+            payload_class.service, full * 1e6, update * 1e6, full / update,
+            len(json.dumps(patch)), len(json.dumps(payload.metapayload))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Ingest throughput against the local stub server.
+
+    python benchmarks/bench_ingest.py [--records N] [--latency SECONDS]
+
+Compares a serial urllib upload loop (one request and connection per
+record, as hand-written ingest scripts do) with matmeta.ingest at several
+concurrency levels, with and without grouping.
+"""
+
+import argparse
+import json
+import time
+from urllib.request import Request, urlopen
+
+from matmeta import payload_metaclass as pm
+from matmeta.ingest import Endpoint, ingest
+from matmeta.stub_server import StubServer
+
+from synthetic import make_records
+
+
+def _serial(payloads, url):
+    for payload in payloads:
+        request = Request(
+            url, data=json.dumps(payload.metapayload).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        urlopen(request).read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005)
+    args = parser.parse_args()
+    payloads = [pm.MDFPayload(**record) for record in make_records(args.records)]
+    for payload in payloads:
+        payload.metapayload  # emit before timing
+
+    runs = [('serial urllib', None)]
+    runs += [('ingest, concurrency %d' % n, {'concurrency': n}) for n in (1, 8, 32)]
+    runs += [('ingest, concurrency 8, batches of 25', {'concurrency': 8, 'batch_size': 25})]
+
+    with StubServer(latency=args.latency) as server:
+        for name, options in runs:
+            del server.requests[:]
+            start = time.perf_counter()
+            if options is None:
+                _serial(payloads, server.url)
+            else:
+                endpoint = Endpoint(server.url, batch_size=options.pop('batch_size', 1))
+                results = ingest(payloads, {'materials_data_facility': endpoint}, **options)
+                assert all(result.ok for result in results)
+            elapsed = time.perf_counter() - start
+            print('%-40s %8.0f records/s  (%d connections)' % (
+                name, args.records / elapsed, server.connection_count))
+
+
+if __name__ == '__main__':
+    main()
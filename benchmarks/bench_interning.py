@@ -0,0 +1,101 @@
+"""
+Batch conversion with and without interning of repeated sub-objects.
+
+    python benchmarks/bench_interning.py [--records N] [--people N] [--references N]
+
+The records draw their people, licenses and citations from small pools, as
+in a catalog whose datasets share contributors and cite the same papers.
+"plain" runs emit_stream on them as is; "interned" passes an Interner, so
+each distinct entity is stored once and its Citrine and MDF forms are
+converted once.  The memory figures are what a run that loads the records
+from JSON Lines and keeps them and their payloads retains.
+"""
+
+import argparse
+import copy
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from matmeta.batch import emit_stream, read_jsonl
+from matmeta.interning import Interner
+
+from synthetic import make_person, make_record
+
+
+def make_catalog(count, people, references, seed=0):
+    """
+    Records whose people and citations are copies of pool entries.
+    """
+    rng = random.Random(seed)
+    person_pool = [make_person(rng, i) for i in range(people)]
+    citation_pool = make_record(rng, citations=references)['citations']
+    records = []
+    for _ in range(count):
+        record = make_record(rng, authors=0, citations=0)
+        authors = rng.sample(person_pool, 3)
+        record['authors'] = copy.deepcopy(authors)
+        record['data_contacts'] = copy.deepcopy(authors[:1])
+        record['data_contributors'] = copy.deepcopy(rng.sample(person_pool, 5))
+        record['citations'] = copy.deepcopy(rng.sample(citation_pool, 4))
+        records.append(record)
+    return records
+
+
+def _load(lines, interner):
+    records = read_jsonl(lines)
+    if interner is None:
+        return list(records)
+    return [interner.intern_record(record) for record in records]
+
+
+def _run(lines, interner):
+    """
+    Load and convert the records, keeping both (as a bulk job that indexes
+    or uploads its results afterwards would).
+    """
+    records = _load(lines, interner)
+    return records, [
+        result.payloads for result in emit_stream(records, interner=interner)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--people', type=int, default=200)
+    parser.add_argument('--references', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    lines = [
+        json.dumps(record)
+        for record in make_catalog(args.records, args.people, args.references)
+    ]
+
+    timings = {}
+    for name in ('plain', 'interned'):
+        best = None
+        for _ in range(args.repeat):
+            interner = Interner() if name == 'interned' else None
+            start = time.perf_counter()
+            _run(lines, interner)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+
+        gc.collect()
+        tracemalloc.start()
+        kept = _run(lines, Interner() if name == 'interned' else None)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        print('%-10s %8.1f us/record %8.2f KiB/record retained' % (
+            name, best * 1e6 / args.records, size / 1024.0 / args.records
+        ))
+    print('speedup    %8.2fx' % (timings['plain'] / timings['interned']))
+
+
+if __name__ == '__main__':
+    main()
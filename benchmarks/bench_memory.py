@@ -0,0 +1,103 @@
+"""
+Memory and garbage collector cost of Human and payload records.
+
+    python benchmarks/bench_memory.py [--records N]
+
+Compares the compact Record-based classes with the previous
+self.__dict__ = self implementation, which made every instance a reference
+cycle that only the cyclic garbage collector could free.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from matmeta.payload_metaclass import Human, MCPayload
+
+
+class LegacyHuman(dict):
+    def __init__(self, given_name, family_name, email='', institution=''):
+        super(LegacyHuman, self).__init__()
+        self.__dict__ = self
+        self['given_name'] = given_name
+        self['family_name'] = family_name
+        self['email'] = email
+        self['institution'] = institution
+
+
+class LegacyPayload(dict):
+    def __init__(self, **kwargs):
+        self.__dict__ = self
+        super(LegacyPayload, self).__init__()
+        for key in ('source', 'description'):
+            if key in kwargs:
+                self[key] = kwargs[key]
+
+
+def _make_human(cls, i):
+    return cls('Given%d' % i, 'Family%d' % i, email='p%d@example.org' % i)
+
+
+def _make_payload(cls, i):
+    return cls(source={'name': 'source %d' % i}, description='description')
+
+
+def _memory_per_instance(factory, cls, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    instances = [factory(cls, i) for i in range(count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del instances
+    return size / float(count)
+
+
+def _gc_cost(factory, cls, count, batch=1000):
+    """
+    Create and drop count instances, batch at a time, and report the cyclic
+    collections that ran and the time spent in them.
+    """
+    gc.collect()
+    pauses = []
+    starts = {}
+
+    def callback(phase, info):
+        if phase == 'start':
+            starts[info['generation']] = time.perf_counter()
+        else:
+            pauses.append(time.perf_counter() - starts.pop(info['generation']))
+
+    gc.callbacks.append(callback)
+    try:
+        for start in range(0, count, batch):
+            instances = [factory(cls, i) for i in range(start, start + batch)]
+            del instances
+        collected = gc.collect()
+    finally:
+        gc.callbacks.remove(callback)
+    return len(pauses), sum(pauses), collected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=100000)
+    args = parser.parse_args()
+
+    print('%-14s %14s %14s %14s %14s' % (
+        'class', 'bytes/instance', 'collections', 'gc time (ms)', 'left for gc'))
+    for factory, classes in (
+        (_make_human, (LegacyHuman, Human)),
+        (_make_payload, (LegacyPayload, MCPayload)),
+    ):
+        for cls in classes:
+            size = _memory_per_instance(factory, cls, args.records)
+            collections, pause, collected = _gc_cost(factory, cls, args.records)
+            print('%-14s %14.0f %14d %14.1f %14d' % (
+                cls.__name__, size, collections, pause * 1e3, collected))
+
+
+if __name__ == '__main__':
+    main()
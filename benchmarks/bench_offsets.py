@@ -0,0 +1,80 @@
+"""
+Reconverting a few records of a large JSON Lines catalog: rescan vs. index.
+
+    python benchmarks/bench_offsets.py [--records N] [--selected K]
+
+Writes N synthetic records to a temporary file and converts K of them
+(picked at random by id), first by reading the whole file with read_jsonl
+and skipping the other records, then through an IndexedJSONL, once while
+its sidecar index is built and once reusing it.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from matmeta.batch import emit_stream, read_jsonl
+from matmeta.offsets import IndexedJSONL
+
+from synthetic import make_record
+
+ID_KEY = 'links.landing_page'
+
+
+def _write(path, count):
+    rng = random.Random(0)
+    with open(path, 'w') as fp:
+        for index in range(count):
+            record = make_record(rng)
+            record['links'] = {'landing_page': 'http://example.org/dataset/%d' % index}
+            fp.write(json.dumps(record) + '\n')
+
+
+def _rescan(path, wanted):
+    with open(path) as fp:
+        records = (
+            record for record in read_jsonl(fp)
+            if record['links']['landing_page'] in wanted
+        )
+        return sum(1 for _ in emit_stream(records, id_key=ID_KEY))
+
+
+def _indexed(path, wanted):
+    with IndexedJSONL(path, id_key=ID_KEY) as reader:
+        indexes, _ = reader.select(wanted)
+        return sum(1 for _ in emit_stream(reader.records(indexes), id_key=ID_KEY, indexes=indexes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=200000)
+    parser.add_argument('--selected', type=int, default=100)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'catalog.jsonl')
+    try:
+        _write(path, args.records)
+        wanted = set(
+            'http://example.org/dataset/%d' % index
+            for index in random.Random(1).sample(range(args.records), args.selected)
+        )
+        timings = {}
+        for name, function in (('rescan', _rescan), ('index, cold', _indexed), ('index, warm', _indexed)):
+            start = time.perf_counter()
+            assert function(path, wanted) == args.selected
+            timings[name] = time.perf_counter() - start
+        print('input        %10.1f MiB, %d records' % (os.path.getsize(path) / 2.0 ** 20, args.records))
+        print('sidecar      %10.1f MiB' % (os.path.getsize(path + '.idx') / 2.0 ** 20))
+        for name in ('rescan', 'index, cold', 'index, warm'):
+            print('%-12s %10.3f s' % (name, timings[name]))
+        print('speedup      %10.1fx (warm index vs. rescan)' % (timings['rescan'] / timings['index, warm']))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Throughput of emit_parallel from 1 to N worker processes.
+
+    python benchmarks/bench_parallel.py [--records N] [--max-workers N]
+"""
+
+import argparse
+import os
+import time
+
+import matmeta
+from matmeta.parallel import emit_parallel
+
+from synthetic import make_records
+
+
+def _throughput(results, count):
+    start = time.perf_counter()
+    for result in results:
+        assert result.ok, result.errors
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=5000)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--authors', type=int, default=10)
+    args = parser.parse_args()
+    records = make_records(args.records, authors=args.authors)
+
+    serial = _throughput(matmeta.emit_stream(records), args.records)
+    print('%-10s %12s %8s' % ('workers', 'records/s', 'speedup'))
+    print('%-10s %12.0f %8.2f' % ('serial', serial, 1.0))
+    workers = 1
+    while workers <= args.max_workers:
+        rate = _throughput(
+            emit_parallel(records, workers=workers, chunk_size=args.chunk_size),
+            args.records
+        )
+        print('%-10d %12.0f %8.2f' % (workers, rate, rate / serial))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Serializing emitted payloads: json.dumps vs. the serializer backends.
+
+    python benchmarks/bench_serializers.py [--records N] [--authors N] [--citations N]
+
+Times turning already emitted metadata into UTF-8 JSON bytes for each
+service: json.dumps(...).encode() as callers do today, and
+metapayload_bytes() with each installed backend, with and without sorted
+keys.  For Citrine it also times the pypif reference path, which
+serializes twice (pif.dumps, json.loads) before the caller's json.dumps.
+"""
+
+import argparse
+import json
+import time
+
+from matmeta import payload_metaclass as pm
+from matmeta import serializers
+
+from synthetic import make_records
+
+
+def _time(payloads, function, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for payload in payloads:
+            function(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6 / len(payloads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--authors', type=int, default=10)
+    parser.add_argument('--citations', type=int, default=5)
+    args = parser.parse_args()
+    records = make_records(args.records, authors=args.authors, citations=args.citations)
+
+    for cls in (pm.CITPayload, pm.MDFPayload, pm.MCPayload):
+        payloads = [cls(**record) for record in records]
+        for payload in payloads:
+            payload.metapayload  # emit before timing
+        print('%s (%.0f bytes)' % (cls.service, sum(
+            len(payload.metapayload_bytes()) for payload in payloads) / len(payloads)))
+        baseline = _time(payloads, lambda payload: json.dumps(payload.metapayload).encode('utf-8'))
+        print('  %-28s %8.1f us/record' % ('json.dumps().encode()', baseline))
+        for backend in serializers.available():
+            for sort_keys in (True, False):
+                cost = _time(payloads, lambda payload: payload.metapayload_bytes(backend, sort_keys))
+                print('  %-28s %8.1f us/record  %5.2fx' % (
+                    'bytes, %s%s' % (backend, ', sorted' if sort_keys else ''),
+                    cost, baseline / cost))
+        if cls is pm.CITPayload:
+            cost = _time(
+                payloads[:200],
+                lambda payload: json.dumps(payload.reference_metapayload).encode('utf-8'),
+                repeat=1
+            )
+            print('  %-28s %8.1f us/record  (emits and serializes 3 times)' % (
+                'pypif reference path', cost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Load test of the HTTP conversion service on localhost.
+
+    python benchmarks/bench_server.py [--requests N] [--concurrency C] [--workers W]
+
+C keep-alive clients send N conversion requests in total, as fast as they
+are answered, to
+
+  - a thin synchronous wrapper (http.server, converting each request in its
+    handler thread), as the internal tools use today
+  - ConversionServer without batching (batch_size 1)
+  - ConversionServer with micro-batching
+
+and report throughput and client-side latency percentiles.
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from matmeta.batch import emit_record
+from matmeta.server import ConversionServer
+
+from synthetic import make_records
+
+
+class _WrapperHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        record = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        payloads, errors = emit_record(record)
+        data = json.dumps({'payloads': payloads, 'errors': errors}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class ThinWrapper(object):
+    def __enter__(self):
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _WrapperHandler)
+        self.url = 'http://127.0.0.1:%d' % self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+async def _client(port, bodies, latencies):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for body in bodies:
+            start = time.perf_counter()
+            writer.write((
+                'POST /emit HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+                'Content-Length: %d\r\n\r\n' % len(body)
+            ).encode('latin-1') + body)
+            status = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line == b'\r\n':
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            assert status.split()[1] == b'200', status
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+def _load(url, bodies, concurrency):
+    port = int(url.rsplit(':', 1)[1])
+    latencies = []
+
+    async def run():
+        await asyncio.gather(*[
+            _client(port, bodies[index::concurrency], latencies) for index in range(concurrency)
+        ])
+
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(bodies) / elapsed, [
+        1000.0 * latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+        for fraction in (0.5, 0.99)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=4000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--max-wait', type=float, default=0.002)
+    args = parser.parse_args()
+    bodies = [json.dumps(record).encode('utf-8') for record in make_records(args.requests)]
+
+    runs = [
+        ('thin wrapper (threads)', ThinWrapper),
+        ('service, batch_size 1', lambda: ConversionServer(
+            batch_size=1, max_wait=0, workers=args.workers)),
+        ('service, batch_size %d' % args.batch_size, lambda: ConversionServer(
+            batch_size=args.batch_size, max_wait=args.max_wait, workers=args.workers)),
+    ]
+    for name, make_server in runs:
+        with make_server() as server:
+            _load(server.url, bodies[:args.concurrency * 4], args.concurrency)  # warm up
+            throughput, (p50, p99) = _load(server.url, bodies, args.concurrency)
+            batching = ''
+            if isinstance(server, ConversionServer):
+                batching = '  mean batch %.1f' % server.metrics.snapshot()['mean_batch_size']
+        print('%-28s %8.0f requests/s  p50 %7.1f ms  p99 %7.1f ms%s' % (
+            name, throughput, p50, p99, batching))
+
+
+if __name__ == '__main__':
+    main()
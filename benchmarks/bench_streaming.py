@@ -0,0 +1,50 @@
+"""
+Peak memory and time of writing large payloads: json.dump of metapayload
+vs. the streaming PublishablePayload.dump.
+
+    python benchmarks/bench_streaming.py [--people N N ...]
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from matmeta import payload_metaclass as pm
+
+from synthetic import make_record
+
+
+class _Sink(object):
+    def write(self, chunk):
+        pass
+
+
+def _measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        function()
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--people', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print('%-10s %8s %22s %22s' % ('service', 'people', 'json.dump ms / peak MB', 'dump ms / peak MB'))
+    for people in args.people:
+        record = make_record(authors=people, citations=people // 10, licenses=1)
+        for payload_class in (pm.CITPayload, pm.MDFPayload):
+            built = _measure(lambda: json.dump(payload_class(**record).metapayload, _Sink()))
+            streamed = _measure(lambda: payload_class(**record).dump(_Sink()))
+            print('%-10s %8d %12.0f / %7.1f %12.0f / %7.1f' % (
+                payload_class.__name__, people,
+                built[0] * 1e3, built[1] / 2 ** 20, streamed[0] * 1e3, streamed[1] / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
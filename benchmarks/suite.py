@@ -0,0 +1,167 @@
+"""
+Benchmark suite for templates, validation, construction and emission.
+
+    python benchmarks/suite.py [--records N] [--authors N] [--citations N]
+        [--licenses N] [--repeat N] [--output results.json]
+        [--compare baseline.json] [--tolerance 0.2]
+
+Every case runs over the same synthetic records (see synthetic.py) and is
+repeated; the fastest and median runs are reported in microseconds per
+record.  --output writes the results as JSON, and --compare checks them
+against an earlier JSON file, exiting with status 1 if any case is more
+than --tolerance slower than its baseline.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from matmeta import payload_metaclass as pm
+
+from synthetic import make_records
+
+PAYLOAD_CLASSES = (pm.CITPayload, pm.MDFPayload, pm.MCPayload)
+
+
+def _template_case(records):
+    def run():
+        for _ in records:
+            pm.get_common_payload_template()
+    return run
+
+
+def _validate_case(records):
+    required = pm.get_common_payload_template()['required_fields']
+
+    def run():
+        for record in records:
+            pm._validate_inputs(record, required)
+    return run
+
+
+def _construct_case(payload_class, records):
+    def run():
+        for record in records:
+            payload_class(**record)
+    return run
+
+
+def _metapayload_case(payload_class, records):
+    # metapayload is cached per payload, so every run needs fresh payloads;
+    # they are built before the clock starts
+    def setup():
+        return [payload_class(**record) for record in records]
+
+    def run(payloads):
+        for payload in payloads:
+            payload.metapayload
+    return setup, run
+
+
+def cases(records):
+    """
+    Return [(name, setup, run)].  setup() returns the argument for run, or
+    is None when run takes no argument.
+    """
+    output = [
+        ('get_common_payload_template', None, _template_case(records)),
+        ('_validate_inputs', None, _validate_case(records)),
+    ]
+    for payload_class in PAYLOAD_CLASSES:
+        output.append((
+            '%s.__init__' % payload_class.__name__,
+            None, _construct_case(payload_class, records)
+        ))
+    for payload_class in PAYLOAD_CLASSES:
+        setup, run = _metapayload_case(payload_class, records)
+        output.append(('%s.metapayload' % payload_class.__name__, setup, run))
+    return output
+
+
+def time_case(setup, run, repeat):
+    times = []
+    for _ in range(repeat):
+        if setup is None:
+            start = time.perf_counter()
+            run()
+        else:
+            argument = setup()
+            start = time.perf_counter()
+            run(argument)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_suite(records=1000, authors=3, citations=2, licenses=1, repeat=5, seed=0):
+    sizes = {'authors': authors, 'citations': citations, 'licenses': licenses}
+    data = make_records(records, seed=seed, **sizes)
+    results = {}
+    for name, setup, run in cases(data):
+        times = [1e6 * t / records for t in time_case(setup, run, repeat)]
+        results[name] = {
+            'min_us': min(times),
+            'median_us': statistics.median(times),
+        }
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': dict(sizes, records=records, repeat=repeat, seed=seed),
+        'results': results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Return [(case, baseline us, current us)] for the cases whose fastest
+    run is more than tolerance (a fraction) slower than the baseline's.
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline['results'].get(name)
+        if previous and result['min_us'] > previous['min_us'] * (1 + tolerance):
+            regressions.append((name, previous['min_us'], result['min_us']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000)
+    parser.add_argument('--authors', type=int, default=3)
+    parser.add_argument('--citations', type=int, default=2)
+    parser.add_argument('--licenses', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='baseline JSON file from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = run_suite(
+        records=args.records, authors=args.authors, citations=args.citations,
+        licenses=args.licenses, repeat=args.repeat, seed=args.seed
+    )
+    print('%-30s %12s %12s' % ('case', 'min us/rec', 'median'))
+    for name, result in report['results'].items():
+        print('%-30s %12.2f %12.2f' % (name, result['min_us'], result['median_us']))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(report, fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print('REGRESSION %s: %.2f -> %.2f us/record' % (name, before, after))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""
+Synthetic common payloads for the benchmarks.
+"""
+
+import random
+
+
+def make_person(rng, index):
+    return {
+        'given_name': 'Given%d' % index,
+        'family_name': 'Family%d' % rng.randint(0, 10 ** 6),
+        'email': 'person%d@example.org' % index,
+    }
+
+
+def make_record(rng=None, authors=3, citations=2, licenses=1):
+    """
+    Return a common payload that satisfies every service's requirements.
+    """
+    rng = rng or random.Random(0)
+    people = [make_person(rng, i) for i in range(authors)]
+    return {
+        'title': 'Synthetic dataset %d' % rng.randint(0, 10 ** 6),
+        'description': 'A synthetic dataset used for benchmarking.',
+        'source': {
+            'name': 'synthetic_%d' % rng.randint(0, 10 ** 6),
+            'producer': 'matmeta benchmarks',
+            'url': 'http://example.org/source',
+            'tags': ['synthetic', 'benchmark'],
+        },
+        'data_contacts': people[:1],
+        'data_contributors': people[1:] or people[:1],
+        'authors': people,
+        'links': {'landing_page': 'http://example.org/landing'},
+        'licenses': [
+            {
+                'name': 'License %d' % i,
+                'url': 'http://example.org/license/%d' % i,
+                'description': 'license description',
+                'tags': ['license'],
+            }
+            for i in range(licenses)
+        ],
+        'citations': [
+            {
+                'authors': [make_person(rng, j) for j in range(2)],
+                'year': str(1990 + i % 30),
+                'title': 'Reference %d' % i,
+                'journal': 'Journal of Synthetic Data',
+                'volume': str(i),
+                'issue': '1',
+                'page_location': '%d-%d' % (i, i + 10),
+            }
+            for i in range(citations)
+        ],
+    }
+
+
+def make_records(count, seed=0, **sizes):
+    rng = random.Random(seed)
+    return [make_record(rng, **sizes) for _ in range(count)]
@@ -0,0 +1,33 @@
+"""
+Emit metadata for materials data publication services from a common payload.
+
+Submodules are imported on first use, so that importing matmeta is cheap
+for short-lived processes.
+"""
+
+import importlib
+
+__version__ = '0.1.1'
+
+# public name -> module that defines it.  Names of submodules must not be
+# used, or the attribute would depend on whether the submodule was imported.
+_lazy_attributes = {
+    'emit_all': 'matmeta.fused',
+    'emit_stream': 'matmeta.batch',
+}
+
+__all__ = sorted(_lazy_attributes)
+
+
+def __getattr__(name):
+    try:
+        module = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_attributes))
@@ -0,0 +1,285 @@
+"""
+Streaming batch conversion of common payloads.
+
+emit_stream is a generator: it converts one record at a time and yields an
+EmitResult for each, so arbitrarily large inputs can be processed in
+constant memory.  Problems with a record are reported in its result instead
+of being raised, so one bad record does not stop a bulk job.
+
+Examples
+--------
+>>> with open('catalog.jsonl') as fp:
+...     for result in emit_stream(read_jsonl(fp), services=['citrine']):
+...         if result.ok:
+...             upload(result.payloads['citrine'])
+"""
+
+from collections import namedtuple
+import json
+
+from matmeta.fused import emit_all
+from matmeta.instrumentation import stage
+from matmeta.services import registry
+from matmeta.validation import ValidationError
+
+
+class InvalidRecord(namedtuple('InvalidRecord', ['line', 'error'])):
+    """
+    Placeholder yielded by read_jsonl for a line that is not valid JSON.
+    """
+    __slots__ = ()
+
+
+class OversizedRecord(namedtuple('OversizedRecord', ['line', 'size', 'limit'])):
+    """
+    Placeholder yielded by read_jsonl for a line longer than its max_size,
+    which is not parsed.
+    """
+    __slots__ = ()
+
+
+class EmitResult(namedtuple('EmitResult', ['index', 'record_id', 'payloads', 'errors', 'cached'],
+                            defaults=((),))):
+    """
+    The outcome of converting one record.
+
+    index:      position of the record in the input stream
+    record_id:  the record's id (see record_id), or index if there is none
+    payloads:   {service name: emitted payload} for each successful service
+    errors:     a list of error dictionaries, one per failed service
+    cached:     the services whose payloads came from a FingerprintCache
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def changed(self):
+        """
+        False if every payload came from the cache, i.e. the record is
+        unchanged since it was last converted.
+        """
+        return bool(self.errors) or any(
+            service not in self.cached for service in self.payloads
+        )
+
+    def error_report(self):
+        """
+        A JSON-serializable description of this result's errors.
+        """
+        return {
+            'index': self.index,
+            'id': self.record_id,
+            'errors': self.errors,
+        }
+
+
+def read_jsonl(fp, max_size=None, quarantine=None):
+    """
+    Yield one record per non-blank line of a JSON Lines file.
+
+    Lines that cannot be parsed are yielded as InvalidRecord instances.
+
+    args:
+        max_size:   if given, lines longer than this many characters are
+            not parsed, so that a giant record cannot exhaust memory, and
+            are yielded as OversizedRecord instances
+        quarantine: a file-like object that oversized lines are written to
+    """
+    for line_number, line in enumerate(fp, 1):
+        if not line.strip():
+            continue
+        if max_size is not None and len(line) > max_size:
+            size = len(line.rstrip('\r\n'))
+            if size > max_size:
+                if quarantine is not None:
+                    quarantine.write(line if line.endswith('\n') else line + '\n')
+                yield OversizedRecord(line=line_number, size=size, limit=max_size)
+                continue
+        try:
+            yield json.loads(line)
+        except ValueError as ex:
+            yield InvalidRecord(line=line_number, error=str(ex))
+
+
+def record_id(record, id_key=None, default=None):
+    """
+    Return the value at the dotted id_key path in record, or default.
+    """
+    if id_key is None:
+        return default
+    value = record
+    for part in id_key.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+def _error(service, ex):
+    error = {
+        'service': service,
+        'error': '%s: %s' % (type(ex).__name__, ex),
+    }
+    if isinstance(ex, ValidationError):
+        error['problems'] = [
+            {'keypath': problem.keypath, 'message': problem.message}
+            for problem in ex.problems
+        ]
+    return error
+
+
+@stage('record')
+def emit_record(record, services=None, interner=None):
+    """
+    Convert one record for each service.
+
+    args:
+        interner:   a matmeta.interning.Interner.  If given, the record's
+            people, licenses and citations are interned first.
+
+    return:
+        A (payloads, errors) tuple, as in EmitResult.
+    """
+    payloads = {}
+    errors = []
+    if isinstance(record, InvalidRecord):
+        errors.append({
+            'service': None,
+            'error': 'Invalid JSON on line %d: %s' % (record.line, record.error),
+        })
+        return payloads, errors
+    if isinstance(record, OversizedRecord):
+        errors.append({
+            'service': None,
+            'error': 'Record on line %d is %d characters long, over the limit of %d' % (
+                record.line, record.size, record.limit
+            ),
+        })
+        return payloads, errors
+    if not isinstance(record, dict):
+        errors.append({
+            'service': None,
+            'error': 'Expected a JSON object, got %s' % type(record).__name__,
+        })
+        return payloads, errors
+    if interner is not None:
+        record = interner.intern_record(record)
+    try:
+        return emit_all(record, services), errors
+    except Exception:
+        pass  # convert per service below, to tell which services fail
+    for service in registry.select(services):
+        try:
+            payloads[service] = registry.emitter(service)(**record).metapayload
+        except Exception as ex:
+            errors.append(_error(service, ex))
+    return payloads, errors
+
+
+def index_result(catalog, result, record):
+    """
+    Add record to the CatalogIndex catalog under result.record_id if it was
+    converted for at least one service.
+    """
+    if isinstance(record, dict) and (result.payloads or result.cached):
+        catalog.add(result.record_id, record)
+
+
+def _emit_cached(record, services, interner, cache, skip_unchanged=False, emit=emit_record):
+    """
+    emit_record, returning cached payloads where cache has them.
+
+    return:
+        A (payloads, errors, cached services) tuple.  If skip_unchanged is
+        true and every service is cached, payloads is empty.
+    """
+    if not isinstance(record, dict):
+        return emit(record, services, interner) + ((),)
+    services = registry.select(services)
+    try:
+        key = cache.key(record)
+    except (TypeError, ValueError):
+        return emit(record, services, interner) + ((),)
+    cached = cache.get(key, services, skip_complete=skip_unchanged)
+    if cached is None:
+        return {}, [], services
+    if len(cached) == len(services):
+        return cached, [], tuple(services)
+    missing = [service for service in services if service not in cached]
+    emitted, errors = emit(record, missing, interner)
+    cache.put(key, emitted)
+    payloads = {}
+    for service in services:
+        if service in cached:
+            payloads[service] = cached[service]
+        elif service in emitted:
+            payloads[service] = emitted[service]
+    return payloads, errors, tuple(service for service in services if service in cached)
+
+
+def emit_stream(records, services=None, id_key=None, start=0, interner=None,
+                cache=None, skip_unchanged=False, catalog=None, indexes=None,
+                profile=None):
+    """
+    Convert records one by one, yielding an EmitResult for each.
+
+    args:
+        records:    an iterable of common payload dictionaries (e.g. from
+            read_jsonl)
+        services:   a list of service names.  None means all services.
+        id_key:     dotted path of a field identifying each record, e.g.
+            'links.landing_page'.  The record's index is used if None or
+            if the field is missing.
+        start:      index of the first record (used when records is a slice
+            of a larger stream)
+        interner:   a matmeta.interning.Interner shared by the records, so
+            that repeated people, licenses and citations are stored and
+            converted once.  The output is the same without one.
+        cache:      a matmeta.fingerprint.FingerprintCache.  Payloads of
+            records converted before are taken from it (see
+            EmitResult.cached and EmitResult.changed), and new payloads are
+            added to it.  Failed conversions are not cached.
+        skip_unchanged: with a cache, yield the results of unchanged
+            records without their payloads, which are then not read from
+            the cache at all
+        catalog:    a matmeta.catalog.CatalogIndex.  Each record converted
+            for at least one service is indexed under its record id.
+        indexes:    the index of each record, when records is a selection
+            from a larger stream (e.g. from matmeta.offsets.IndexedJSONL),
+            instead of consecutive indexes from start
+        profile:    a started matmeta.memprofile.MemoryProfile.  Each
+            record is converted for one service at a time, and the peak
+            memory and emitted size of each conversion are added to it.
+    """
+    emit = emit_record if profile is None else profile.emit_record
+    if indexes is None:
+        numbered = enumerate(records, start)
+    else:
+        numbered = zip(indexes, records)
+    try:
+        for index, record in numbered:
+            cached = ()
+            if cache is None:
+                payloads, errors = emit(record, services, interner)
+            else:
+                payloads, errors, cached = _emit_cached(
+                    record, services, interner, cache, skip_unchanged, emit
+                )
+            result = EmitResult(
+                index=index,
+                record_id=record_id(record, id_key, default=index),
+                payloads=payloads,
+                errors=errors,
+                cached=cached,
+            )
+            if catalog is not None:
+                index_result(catalog, result, record)
+            if profile is not None:
+                profile.finish(result)
+            yield result
+    finally:
+        if cache is not None:
+            cache.commit()
@@ -0,0 +1,318 @@
+"""
+An inverted index over a catalog of common payloads.
+
+Finding every dataset that involves a person, a license or a source tag
+otherwise takes a scan over every record.  CatalogIndex maps the values of
+the common fields below to the ids of the records that contain them, so a
+lookup is a dictionary access.
+
+    orcid           ORCIDs of authors, data contacts and data contributors
+    family_name     their family names, compared case- and whitespace-
+                    insensitively (as matmeta.citrine matches people)
+    email           their email addresses, compared case-insensitively
+    license_url     URLs of licenses
+    license_name    names of licenses
+    source_tag      source.tags
+    link            every URL in links (landing_page, publication, ...)
+
+The index can be built alongside batch conversion (emit_stream(...,
+catalog=index) or matmeta emit --index PATH), updated record by record, and
+saved to and loaded from disk.
+
+Examples
+--------
+>>> index = CatalogIndex()
+>>> for result in emit_stream(read_jsonl(fp), id_key='links.landing_page', catalog=index):
+...     ...
+>>> index.lookup('orcid', '0000-0002-1825-0097')
+frozenset({'http://example.org/dataset/1', ...})
+>>> index.query(family_name='Doe', source_tag='dft')
+>>> index.save('catalog.index')
+"""
+
+import json
+import sys
+
+# common payload fields holding lists of people
+PEOPLE_FIELDS = ('authors', 'data_contacts', 'data_contributors')
+
+FIELDS = (
+    'orcid', 'family_name', 'email', 'license_url', 'license_name', 'source_tag', 'link',
+)
+
+# bumped when the saved layout changes
+_FORMAT = 1
+
+
+def _normalize_name(name):
+    return ' '.join(name.split()).lower()
+
+
+def _strings(value):
+    # every string in a (possibly nested) links value
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            for string in _strings(item):
+                yield string
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            for string in _strings(item):
+                yield string
+
+
+def terms(record):
+    """
+    Return the set of (field, value) pairs a common payload record is
+    indexed under.  Values of the wrong type are ignored.
+    """
+    found = set()
+    for key in PEOPLE_FIELDS:
+        people = record.get(key)
+        if not isinstance(people, list):
+            continue
+        for person in people:
+            if not isinstance(person, dict):
+                continue
+            orcid = person.get('orcid')
+            if isinstance(orcid, str) and orcid.strip():
+                found.add(('orcid', orcid.strip()))
+            family_name = person.get('family_name')
+            if isinstance(family_name, str) and family_name.strip():
+                found.add(('family_name', _normalize_name(family_name)))
+            email = person.get('email')
+            if isinstance(email, str) and email.strip():
+                found.add(('email', email.strip().lower()))
+    licenses = record.get('licenses')
+    if isinstance(licenses, list):
+        for license in licenses:
+            if not isinstance(license, dict):
+                continue
+            if isinstance(license.get('url'), str):
+                found.add(('license_url', license['url']))
+            if isinstance(license.get('name'), str):
+                found.add(('license_name', license['name']))
+    source = record.get('source')
+    if isinstance(source, dict) and isinstance(source.get('tags'), list):
+        for tag in source['tags']:
+            if isinstance(tag, str):
+                found.add(('source_tag', tag))
+    links = record.get('links')
+    if isinstance(links, dict):
+        for link in _strings(links):
+            found.add(('link', link))
+    return found
+
+
+def _normalize_query(field, value):
+    if field == 'family_name':
+        return _normalize_name(value)
+    if field == 'email':
+        return value.strip().lower()
+    if field == 'orcid':
+        return value.strip()
+    return value
+
+
+def _add_id(values, value, record_id):
+    # a value held by one record maps to its id, by several to a set of ids
+    ids = values.get(value, values)
+    if ids is values:
+        values[value] = record_id
+    elif type(ids) is set:
+        ids.add(record_id)
+    elif ids != record_id:
+        values[value] = {ids, record_id}
+
+
+def _remove_id(values, value, record_id):
+    ids = values[value]
+    if type(ids) is set:
+        ids.discard(record_id)
+        if len(ids) == 1:
+            values[value] = ids.pop()
+    else:
+        del values[value]
+
+
+class CatalogIndex(object):
+    """
+    An inverted index from common field values to record ids.
+
+    Record ids can be any hashable values, e.g. the record_id of batch
+    results; save and load need strings or integers.
+    """
+
+    def __init__(self):
+        # {field: {value: record id, or set of two or more record ids}}
+        self._postings = {field: {} for field in FIELDS}
+        # {record id: (field, value, field, value, ...)}, for remove.  None
+        # after load until first needed.
+        self._terms = {}
+        # the record ids of a loaded index, until _terms is rebuilt
+        self._loaded_ids = None
+        self._size = 0
+
+    def add(self, record_id, record):
+        """
+        Index record under record_id, replacing what was indexed for
+        record_id before.
+        """
+        record_terms = self._record_terms()
+        if record_id in record_terms:
+            self.remove(record_id)
+        postings = self._postings
+        intern = sys.intern
+        flat = []
+        for field, value in terms(record):
+            # the index holds one copy of each value
+            value = intern(value)
+            _add_id(postings[field], value, record_id)
+            flat += (field, value)
+        record_terms[record_id] = tuple(flat)
+        self._size += 1
+
+    def remove(self, record_id):
+        """
+        Remove record_id from the index.  KeyError is raised if it is not
+        indexed.
+        """
+        flat = self._record_terms().pop(record_id)
+        postings = self._postings
+        for position in range(0, len(flat), 2):
+            _remove_id(postings[flat[position]], flat[position + 1], record_id)
+        self._size -= 1
+
+    def _record_terms(self):
+        # a loaded index rebuilds its per-record terms on the first add or
+        # remove, which is slower than loading, so that loading stays fast
+        if self._terms is None:
+            # rebuild the terms of each record from the postings
+            record_terms = {}
+            for field, values in self._postings.items():
+                for value, ids in values.items():
+                    for record_id in (ids if type(ids) is set else (ids,)):
+                        record_terms.setdefault(record_id, []).extend((field, value))
+            for record_id in self._loaded_ids:
+                record_terms[record_id] = tuple(record_terms.get(record_id, ()))
+            self._terms = record_terms
+            self._loaded_ids = None
+        return self._terms
+
+    def _ids(self, field, value):
+        try:
+            values = self._postings[field]
+        except KeyError:
+            raise ValueError('Unknown index field %r (expected one of %s)' % (
+                field, ', '.join(FIELDS)
+            ))
+        ids = values.get(_normalize_query(field, value), values)
+        if ids is values:
+            return ()
+        return ids if type(ids) is set else (ids,)
+
+    def lookup(self, field, value):
+        """
+        Return the frozenset of ids of the records with value in field (see
+        the module documentation for the fields).
+        """
+        return frozenset(self._ids(field, value))
+
+    def count(self, field, value):
+        """
+        The number of records with value in field, without building the set
+        of their ids.
+        """
+        return len(self._ids(field, value))
+
+    def query(self, **criteria):
+        """
+        Return the frozenset of ids of the records matching every
+        field=value criterion, e.g. query(orcid='...', source_tag='dft').
+
+        The cost depends on the size of the smallest match, not on the size
+        of the catalog.
+        """
+        if not criteria:
+            raise ValueError('query needs at least one field=value criterion')
+        matches = sorted(
+            (self._ids(field, value) for field, value in criteria.items()), key=len
+        )
+        result = frozenset(matches[0])
+        for ids in matches[1:]:
+            if not result:
+                break
+            result = result.intersection(ids)
+        return result
+
+    def values(self, field):
+        """
+        The indexed values of field.
+        """
+        return self._postings[field].keys()
+
+    def __contains__(self, record_id):
+        if self._terms is None:
+            return record_id in self._loaded_ids
+        return record_id in self._terms
+
+    def __len__(self):
+        return self._size
+
+    def save(self, path):
+        """
+        Write the index to a JSON file.
+
+        Record ids are stored once, and the postings refer to them by
+        position.
+        """
+        positions = {}
+        ids = []
+        postings = {}
+        for field, values in self._postings.items():
+            saved = postings[field] = {}
+            for value, value_ids in values.items():
+                saved_ids = []
+                for record_id in (value_ids if type(value_ids) is set else (value_ids,)):
+                    position = positions.get(record_id)
+                    if position is None:
+                        position = positions[record_id] = len(ids)
+                        ids.append(record_id)
+                    saved_ids.append(position)
+                saved[value] = saved_ids
+        # records without any indexed values
+        for record_id in (self._terms if self._terms is not None else self._loaded_ids):
+            if record_id not in positions:
+                positions[record_id] = len(ids)
+                ids.append(record_id)
+        # json.dumps encodes in C; json.dump would encode in Python
+        text = json.dumps(
+            {'format': _FORMAT, 'ids': ids, 'postings': postings}, separators=(',', ':')
+        )
+        with open(path, 'w') as fp:
+            fp.write(text)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Read an index written by save.
+        """
+        with open(path) as fp:
+            data = json.load(fp)
+        if data.get('format') != _FORMAT:
+            raise ValueError('Unsupported catalog index format %r' % (data.get('format'),))
+        ids = data['ids']
+        index = cls()
+        for field, values in data['postings'].items():
+            loaded = index._postings[field]
+            for value, positions in values.items():
+                value = sys.intern(value)
+                if len(positions) == 1:
+                    loaded[value] = ids[positions[0]]
+                else:
+                    loaded[value] = set(map(ids.__getitem__, positions))
+        index._terms = None
+        index._loaded_ids = set(ids)
+        index._size = len(ids)
+        return index
@@ -0,0 +1,212 @@
+"""
+Citation formatting.
+
+A citation style is a set of templates, one per kind of reference (journal
+article, book, web page).  Each template is a tree of Field segments that is
+compiled once into nested tuples of (field, prefix, suffix, ...) operations,
+so formatting a citation is a walk over those tuples that appends strings to
+a list, which is joined once at the end.
+
+Formatted strings are not cached: formatting a citation takes a few
+microseconds, less than hashing its canonical JSON form to look it up.
+
+references:
+    http://citrineinformatics.github.io/pif-documentation/schema_definition/common/Reference.html
+    http://www.scientificstyleandformat.org/Tools/SSF-Citation-Quick-Guide.html
+"""
+
+from matmeta.instrumentation import stage
+
+
+class Field(object):
+    """
+    A template segment that renders one citation field.
+
+    args:
+        name:   the citation key
+        template: a format string with a single '{}' for the field's value
+        children: segments rendered after this one, only if the field is
+            present
+        otherwise: segments rendered instead of this one if the field is
+            absent
+        convert: callable turning the field's value into a string (default
+            str)
+    """
+
+    def __init__(self, name, template='{}. ', children=(), otherwise=(), convert=None):
+        self.name = name
+        self.template = template
+        self.children = tuple(children)
+        self.otherwise = tuple(otherwise)
+        self.convert = convert or str
+
+    def compile(self):
+        prefix, _, suffix = self.template.partition('{}')
+        return (
+            self.name,
+            prefix,
+            suffix,
+            self.convert,
+            _compile(self.children),
+            _compile(self.otherwise),
+        )
+
+
+def _compile(segments):
+    return tuple(segment.compile() for segment in segments)
+
+
+def _render(operations, citation, parts):
+    for name, prefix, suffix, convert, children, otherwise in operations:
+        if name in citation:
+            if prefix[:1] == ' ' and parts and parts[-1][-1:] == ' ':
+                prefix = prefix[1:]  # avoid a double space after a separator
+            parts.append(prefix)
+            parts.append(convert(citation[name]))
+            parts.append(suffix)
+            if children:
+                _render(children, citation, parts)
+        elif otherwise:
+            _render(otherwise, citation, parts)
+
+
+def author_list(authors):
+    """
+    'Family Given, Family Given' for the authors that have a family name.
+    """
+    names = []
+    for author in authors:
+        if 'family_name' not in author:
+            continue
+        if 'given_name' in author:
+            names.append('%s %s' % (author['family_name'], author['given_name']))
+        else:
+            names.append(author['family_name'])
+    return ', '.join(names)
+
+
+def reference_kind(citation):
+    """
+    'journal', 'book' or 'url'.
+    """
+    if 'journal' in citation:
+        return 'journal'
+    if 'url' in citation and not any(
+        key in citation
+        for key in ('publisher', 'publication_location', 'edition', 'extent')
+    ):
+        return 'url'
+    return 'book'
+
+
+class CitationStyle(object):
+    """
+    A named set of compiled templates, one per reference kind.
+
+    args:
+        name:   the style's name, e.g. 'ssf'
+        templates: {reference kind: list of Field segments}.  Must have a
+            'book' template, which is used for kinds without their own.
+        kind:   callable returning a citation's reference kind (default
+            reference_kind)
+    """
+
+    def __init__(self, name, templates, kind=reference_kind):
+        self.name = name
+        self.kind = kind
+        self._compiled = {
+            key: _compile(segments) for key, segments in templates.items()
+        }
+
+    def format(self, citation):
+        operations = self._compiled.get(self.kind(citation)) or self._compiled['book']
+        parts = []
+        _render(operations, citation, parts)
+        return ''.join(parts).strip()
+
+
+def _ssf_style():
+    def common():
+        return [
+            Field('authors', convert=author_list),
+            Field('year'),
+            Field('title'),
+        ]
+    available_from = Field('url', ' Available from: {}')
+    return CitationStyle('ssf', {
+        'journal': common() + [
+            Field('journal'),
+            Field('volume', '{}', children=[
+                Field('issue', '({})'),
+                Field('page_location', ':{}. '),
+            ]),
+            available_from,
+        ],
+        'book': common() + [
+            Field('edition'),
+            Field('publication_location', '{}', children=[
+                Field('publisher', ': {}. '),
+            ], otherwise=[
+                Field('publisher'),
+            ]),
+            Field('extent'),
+            Field('notes'),
+            available_from,
+        ],
+        'url': common() + [
+            Field('notes'),
+            available_from,
+        ],
+    })
+
+
+_styles = {}
+
+
+def register_style(style):
+    _styles[style.name] = style
+
+
+def get_style(name):
+    try:
+        return _styles[name]
+    except KeyError:
+        raise LookupError('Unknown citation style %r' % name)
+
+
+register_style(_ssf_style())
+
+DEFAULT_STYLE = 'ssf'
+
+
+class CitationFormatter(object):
+    """
+    Format citations with a style.
+
+    args:
+        style:  a style name or CitationStyle (default 'ssf')
+    """
+
+    def __init__(self, style=DEFAULT_STYLE):
+        self.style = get_style(style) if isinstance(style, str) else style
+
+    @stage('citation_string')
+    def format(self, citation):
+        return self.style.format(citation)
+
+
+_formatters = {}
+
+
+def get_formatter(style=DEFAULT_STYLE):
+    """
+    The shared formatter for a style name.
+    """
+    formatter = _formatters.get(style)
+    if formatter is None:
+        formatter = _formatters.setdefault(style, CitationFormatter(style))
+    return formatter
+
+
+def format_citation(citation, style=DEFAULT_STYLE):
+    return get_formatter(style).format(citation)
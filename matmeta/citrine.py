@@ -0,0 +1,486 @@
+"""
+Direct emitter for Citrine PIF metadata.
+
+CITPayload.reference_metapayload builds a pypif System out of Source,
+Person, Name, License and Reference objects, serializes it with pif.dumps
+and parses the result back with json.loads.  emit() builds the same PIF
+dictionary directly from the payload fields.
+
+The key order, the omission of None values and the type checks follow
+pypif 1.3, so both paths produce identical output.  matmeta/tests/test_citrine.py
+checks this on randomized inputs.  The one intended difference is how
+people listed more than once are merged; see collect_people.
+
+references:
+    http://citrineinformatics.github.io/pif-documentation/schema_definition/system/System.html
+"""
+
+import itertools
+import numbers
+import re
+import warnings
+
+from matmeta import incremental
+from matmeta.frozen import thaw
+from matmeta.incremental import OMIT, section
+from matmeta.instrumentation import stage
+from matmeta.interning import converted
+
+_string_types = (str,)
+
+_first_camel_case_regex = re.compile('(.)([A-Z][^A-Z]+)')
+_second_camel_case_regex = re.compile('([^A-Z_])([A-Z])')
+
+# Note: the citrine type is 'Reference', not 'Citation'.
+# http://citrineinformatics.github.io/pif-documentation/schema_definition/common/Reference.html
+CITATION_FIELDS = frozenset([
+    'doi', 'isbn', 'issn', 'url', 'title', 'publisher', 'journal',
+    'volume', 'issue', 'year', 'figure', 'table', 'pages', 'authors',
+    'editors', 'affiliations', 'acknowledgements', 'referenes', 'tags'
+])
+# Note: the citrine type is 'Name', not 'Author'.
+# http://citrineinformatics.github.io/pif-documentation/schema_definition/common/Name.html
+AUTHOR_FIELDS = frozenset(['title', 'given', 'family', 'suffix', 'tags'])
+
+_REFERENCE_STRING_FIELDS = (
+    'doi', 'isbn', 'issn', 'url', 'title', 'publisher', 'journal', 'volume',
+    'issue', 'year'
+)
+
+# (common payload key, tag) for each list of people, in the order they are added
+_PEOPLE_LISTS = (
+    ('authors', 'author'),
+    ('data_contacts', 'contact'),
+    ('data_contributors', 'contributor'),
+)
+
+
+_camel_case_names = {}
+_snake_case_names = {}
+
+
+def _to_camel_case(name):
+    try:
+        return _camel_case_names[name]
+    except KeyError:
+        parts = name.lstrip('_').split('_')
+        converted = parts[0] + ''.join([part.title() for part in parts[1:]])
+        if len(_camel_case_names) < 4096:
+            _camel_case_names[name] = converted
+        return converted
+
+
+def _to_snake_case(name):
+    try:
+        return _snake_case_names[name]
+    except KeyError:
+        first_pass = _first_camel_case_regex.sub(r'\1_\2', name)
+        converted = _second_camel_case_regex.sub(r'\1_\2', first_pass).lower()
+        if len(_snake_case_names) < 4096:
+            _snake_case_names[name] = converted
+        return converted
+
+
+def _keys_to_snake_case(data):
+    return dict((_to_snake_case(key), value) for key, value in data.items())
+
+
+def _type_names(types):
+    names = []
+    for type_ in types:
+        if isinstance(type_, tuple):
+            names.extend(_type_names(type_))
+        else:
+            names.append(type_.__name__)
+    return names
+
+
+def _check_type(class_name, name, value, *types):
+    if value is None or isinstance(value, types):
+        return
+    raise TypeError(
+        '%s.%s is of type %s. Must be equal to None or one of the following types: %s'
+        % (class_name, name, type(value).__name__, ', '.join(_type_names(types)))
+    )
+
+
+def _check_list_type(class_name, name, value, *types):
+    if isinstance(value, list):
+        for item in value:
+            if not isinstance(item, types):
+                raise TypeError(
+                    '%s.%s is of type %s. Must be one of the following types: %s'
+                    % (class_name, name, type(item).__name__, ', '.join(_type_names(types)))
+                )
+    else:
+        _check_type(class_name, name, value, *types)
+
+
+def _string(class_name, name, value):
+    _check_type(class_name, name, value, _string_types)
+    return value
+
+
+def _as_is(class_name, name, value):
+    return value
+
+
+def _string_or_int(class_name, name, value):
+    _check_type(class_name, name, value, _string_types, int)
+    return value
+
+
+def _string_list(class_name, name, value):
+    _check_list_type(class_name, name, value, _string_types)
+    return thaw(value)
+
+
+def _object(builder, *types):
+    def convert(class_name, name, value):
+        _check_type(class_name, name, value, dict, *types)
+        if isinstance(value, dict):
+            return builder(_keys_to_snake_case(value))
+        return value
+    return convert
+
+
+def _object_list(builder, *types):
+    def convert(class_name, name, value):
+        _check_list_type(class_name, name, value, dict, *types)
+        if isinstance(value, list):
+            return [
+                builder(_keys_to_snake_case(item)) if isinstance(item, dict) else item
+                for item in value
+            ]
+        if isinstance(value, dict):
+            return builder(_keys_to_snake_case(value))
+        return value
+    return convert
+
+
+class _PioType(object):
+    """
+    The PIF dictionary layout of one pypif class.
+
+    fields are (name, converter) pairs for the class's own fields, in the
+    order the class defines them.  converter(class_name, name, value) checks
+    the value and returns its PIF form.
+    """
+    __slots__ = ('class_name', 'fields', 'known')
+
+    def __init__(self, class_name, fields):
+        self.class_name = class_name
+        self.fields = tuple(
+            (name, _to_camel_case(name), converter) for name, converter in fields
+        )
+        self.known = frozenset(name for name, _ in fields) | frozenset(['tags'])
+
+    def build(self, data):
+        """
+        Build the dictionary pypif produces from keyword arguments data.
+
+        pypif stores tags first, then any unsupported keyword arguments, then
+        the class's own fields, and drops every None value when serializing.
+        """
+        class_name = self.class_name
+        output = {}
+        tags = data.get('tags')
+        if tags is not None:
+            _check_list_type(class_name, 'tags', tags, _string_types, numbers.Number)
+            output['tags'] = thaw(tags)
+        known = self.known
+        for key, value in data.items():
+            if key not in known and value is not None:
+                output[_to_camel_case(key)] = thaw(value)
+        for name, key, converter in self.fields:
+            value = data.get(name)
+            if value is not None:
+                output[key] = converter(class_name, name, value)
+        return output
+
+
+_NAME = _PioType('Name', (
+    ('title', _string),
+    ('given', _string),
+    ('family', _string),
+    ('suffix', _string),
+))
+name_dict = _NAME.build
+
+_PAGES = _PioType('Pages', (
+    ('start', _string_or_int),
+    ('end', _string_or_int),
+))
+
+_DISPLAY_ITEM = _PioType('DisplayItem', (
+    ('number', _string),
+    ('title', _string),
+    ('caption', _string),
+))
+
+_SOURCE = _PioType('Source', (
+    ('producer', _string),
+    ('url', _string),
+))
+
+# person_dict converts the name itself; collect_people already uses pypif keys
+_PERSON = _PioType('Person', (
+    ('name', _as_is),
+    ('email', _string),
+    ('orcid', _string),
+))
+
+_LICENSE = _PioType('License', (
+    ('name', _string),
+    ('description', _string),
+    ('url', _string),
+))
+
+_REFERENCE = _PioType('Reference', tuple(
+    (name, _string) for name in _REFERENCE_STRING_FIELDS
+) + (
+    ('figure', _object(_DISPLAY_ITEM.build)),
+    ('table', _object(_DISPLAY_ITEM.build)),
+    ('pages', _object(_PAGES.build, *(_string_types + (int,)))),
+    ('authors', _as_is),
+    ('editors', _object_list(name_dict, *_string_types)),
+    ('affiliations', _string_list),
+    ('acknowledgements', _string_list),
+))
+
+
+def source_dict(producer=None, url=None, tags=None):
+    return _SOURCE.build({'producer': producer, 'url': url, 'tags': tags})
+
+
+def person_dict(name, email=None, orcid=None, tags=None):
+    if isinstance(name, dict):
+        name = name_dict(name)
+    else:
+        _check_type('Person', 'name', name, _string_types)
+    return _PERSON.build({'name': name, 'email': email, 'orcid': orcid, 'tags': tags})
+
+
+@stage('citrine.license')
+def license_dict(license):
+    if not isinstance(license, dict):
+        raise TypeError('License argument must be a mapping, not %s' % type(license).__name__)
+    return _LICENSE.build(license)
+
+
+def reference_dict(data, authors):
+    """
+    Build a PIF Reference from filtered citation data and a list of author
+    Name dictionaries.
+    """
+    # CITPayload sets the authors after construction, so an empty list is
+    # kept and the raw citation authors are never converted.
+    data = dict(data)
+    data['authors'] = authors
+    return _REFERENCE.build(data)
+
+
+def _normalize_name(name):
+    if not isinstance(name, _string_types):
+        return ''
+    return ' '.join(name.split()).lower()
+
+
+@stage('citrine.people')
+def unique_people(payload):
+    """
+    Return [(person, tags)] for the payload's distinct people, in
+    first-seen order.
+
+    person is the first common payload entry for the person (e.g. from
+    'authors'), and tags lists the roles ('author', 'contact',
+    'contributor') the person appears in, in first-seen order.
+
+    People are identified by ORCID when one is present, and otherwise by
+    their family and given names, compared case- and whitespace-
+    insensitively.  A person with an ORCID also matches the first earlier
+    entry of the same name that has no ORCID yet, neither its own nor one
+    of a person merged into it.
+    """
+    people = []
+    by_orcid = {}
+    # name key -> first entry of that name; later entries of the same name
+    # (with conflicting ORCIDs) are rare, and kept apart
+    by_name = {}
+    more_by_name = {}
+    # ids of the entries that have an ORCID, their own or a merged person's
+    with_orcid = set()
+
+    for key, tag in _PEOPLE_LISTS:
+        if key not in payload or not isinstance(payload[key], list):
+            continue
+        for person in payload[key]:
+            orcid = person.get('orcid', None)
+            name_key = (
+                _normalize_name(person.get('family_name', '')),
+                _normalize_name(person.get('given_name', '')),
+            )
+
+            existing = by_orcid.get(orcid) if orcid else None
+            if existing is None:
+                existing = by_name.get(name_key)
+                if existing is not None and orcid:
+                    # the first entry of the same name without an ORCID
+                    existing = next((
+                        candidate for candidate in
+                        itertools.chain((existing,), more_by_name.get(name_key, ()))
+                        if id(candidate) not in with_orcid
+                    ), None)
+                    if existing is not None:
+                        with_orcid.add(id(existing))
+
+            if existing is not None:
+                # at most one tag per people list, so the list stays short
+                if tag not in existing[1]:
+                    existing[1].append(tag)
+                if orcid:
+                    by_orcid.setdefault(orcid, existing)
+                continue
+
+            entry = (person, [tag])
+            people.append(entry)
+            if name_key in by_name:
+                more_by_name.setdefault(name_key, []).append(entry)
+            else:
+                by_name[name_key] = entry
+            if orcid:
+                by_orcid.setdefault(orcid, entry)
+                with_orcid.add(id(entry))
+    return people
+
+
+def _contact_info(person, tags):
+    return {
+        'name': {
+            'title': person.get('title', ''),
+            'given': person.get('given_name', ''),
+            'family': person.get('family_name', ''),
+        },
+        'orcid': person.get('orcid', None),
+        'email': person.get('email', None),
+        'tags': tags,
+    }
+
+
+def collect_people(payload):
+    """
+    Return the payload's people as a list of Citrine contact information.
+
+    Each entry is a dictionary with 'name' (a dictionary of title, given
+    and family), 'orcid', 'email' and 'tags'.  Entries are in first-seen
+    order.  When a person appears more than once (e.g. as an author and as
+    a contact), the first entry is kept and the new tag is added to it.
+    See unique_people for how people are matched.
+    """
+    return [_contact_info(person, tags) for person, tags in unique_people(payload)]
+
+
+def filter_citation(citation):
+    """
+    Split a common payload citation into Reference fields and author Name
+    fields, without modifying the citation.
+    """
+    data = {key: citation[key] for key in citation if key in CITATION_FIELDS}
+    authors = []
+    if 'authors' in data:
+        if not isinstance(data['authors'], list):
+            raise TypeError(
+                'Reference.authors is of type %s. Must be a list'
+                % type(data['authors']).__name__
+            )
+        for author in data['authors']:
+            if not isinstance(author, dict):
+                raise TypeError(
+                    'Name is of type %s. Must be a dictionary' % type(author).__name__
+                )
+            # fix name keys, then filter keys
+            author = dict(author)
+            if 'given_name' in author:
+                author['given'] = author['given_name']
+            if 'family_name' in author:
+                author['family'] = author['family_name']
+            authors.append({
+                key: author[key] for key in author if key in AUTHOR_FIELDS
+            })
+    return data, authors
+
+
+@stage('citrine.reference')
+def _reference(citation):
+    data, authors = filter_citation(citation)
+    return reference_dict(data, [name_dict(author) for author in authors])
+
+
+def _references(payload):
+    citations = payload.get('citations')
+    if 'citations' not in payload or not isinstance(citations, list):
+        return OMIT
+    return (
+        converted(citation, 'citrine.reference', _reference)
+        for citation in citations
+    )
+
+
+def _contact_name(person):
+    return name_dict(_contact_info(person, None)['name'])
+
+
+def _contacts(payload):
+    # only the people index is built up front; contacts are built one by one
+    for person, tags in unique_people(payload):
+        yield _PERSON.build({
+            'name': converted(person, 'citrine.name', _contact_name),
+            'email': person.get('email', None),
+            'orcid': person.get('orcid', None),
+            'tags': tags,
+        })
+
+
+def _licenses(payload):
+    licenses = payload.get('licenses')
+    if 'licenses' not in payload or not isinstance(licenses, list):
+        return OMIT
+    return _license_dicts(licenses)
+
+
+def _license_dicts(licenses):
+    for license in licenses:
+        try:
+            license = converted(license, 'citrine.license', license_dict)
+        except Exception as ex:
+            warnings.warn('Skipping invalid license: %s' % ex)
+        else:
+            yield license
+
+
+def _source(payload):
+    source = payload.get('source')
+    if 'source' not in payload or not isinstance(source, dict):
+        return OMIT
+    return source_dict(
+        producer=source.get('producer'),
+        url=source.get('url'),
+        tags=source.get('tags', []),
+    )
+
+
+# The PIF System's sections, in pypif's key order (see matmeta.incremental)
+SECTIONS = (
+    section(['references'], ['citations'], items=_references),
+    section(['contacts'], [key for key, _ in _PEOPLE_LISTS], items=_contacts),
+    section(['licenses'], ['licenses'], items=_licenses),
+    section(['source'], ['source.producer', 'source.url', 'source.tags'], _source),
+    section(['category'], [], lambda payload: 'system'),
+)
+
+
+def emit(payload):
+    """
+    Return the Citrine PIF dictionary for a common payload.
+    """
+    return incremental.emit(SECTIONS, payload)
@@ -0,0 +1,371 @@
+"""
+Command line interface.
+
+    matmeta emit catalog.jsonl --services citrine materials_data_facility
+
+reads common payloads from a JSON Lines file (or stdin) and writes one JSON
+Lines file per service, plus an error sidecar for records that could not be
+converted.  Records are processed one at a time, so memory use does not
+depend on the size of the input.
+
+    matmeta emit catalog.jsonl --id-key links.landing_page --ids catalog.errors.jsonl
+
+converts only the listed records (here, those that failed last time),
+reading them through an offset index of the input (see matmeta.offsets).
+
+    matmeta query catalog.index --orcid 0000-0002-1825-0097
+
+prints the ids of the records in a catalog index (see emit --index) that
+match every given field.
+
+    matmeta serve --port 8080 --workers 4
+
+runs the HTTP conversion service (see matmeta.server) until interrupted.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# the rest of matmeta is imported by the commands that use it, so that
+# starting one command does not import the others' dependencies
+
+
+def _output_prefix(args):
+    if args.prefix:
+        return args.prefix
+    if args.input == '-':
+        return 'stdin'
+    name = os.path.basename(args.input)
+    return name[:-len('.jsonl')] if name.endswith('.jsonl') else name
+
+
+def _open_input(path):
+    if path == '-':
+        return sys.stdin
+    return open(path)
+
+
+def _read_ids(path):
+    """
+    Read record ids, one per line: JSON values (e.g. 3 or "http://..."),
+    error reports written by emit (their "id" is used), or plain strings.
+    """
+    ids = []
+    with open(path) as fp:
+        for line in fp:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError:
+                value = line
+            if isinstance(value, dict):
+                value = value.get('id')
+            ids.append(value)
+    return ids
+
+
+def emit(args):
+    if args.ids and args.input == '-':
+        sys.stderr.write('emit: --ids needs an input file, not stdin\n')
+        return 2
+    from matmeta import instrumentation, serializers
+    from matmeta.batch import emit_stream, read_jsonl
+    from matmeta.services import registry
+
+    services = registry.select(args.services)
+    prefix = os.path.join(args.output_dir, _output_prefix(args))
+    if not os.path.isdir(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    outputs = {
+        service: open('%s.%s.jsonl' % (prefix, service), 'wb')
+        for service in services
+    }
+    error_path = '%s.errors.jsonl' % prefix
+    errors = open(error_path, 'w')
+    counts = {service: 0 for service in services}
+    failed = 0
+    unchanged = 0
+    cache = None
+    if args.cache:
+        from matmeta.fingerprint import FingerprintCache
+        cache = FingerprintCache(args.cache)
+    catalog = None
+    if args.index:
+        from matmeta.catalog import CatalogIndex
+        catalog = CatalogIndex.load(args.index) if os.path.exists(args.index) else CatalogIndex()
+    stats = None
+    if args.stats or args.stats_json:
+        stats = instrumentation.enable(memory=args.stats_memory)
+    profile = None
+    if args.memory_profile:
+        from matmeta.memprofile import MemoryProfile
+        threshold = args.memory_threshold
+        profile = MemoryProfile(
+            peak_threshold=threshold * 2 ** 20 if threshold is not None else None
+        ).start()
+    quarantine = open(args.quarantine, 'w') if args.quarantine else None
+    indexes = None
+    if args.ids:
+        from matmeta.offsets import IndexedJSONL
+        fp = IndexedJSONL(args.input, id_key=args.id_key)
+        indexes, missing = fp.select(_read_ids(args.ids))
+        records = fp.records(indexes, args.max_record_size, quarantine)
+        for value in missing:
+            errors.write(json.dumps({
+                'index': None,
+                'id': value,
+                'errors': [{'service': None, 'error': 'Record not found in %s' % args.input}],
+            }) + '\n')
+        failed += len(missing)
+    else:
+        fp = _open_input(args.input)
+        records = read_jsonl(fp, args.max_record_size, quarantine)
+    try:
+        if args.workers:
+            from matmeta.parallel import emit_parallel
+            results = emit_parallel(
+                records, services=services, id_key=args.id_key,
+                workers=args.workers, chunk_size=args.chunk_size,
+                intern=args.intern, cache=cache, skip_unchanged=args.changed_only,
+                catalog=catalog, indexes=indexes, profile=profile
+            )
+        else:
+            interner = None
+            if args.intern:
+                from matmeta.interning import Interner
+                interner = Interner()
+            results = emit_stream(
+                records, services=services, id_key=args.id_key,
+                interner=interner, cache=cache,
+                skip_unchanged=args.changed_only, catalog=catalog, indexes=indexes,
+                profile=profile
+            )
+        for result in results:
+            if not result.changed:
+                unchanged += 1
+                if args.changed_only:
+                    continue
+            for service, payload in result.payloads.items():
+                if args.serializer:
+                    outputs[service].write(serializers.dumps(payload, args.serializer) + b'\n')
+                else:
+                    outputs[service].write((json.dumps(payload) + '\n').encode('utf-8'))
+                counts[service] += 1
+            if not result.ok:
+                errors.write(json.dumps(result.error_report()) + '\n')
+                failed += 1
+    finally:
+        if fp is not sys.stdin:
+            fp.close()
+        for output in outputs.values():
+            output.close()
+        errors.close()
+        if cache is not None:
+            cache.close()
+        if stats is not None:
+            instrumentation.disable()
+        if profile is not None:
+            profile.stop()
+        if quarantine is not None:
+            quarantine.close()
+
+    if catalog is not None:
+        catalog.save(args.index)
+    for service in services:
+        sys.stderr.write('%s: %d payloads\n' % (service, counts[service]))
+    if cache is not None:
+        sys.stderr.write('unchanged records: %d\n' % unchanged)
+    sys.stderr.write('records with errors: %d (see %s)\n' % (failed, error_path))
+    if args.stats:
+        sys.stderr.write(stats.summary() + '\n')
+    if args.stats_json:
+        with open(args.stats_json, 'w') as stats_file:
+            json.dump(stats.as_dict(), stats_file, indent=2)
+    if profile is not None:
+        sys.stderr.write(profile.summary() + '\n')
+        with open(args.memory_profile, 'w') as profile_file:
+            json.dump(profile.as_dict(), profile_file, indent=2)
+    return 1 if failed and args.strict else 0
+
+
+def query(args):
+    from matmeta.catalog import FIELDS as CATALOG_FIELDS, CatalogIndex
+
+    catalog = CatalogIndex.load(args.index)
+    criteria = {
+        field: getattr(args, field) for field in CATALOG_FIELDS
+        if getattr(args, field) is not None
+    }
+    if not criteria:
+        sys.stderr.write('query: give at least one of %s\n' % ', '.join(
+            '--' + field.replace('_', '-') for field in CATALOG_FIELDS
+        ))
+        return 2
+    for record_id in sorted(catalog.query(**criteria), key=str):
+        sys.stdout.write(json.dumps(record_id) + '\n')
+    return 0
+
+
+def serve(args):
+    from matmeta.server import ConversionServer
+
+    server = ConversionServer(
+        host=args.host, port=args.port, batch_size=args.batch_size,
+        max_wait=args.max_wait / 1000.0, workers=args.workers
+    )
+    sys.stderr.write('serving on %s:%d\n' % (args.host, args.port))
+    server.serve_forever()
+    return 0
+
+
+def _build_parser():
+    from matmeta import serializers
+    from matmeta.catalog import FIELDS as CATALOG_FIELDS
+    from matmeta.services import registry
+
+    parser = argparse.ArgumentParser(
+        prog='matmeta',
+        description='Emit service metadata from common payloads.'
+    )
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    emit_parser = subparsers.add_parser(
+        'emit', help='convert a JSON Lines file of common payloads'
+    )
+    emit_parser.add_argument(
+        'input', nargs='?', default='-',
+        help='JSON Lines input file (default: stdin)'
+    )
+    emit_parser.add_argument(
+        '-s', '--services', nargs='+', choices=registry.services,
+        help='services to emit (default: all)'
+    )
+    emit_parser.add_argument(
+        '-o', '--output-dir', default='.',
+        help='directory for the output files (default: .)'
+    )
+    emit_parser.add_argument(
+        '-p', '--prefix',
+        help='output file prefix (default: input file name, or "stdin")'
+    )
+    emit_parser.add_argument(
+        '--id-key',
+        help='dotted path of a field identifying each record in error reports'
+    )
+    emit_parser.add_argument(
+        '--ids', metavar='PATH',
+        help='only convert the records with these ids, one per line (JSON '
+             'values, plain strings or the lines of an errors file), read '
+             'through an offset index of the input kept in INPUT.idx'
+    )
+    emit_parser.add_argument(
+        '-j', '--workers', type=int, default=0,
+        help='convert on a pool of this many processes (default: in-process)'
+    )
+    emit_parser.add_argument(
+        '--chunk-size', type=int, default=64,
+        help='records per work unit when --workers is set (default: 64)'
+    )
+    emit_parser.add_argument(
+        '--intern', action='store_true',
+        help='share repeated people, licenses and citations between records'
+    )
+    emit_parser.add_argument(
+        '--cache', metavar='PATH',
+        help='reuse payloads of unchanged records from this cache file, and '
+             'add new ones to it'
+    )
+    emit_parser.add_argument(
+        '--changed-only', action='store_true',
+        help='with --cache, only write payloads of records that changed'
+    )
+    emit_parser.add_argument(
+        '--index', metavar='PATH',
+        help='add the converted records to the catalog index in this file '
+             '(created if missing), under their --id-key ids'
+    )
+    emit_parser.add_argument(
+        '--serializer', choices=serializers.available(),
+        help='write payloads as compact JSON with sorted keys, serialized by '
+             'this backend (see matmeta.serializers; default: json.dumps '
+             'with its default formatting)'
+    )
+    emit_parser.add_argument(
+        '--stats', action='store_true',
+        help='print call counts and times per stage (see matmeta.instrumentation)'
+    )
+    emit_parser.add_argument(
+        '--stats-json', metavar='PATH',
+        help='write the per-stage stats to this JSON file'
+    )
+    emit_parser.add_argument(
+        '--stats-memory', action='store_true',
+        help='also measure allocations per stage (slow)'
+    )
+    emit_parser.add_argument(
+        '--memory-profile', metavar='PATH',
+        help='measure peak memory and emitted size per record and service '
+             '(slow; see matmeta.memprofile) and write the report to this file'
+    )
+    emit_parser.add_argument(
+        '--memory-threshold', type=float, metavar='MIB',
+        help='with --memory-profile, report records whose conversion peaks '
+             'above this many MiB as outliers'
+    )
+    emit_parser.add_argument(
+        '--max-record-size', type=int, metavar='N',
+        help='do not parse or convert records longer than N characters; '
+             'they are reported as errors'
+    )
+    emit_parser.add_argument(
+        '--quarantine', metavar='PATH',
+        help='with --max-record-size, write the skipped records to this file'
+    )
+    emit_parser.add_argument(
+        '--strict', action='store_true',
+        help='exit with status 1 if any record fails'
+    )
+    emit_parser.set_defaults(func=emit)
+
+    query_parser = subparsers.add_parser(
+        'query', help='print the ids of the indexed records matching every criterion'
+    )
+    query_parser.add_argument('index', help='catalog index file (see emit --index)')
+    for field in CATALOG_FIELDS:
+        query_parser.add_argument('--' + field.replace('_', '-'), metavar='VALUE')
+    query_parser.set_defaults(func=query)
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='run the HTTP conversion service'
+    )
+    serve_parser.add_argument('--host', default='127.0.0.1', help='default: 127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080, help='default: 8080')
+    serve_parser.add_argument(
+        '--batch-size', type=int, default=16,
+        help='maximum number of requests converted together (default: 16)'
+    )
+    serve_parser.add_argument(
+        '--max-wait', type=float, default=2.0,
+        help='milliseconds a batch waits for more requests (default: 2)'
+    )
+    serve_parser.add_argument(
+        '-j', '--workers', type=int,
+        help='number of worker processes (default: one per CPU)'
+    )
+    serve_parser.set_defaults(func=serve)
+    return parser
+
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+A persistent cache of emitted payloads, keyed by input record fingerprints.
+
+Repeat batch runs over a catalog that has barely changed spend almost all
+of their time re-emitting identical payloads.  FingerprintCache stores each
+record's emitted payloads in a SQLite database, keyed by a hash of the
+record, the service and the matmeta version, so that the next run can
+return them without converting the record again, and can tell which
+records changed.
+
+Entries written by other matmeta versions are evicted when the cache is
+opened, because their payloads may differ from what this version emits.
+
+Examples
+--------
+>>> with FingerprintCache('catalog.cache') as cache:
+...     for result in emit_stream(read_jsonl(fp), cache=cache):
+...         if result.changed:
+...             publish(result.payloads)
+"""
+
+from collections import namedtuple
+import hashlib
+import json
+import sqlite3
+import time
+
+from matmeta.frozen import FrozenDict, FrozenList
+from matmeta.instrumentation import stage
+
+# payloads holds the emitted payloads; records when each record was last
+# used, in a table of its own so that marking a record as used does not
+# rewrite the pages of its payloads
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS payloads ('
+    ' fingerprint TEXT NOT NULL,'
+    ' version TEXT NOT NULL,'
+    ' service TEXT NOT NULL,'
+    ' payload TEXT NOT NULL,'
+    ' PRIMARY KEY (fingerprint, version, service)'
+    ') WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS records ('
+    ' fingerprint TEXT NOT NULL,'
+    ' version TEXT NOT NULL,'
+    ' used REAL NOT NULL,'
+    ' PRIMARY KEY (fingerprint, version)'
+    ') WITHOUT ROWID',
+)
+
+
+def _frozen_list(values):
+    return FrozenList([
+        _frozen_list(value) if type(value) is list else value for value in values
+    ])
+
+
+def _frozen_object(pairs):
+    # dictionaries are decoded inside out, so nested ones are already frozen
+    return FrozenDict([
+        (key, _frozen_list(value) if type(value) is list else value)
+        for key, value in pairs
+    ])
+
+
+# decodes stored payloads as frozen structures, without a second pass
+_decode = json.JSONDecoder(object_pairs_hook=_frozen_object).decode
+
+
+def fingerprint(record):
+    """
+    A hash of a record's compact JSON form.
+
+    Key order is kept rather than sorted: it shows in the emitted metadata
+    (e.g. in MDF links), so two records that differ only in key order may
+    have different payloads.
+    """
+    text = json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _version():
+    import matmeta
+    return matmeta.__version__
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'size'])
+
+
+class FingerprintCache(object):
+    """
+    Emitted payloads stored in a SQLite database at path.
+
+    args:
+        path:       the database file.  ':memory:' keeps the cache in memory.
+        version:    the version entries are stored and looked up under
+            (default: matmeta.__version__)
+        max_age:    if given, entries not used for this many seconds are
+            evicted when the cache is opened
+        commit_every: number of writes between commits
+
+    Several processes can share a cache file.  Writes, and the times at
+    which cached records were used, are committed every commit_every writes
+    or hits and by commit() and close().
+    """
+
+    def __init__(self, path, version=None, max_age=None, commit_every=1000):
+        self.path = path
+        self.version = version or _version()
+        self.commit_every = commit_every
+        self._connection = sqlite3.connect(path, timeout=60.0)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in _SCHEMA:
+            self._connection.execute(statement)
+        self._pending = 0
+        self._used = []
+        self._hits = 0
+        self._misses = 0
+        self.evict(max_age)
+
+    @stage('cache.fingerprint')
+    def key(self, record):
+        """
+        The fingerprint of record, which get and put take as key.
+        """
+        return fingerprint(record)
+
+    @stage('cache.get')
+    def get(self, key, services, skip_complete=False):
+        """
+        Return {service: frozen payload} for the services that have an entry
+        for the record fingerprint key.
+
+        args:
+            skip_complete:  if every service has an entry, return None
+                instead, without decoding the payloads
+        """
+        rows = self._connection.execute(
+            'SELECT service, payload FROM payloads'
+            ' WHERE fingerprint = ? AND version = ?',
+            (key, self.version)
+        ).fetchall()
+        rows = [(service, payload) for service, payload in rows if service in services]
+        self._hits += len(rows)
+        self._misses += len(services) - len(rows)
+        if rows:
+            self._used.append(key)
+            if len(self._used) >= self.commit_every:
+                self.commit()
+        if skip_complete and len(rows) == len(services):
+            return None
+        return {service: _decode(payload) for service, payload in rows}
+
+    @stage('cache.put')
+    def put(self, key, payloads):
+        """
+        Store {service: payload} for the record fingerprint key.
+        """
+        version = self.version
+        self._connection.executemany(
+            'INSERT OR REPLACE INTO payloads VALUES (?, ?, ?, ?)',
+            [
+                (key, version, service, json.dumps(payload))
+                for service, payload in payloads.items()
+            ]
+        )
+        self._connection.execute(
+            'INSERT OR REPLACE INTO records VALUES (?, ?, ?)', (key, version, time.time())
+        )
+        self._pending += len(payloads)
+        if self._pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        if self._used:
+            now = time.time()
+            self._connection.executemany(
+                'UPDATE records SET used = ? WHERE fingerprint = ? AND version = ?',
+                [(now, key, self.version) for key in self._used]
+            )
+            self._used = []
+        self._connection.commit()
+        self._pending = 0
+
+    def evict(self, max_age=None):
+        """
+        Remove the entries of other versions, and entries of records not
+        used for max_age seconds.
+
+        return:
+            the number of payloads removed
+        """
+        connection = self._connection
+        removed = 0
+        # records is small, so this check is cheap; the payloads are only
+        # scanned after a version change
+        if connection.execute(
+            'SELECT 1 FROM records WHERE version != ? LIMIT 1', (self.version,)
+        ).fetchone():
+            removed += connection.execute(
+                'DELETE FROM payloads WHERE version != ?', (self.version,)
+            ).rowcount
+            connection.execute('DELETE FROM records WHERE version != ?', (self.version,))
+        if max_age is not None:
+            cutoff = time.time() - max_age
+            removed += connection.execute(
+                'DELETE FROM payloads WHERE version = ? AND fingerprint IN'
+                ' (SELECT fingerprint FROM records WHERE version = ? AND used < ?)',
+                (self.version, self.version, cutoff)
+            ).rowcount
+            connection.execute(
+                'DELETE FROM records WHERE version = ? AND used < ?', (self.version, cutoff)
+            )
+        connection.commit()
+        return removed
+
+    def clear(self):
+        self._connection.execute('DELETE FROM payloads')
+        self._connection.execute('DELETE FROM records')
+        self._connection.commit()
+        self._used = []
+        self._pending = 0
+        self._hits = self._misses = 0
+
+    def cache_info(self):
+        size = self._connection.execute('SELECT COUNT(*) FROM payloads').fetchone()[0]
+        return CacheInfo(self._hits, self._misses, size)
+
+    def close(self):
+        if self._connection is not None:
+            self.commit()
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
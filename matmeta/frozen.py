@@ -0,0 +1,92 @@
+"""
+Immutable dict and list types used for cached, shared structures.
+
+FrozenDict and FrozenList subclass dict and list so that they compare equal
+to, and serialize like, the plain containers they replace.  Every mutating
+method raises TypeError, which makes them safe to share between callers and
+threads.
+"""
+
+
+def _immutable(self, *args, **kwargs):
+    raise TypeError('%s object is immutable' % type(self).__name__)
+
+
+class FrozenDict(dict):
+    __slots__ = ()
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __ior__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __repr__(self):
+        return 'FrozenDict(%s)' % dict.__repr__(self)
+
+
+class FrozenList(list):
+    __slots__ = ()
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    __iadd__ = _immutable
+    __imul__ = _immutable
+    append = _immutable
+    clear = _immutable
+    extend = _immutable
+    insert = _immutable
+    pop = _immutable
+    remove = _immutable
+    reverse = _immutable
+    sort = _immutable
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def __repr__(self):
+        return 'FrozenList(%s)' % list.__repr__(self)
+
+
+# values freeze returns unchanged without a recursive call
+_SCALARS = frozenset([str, int, float, bool, type(None)])
+
+
+def freeze(obj):
+    """
+    Return a deeply immutable copy of obj.
+
+    Dictionaries become FrozenDicts, lists and tuples become FrozenLists and
+    all other values are returned unchanged.  Values that are already frozen
+    are returned as-is.
+    """
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict([
+            (key, value if type(value) in _SCALARS else freeze(value))
+            for key, value in obj.items()
+        ])
+    if isinstance(obj, (list, tuple)):
+        return FrozenList([
+            value if type(value) in _SCALARS else freeze(value)
+            for value in obj
+        ])
+    return obj
+
+
+def thaw(obj):
+    """
+    Return a deeply mutable copy of obj, using plain dicts and lists.
+    """
+    if isinstance(obj, dict):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(value) for value in obj]
+    return obj
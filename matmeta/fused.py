@@ -0,0 +1,57 @@
+"""
+Emit metadata for several services from one validated, normalized input.
+
+Building CITPayload, MDFPayload and MCPayload from the same inputs copies
+the fields three times and validates them three times.  emit_all validates
+once against the services' merged requirements, selects the known fields
+once and runs every service's sections (see matmeta.incremental) off that
+one copy, without constructing a payload object per service.
+
+Examples
+--------
+>>> outputs = emit_all(inputs, services=['citrine', 'materials_data_facility'])
+>>> outputs['citrine']['contacts']
+"""
+
+from matmeta import incremental
+from matmeta.frozen import freeze
+from matmeta.services import registry
+from matmeta.validation import get_validator
+
+
+def normalize(inputs):
+    """
+    Return the known common payload fields of inputs, in the registry's
+    field order (as the payload classes hold them).
+    """
+    return {key: inputs[key] for key in registry.all_fields() if key in inputs}
+
+
+def emit_all(inputs, services=None):
+    """
+    Emit metadata for each service from one common payload.
+
+    args:
+        inputs:     a common payload dictionary
+        services:   a list of service names.  None means all services.
+
+    return:
+        {service name: frozen metadata}, in registration order.  The
+        metadata is identical to the payload classes' metapayload.
+
+    A ValidationError listing the problems for all of the services is
+    raised if inputs does not satisfy their merged requirements.
+    """
+    get_validator(services).check(inputs)
+    normalized = normalize(inputs)
+    outputs = {}
+    for service in registry.select(services):
+        payload_class = registry.emitter(service)
+        try:
+            sections = payload_class._sections()
+        except NotImplementedError:
+            # an emitter without sections only supports whole-payload emission
+            outputs[service] = payload_class(**inputs).metapayload
+        else:
+            outputs[service] = freeze(incremental.emit(sections, normalized))
+    return outputs
@@ -0,0 +1,311 @@
+"""
+Emission by sections, for re-emitting only what an edit affects.
+
+A service's output is declared as a sequence of Sections.  Each section
+names the place in the output it fills (e.g. ('mdf', 'links')), the input
+fields it is computed from (e.g. 'links', or 'source.name' for a nested
+field) and a function computing it from the payload.  emit() assembles the
+whole document from the sections, in order.
+
+After an edit, reemit() recomputes only the sections whose inputs changed,
+reuses the previously emitted values for the rest, and describes the
+difference as an RFC 6902 JSON patch, so a service can be sent the change
+instead of the whole document.
+
+references:
+    https://tools.ietf.org/html/rfc6902
+    https://tools.ietf.org/html/rfc6901
+"""
+
+from collections import namedtuple
+
+from matmeta.frozen import FrozenDict, FrozenList, freeze, thaw
+from matmeta.instrumentation import stage
+
+
+class _Marker(object):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+# returned by a section's compute function to leave the section out
+OMIT = _Marker('OMIT')
+# a field that is not in the payload (the value of a removed field)
+MISSING = _Marker('MISSING')
+_NOT_A_MAPPING = _Marker('NOT_A_MAPPING')
+
+
+class Section(namedtuple('Section', ['path', 'inputs', 'compute', 'items'])):
+    """
+    One part of an emitted document.
+
+    path:       tuple of keys locating the section in the output
+    inputs:     tuple of input field paths (tuples of keys) it depends on
+    compute:    compute(payload) returns the section's value, or OMIT
+    items:      for list sections that can be streamed (see
+                matmeta.streaming), items(payload) returns an iterator over
+                the list's items, or OMIT.  None otherwise.
+    """
+    __slots__ = ()
+
+
+def _collect(items):
+    def compute(payload):
+        iterator = items(payload)
+        return iterator if iterator is OMIT else list(iterator)
+    return compute
+
+
+def section(path, inputs, compute=None, items=None):
+    """
+    Build a Section from a key path and dotted input names, e.g.
+    section(('mdf', 'source_name'), ['source.name'], ...).
+
+    List sections may give items instead of compute; compute then collects
+    the items into a list.
+    """
+    if compute is None:
+        compute = _collect(items)
+    return Section(tuple(path), tuple(tuple(name.split('.')) for name in inputs), compute, items)
+
+
+def _lookup(data, keys):
+    """
+    The value at keys, or a marker saying where the lookup stopped.
+    """
+    for depth, key in enumerate(keys):
+        if not isinstance(data, dict):
+            return (_NOT_A_MAPPING, depth)
+        if key not in data:
+            return (MISSING, depth)
+        data = data[key]
+    return data
+
+
+def _get(document, path):
+    for key in path:
+        if not isinstance(document, dict) or key not in document:
+            return MISSING
+        document = document[key]
+    return document
+
+
+def assemble(sections, values):
+    """
+    Build a document from sections and their values, in section order.
+    Sections whose value is OMIT or MISSING are left out.
+    """
+    document = {}
+    for sec, value in zip(sections, values):
+        if value is OMIT or value is MISSING:
+            continue
+        parent = document
+        for key in sec.path[:-1]:
+            parent = parent.setdefault(key, {})
+        parent[sec.path[-1]] = value
+    return document
+
+
+@stage('emit')
+def emit(sections, payload):
+    """
+    Compute every section and return the assembled document.
+    """
+    return assemble(sections, [sec.compute(payload) for sec in sections])
+
+
+def affected(sections, before, payload):
+    """
+    Return the indices of the sections whose inputs differ between before
+    and the payload.
+
+    args:
+        sections:   the service's sections
+        before:     {changed field: its value before the change, or MISSING}
+        payload:    the changed payload
+    """
+    indices = []
+    for index, sec in enumerate(sections):
+        for keys in sec.inputs:
+            if keys[0] not in before:
+                continue
+            value = before[keys[0]]
+            old = (MISSING, 0) if value is MISSING else _lookup({keys[0]: value}, keys)
+            if old != _lookup(payload, keys):
+                indices.append(index)
+                break
+    return indices
+
+
+def pointer(path):
+    """
+    The JSON pointer for a sequence of keys and indices.
+    """
+    return ''.join(
+        '/' + str(key).replace('~', '~0').replace('/', '~1') for key in path
+    )
+
+
+def _same(old, new):
+    """
+    JSON equality: like ==, but True is not 1 and 1 is not 1.0.
+    """
+    if old is new:
+        return True
+    if old != new:
+        return False
+    if isinstance(old, dict):
+        if not isinstance(new, dict):
+            return False
+        for key, value in old.items():
+            if not _same(value, new[key]):
+                return False
+        return True
+    if isinstance(old, list):
+        if not isinstance(new, list):
+            return False
+        for index, value in enumerate(old):
+            if not _same(value, new[index]):
+                return False
+        return True
+    return type(old) is type(new) or (
+        isinstance(old, str) and isinstance(new, str)
+    )
+
+
+def _merge(old, new, path, patch):
+    """
+    Append to patch the operations that turn old into new, and return new
+    frozen, sharing the unchanged parts of old (which must be frozen).
+    """
+    if _same(old, new):
+        return old
+    if isinstance(old, dict) and isinstance(new, dict):
+        items = []
+        for key in old:
+            if key not in new:
+                patch.append({'op': 'remove', 'path': pointer(path + (key,))})
+        for key, value in new.items():
+            if key in old:
+                items.append((key, _merge(old[key], value, path + (key,), patch)))
+            else:
+                patch.append({'op': 'add', 'path': pointer(path + (key,)), 'value': thaw(value)})
+                items.append((key, freeze(value)))
+        return FrozenDict(items)
+    if isinstance(old, list) and isinstance(new, list):
+        common = min(len(old), len(new))
+        items = [
+            _merge(old[index], new[index], path + (index,), patch)
+            for index in range(common)
+        ]
+        for index in reversed(range(common, len(old))):
+            patch.append({'op': 'remove', 'path': pointer(path + (index,))})
+        for index in range(common, len(new)):
+            patch.append({'op': 'add', 'path': pointer(path + (index,)), 'value': thaw(new[index])})
+            items.append(freeze(new[index]))
+        return FrozenList(items)
+    patch.append({'op': 'replace', 'path': pointer(path), 'value': thaw(new)})
+    return freeze(new)
+
+
+def diff(old, new, path=()):
+    """
+    Return the add, remove and replace operations that turn old into new.
+    Dictionaries are compared key by key and lists item by item, with items
+    added or removed at the end.
+    """
+    patch = []
+    _merge(freeze(old), new, tuple(path), patch)
+    return patch
+
+
+@stage('reemit')
+def reemit(sections, document, before, payload):
+    """
+    Bring an emitted document up to date after the payload changed.
+
+    args:
+        sections:   the service's sections
+        document:   the document emitted before the change
+        before:     {changed field: its value before the change, or MISSING}
+        payload:    the changed payload
+
+    return:
+        (the new frozen document, an RFC 6902 patch from document to it)
+    """
+    indices = affected(sections, before, payload)
+    if not indices:
+        return document, []
+    values = [_get(document, sec.path) for sec in sections]
+    patch = []
+    for index in indices:
+        sec = sections[index]
+        old, new = values[index], sec.compute(payload)
+        if new is OMIT:
+            new = MISSING
+        if old is MISSING and new is MISSING:
+            continue
+        if old is MISSING:
+            patch.append({'op': 'add', 'path': pointer(sec.path), 'value': thaw(new)})
+        elif new is MISSING:
+            patch.append({'op': 'remove', 'path': pointer(sec.path)})
+        else:
+            new = _merge(old, new, sec.path, patch)
+        values[index] = new
+    return freeze(assemble(sections, values)), patch
+
+
+def _resolve(document, path):
+    parts = [
+        part.replace('~1', '/').replace('~0', '~') for part in path.split('/')[1:]
+    ]
+    if not parts:
+        raise ValueError('Cannot patch the document root')
+    parent = document
+    for part in parts[:-1]:
+        parent = parent[int(part)] if isinstance(parent, list) else parent[part]
+    return parent, parts[-1]
+
+
+def apply_patch(document, patch):
+    """
+    Return a patched copy of document.  Supports the add, remove and
+    replace operations that diff produces.
+    """
+    document = thaw(document)
+    for operation in patch:
+        parent, key = _resolve(document, operation['path'])
+        op = operation['op']
+        if isinstance(parent, list):
+            index = len(parent) if key == '-' else int(key)
+            if op == 'add':
+                parent.insert(index, thaw(operation['value']))
+            elif op == 'remove':
+                del parent[index]
+            elif op == 'replace':
+                parent[index] = thaw(operation['value'])
+            else:
+                raise ValueError('Unsupported patch operation %r' % op)
+        else:
+            if op in ('add', 'replace'):
+                if op == 'replace' and key not in parent:
+                    raise KeyError(operation['path'])
+                parent[key] = thaw(operation['value'])
+            elif op == 'remove':
+                del parent[key]
+            else:
+                raise ValueError('Unsupported patch operation %r' % op)
+    return document
+
+
+def update(payloads, changes):
+    """
+    Apply the same changes to several payloads (one per service) and return
+    {service name: RFC 6902 patch}.  See PublishablePayload.apply_changes.
+    """
+    return {payload.service: payload.apply_changes(changes) for payload in payloads}
@@ -0,0 +1,449 @@
+"""
+Submit emitted metadata to service endpoints.
+
+ingest() posts the metapayload of each payload to its service's endpoint as
+JSON.  Requests are made by a fixed number of asyncio workers over pooled
+HTTP/1.1 keep-alive connections, so many records can be uploaded at once
+without opening a connection per record.  Connection errors, timeouts and
+429/5xx responses are retried with exponential backoff (honouring
+Retry-After), and endpoints that accept lists of payloads can be sent
+several records per request.  Every record gets an IngestResult; failures
+are reported there instead of being raised.
+
+Examples
+--------
+>>> endpoints = {'citrine': Endpoint('https://example.org/pifs', batch_size=50)}
+>>> for result in ingest(payloads, endpoints, concurrency=16):
+...     if not result.ok:
+...         print(result.index, result.status, result.error)
+
+matmeta.stub_server.StubServer is a local endpoint for trying this out
+offline.
+"""
+
+import asyncio
+from collections import namedtuple
+import json
+import ssl
+
+from urllib.parse import urlsplit
+
+# statuses worth trying again
+RETRY_STATUSES = frozenset([408, 429, 500, 502, 503, 504])
+
+_NETWORK_ERRORS = (OSError, EOFError, asyncio.IncompleteReadError, asyncio.TimeoutError)
+
+
+class HTTPProtocolError(Exception):
+    """
+    The server sent something that is not an HTTP/1.x response.
+    """
+
+
+class Endpoint(object):
+    """
+    Where and how to submit one service's metadata.
+
+    args:
+        url:    the URL payloads are POSTed to
+        batch_size: number of payloads per request.  With 1 (the default)
+            each request body is a single payload; otherwise it is a JSON
+            list of up to batch_size payloads.
+        headers: extra request headers, e.g. {'Authorization': ...}
+    """
+
+    def __init__(self, url, batch_size=1, headers=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError('Unsupported endpoint URL %r' % url)
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.url = url
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self.batch_size = batch_size
+        self.headers = dict(headers or {})
+
+    @property
+    def origin(self):
+        return (self.scheme, self.host, self.port)
+
+    def __repr__(self):
+        return 'Endpoint(%r, batch_size=%d)' % (self.url, self.batch_size)
+
+
+class IngestResult(namedtuple('IngestResult', ['index', 'service', 'status', 'response', 'error', 'attempts'])):
+    """
+    The outcome of submitting one record.
+
+    index:      position of the record in the input
+    service:    the service it was submitted to
+    status:     the HTTP status of the last attempt, or None if no response
+                was received
+    response:   the response body (parsed if it is JSON)
+    error:      a description of the failure, or None
+    attempts:   number of requests made
+    """
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+class _Response(namedtuple('_Response', ['status', 'headers', 'body'])):
+    __slots__ = ()
+
+    def parsed_body(self):
+        if 'json' in self.headers.get('content-type', ''):
+            try:
+                return json.loads(self.body.decode('utf-8'))
+            except ValueError:
+                pass
+        return self.body.decode('utf-8', 'replace')
+
+    def retry_after(self):
+        try:
+            return max(0.0, float(self.headers['retry-after']))
+        except (KeyError, ValueError):
+            return None
+
+
+async def _read_headers(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise EOFError('connection closed before the response')
+    try:
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        status = int(status)
+    except ValueError:
+        raise HTTPProtocolError('bad status line %r' % status_line)
+    if not version.startswith('HTTP/1.'):
+        raise HTTPProtocolError('unsupported protocol %r' % version)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n'):
+            return version, status, headers
+        if not line:
+            raise EOFError('connection closed in the response headers')
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+
+def _parse_size(text, base, what):
+    try:
+        size = int(text, base)
+    except ValueError:
+        size = -1
+    if size < 0:
+        raise HTTPProtocolError('bad %s %r' % (what, text))
+    return size
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size = _parse_size((await reader.readline()).split(b';')[0], 16, 'chunk size')
+        if not size:
+            # trailers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+class _Connection(object):
+    __slots__ = ('reader', 'writer', 'reused')
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    async def request(self, endpoint, body):
+        head = [
+            'POST %s HTTP/1.1' % endpoint.target,
+            'Host: %s:%d' % (endpoint.host, endpoint.port),
+            'Content-Type: application/json',
+            'Content-Length: %d' % len(body),
+            'Connection: keep-alive',
+        ]
+        head.extend('%s: %s' % item for item in endpoint.headers.items())
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        version, status, headers = await _read_headers(self.reader)
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            data = await _read_chunked(self.reader)
+            keep_alive = True
+        elif 'content-length' in headers:
+            length = _parse_size(headers['content-length'], 10, 'Content-Length')
+            data = await self.reader.readexactly(length)
+            keep_alive = True
+        else:
+            data = await self.reader.read()
+            keep_alive = False
+        connection = headers.get('connection', '').lower()
+        if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+            keep_alive = False
+        return _Response(status, headers, data), keep_alive
+
+    def close(self):
+        self.writer.close()
+
+    async def wait_closed(self):
+        try:
+            await self.writer.wait_closed()
+        except (OSError, EOFError):
+            pass
+
+
+class _ConnectionPool(object):
+    """
+    Idle keep-alive connections to one origin (scheme, host, port).
+    """
+
+    def __init__(self, origin, max_idle):
+        self.origin = origin
+        self.max_idle = max_idle
+        self._idle = []
+        self.opened = 0
+
+    async def acquire(self):
+        while self._idle:
+            connection = self._idle.pop()
+            if not connection.reader.at_eof():
+                connection.reused = True
+                return connection
+            connection.close()
+        scheme, host, port = self.origin
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if scheme == 'https' else None
+        )
+        self.opened += 1
+        return _Connection(reader, writer)
+
+    def release(self, connection):
+        if len(self._idle) < self.max_idle:
+            self._idle.append(connection)
+        else:
+            connection.close()
+
+    async def close(self):
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+        for connection in idle:
+            await connection.wait_closed()
+
+
+def _as_endpoint(endpoint):
+    return endpoint if isinstance(endpoint, Endpoint) else Endpoint(endpoint)
+
+
+def _describe(ex):
+    return '%s: %s' % (type(ex).__name__, ex) if str(ex) else type(ex).__name__
+
+
+class Ingester(object):
+    """
+    Submit records to service endpoints.
+
+    args:
+        endpoints:  {service name: Endpoint or URL}
+        concurrency: maximum number of requests in flight
+        retries:    number of times a failed request is retried
+        backoff:    delay before the first retry, in seconds; it doubles
+            with each further retry
+        timeout:    seconds allowed for each request
+    """
+
+    def __init__(self, endpoints, concurrency=8, retries=3, backoff=0.1, timeout=30.0):
+        if concurrency < 1:
+            raise ValueError('concurrency must be at least 1')
+        self.endpoints = {
+            service: _as_endpoint(endpoint) for service, endpoint in endpoints.items()
+        }
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._pools = {}
+
+    def _pool(self, endpoint):
+        pool = self._pools.get(endpoint.origin)
+        if pool is None:
+            pool = self._pools[endpoint.origin] = _ConnectionPool(
+                endpoint.origin, self.concurrency
+            )
+        return pool
+
+    @property
+    def connections_opened(self):
+        return sum(pool.opened for pool in self._pools.values())
+
+    async def close(self):
+        """
+        Close the idle pooled connections.
+        """
+        pools = list(self._pools.values())
+        self._pools.clear()
+        for pool in pools:
+            await pool.close()
+
+    async def _request(self, endpoint, body):
+        pool = self._pool(endpoint)
+        while True:
+            connection = await pool.acquire()
+            try:
+                response, keep_alive = await asyncio.wait_for(
+                    connection.request(endpoint, body), self.timeout
+                )
+            except asyncio.TimeoutError:
+                # checked first: on Python 3.11+ it is also an OSError
+                connection.close()
+                raise
+            except (OSError, EOFError, asyncio.IncompleteReadError):
+                connection.close()
+                if connection.reused:
+                    continue  # the server closed an idle connection; not a failure
+                raise
+            except BaseException:
+                connection.close()
+                raise
+            if keep_alive:
+                pool.release(connection)
+            else:
+                connection.close()
+            return response
+
+    async def _post(self, endpoint, body):
+        """
+        Return (response or None, error or None, attempts).
+        """
+        attempts = 0
+        while True:
+            attempts += 1
+            response = error = delay = None
+            try:
+                response = await self._request(endpoint, body)
+            except _NETWORK_ERRORS + (HTTPProtocolError,) as ex:
+                error = _describe(ex)
+            else:
+                if 200 <= response.status < 300:
+                    return response, None, attempts
+                error = 'HTTP %d' % response.status
+                if response.status not in RETRY_STATUSES:
+                    return response, error, attempts
+                delay = response.retry_after()
+            if attempts > self.retries:
+                return response, error, attempts
+            if delay is None:
+                delay = self.backoff * 2 ** (attempts - 1)
+            await asyncio.sleep(delay)
+
+    def _groups(self, items):
+        """
+        Yield (endpoint, [(index, service, metadata)]) request groups, and
+        IngestResults for records that cannot be submitted.
+        """
+        pending = {}
+        for index, item in enumerate(items):
+            if isinstance(item, tuple):
+                service, metadata = item
+            else:
+                service, metadata = item.service, item.metapayload
+            endpoint = self.endpoints.get(service)
+            if endpoint is None:
+                yield IngestResult(index, service, None, None, 'no endpoint for service %r' % service, 0)
+                continue
+            group = pending.setdefault(service, [])
+            group.append((index, service, metadata))
+            if len(group) >= endpoint.batch_size:
+                yield endpoint, pending.pop(service)
+        for service, group in pending.items():
+            yield self.endpoints[service], group
+
+    async def _worker(self, queue, results):
+        while True:
+            task = await queue.get()
+            if task is None:
+                return
+            endpoint, group = task
+            if endpoint.batch_size == 1:
+                document = group[0][2]
+            else:
+                document = [metadata for _, _, metadata in group]
+            try:
+                body = json.dumps(document).encode('utf-8')
+            except (TypeError, ValueError) as ex:
+                response, error, attempts = None, _describe(ex), 0
+            else:
+                response, error, attempts = await self._post(endpoint, body)
+            status = response.status if response is not None else None
+            content = response.parsed_body() if response is not None else None
+            for index, service, _ in group:
+                results[index] = IngestResult(index, service, status, content, error, attempts)
+
+    async def submit(self, items):
+        """
+        Submit each item and return a list of IngestResults in input order.
+
+        args:
+            items:  PublishablePayload instances, or (service name, metadata)
+                pairs
+        """
+        results = {}
+        queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        workers = [
+            asyncio.ensure_future(self._worker(queue, results))
+            for _ in range(self.concurrency)
+        ]
+        try:
+            for task in self._groups(items):
+                if isinstance(task, IngestResult):
+                    results[task.index] = task
+                else:
+                    await queue.put(task)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for worker in workers:
+                worker.cancel()
+        return [results[index] for index in sorted(results)]
+
+
+async def ingest_async(items, endpoints, **options):
+    """
+    Coroutine version of ingest, for callers already running an event loop.
+    """
+    ingester = Ingester(endpoints, **options)
+    try:
+        return await ingester.submit(items)
+    finally:
+        await ingester.close()
+
+
+def ingest(items, endpoints, **options):
+    """
+    Submit records to service endpoints and return their IngestResults.
+
+    args:
+        items:  PublishablePayload instances, or (service name, metadata)
+            pairs
+        endpoints: {service name: Endpoint or URL}
+        options: see Ingester
+
+    return:
+        a list of IngestResult, one per item, in input order
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(ingest_async(items, endpoints, **options))
+    finally:
+        loop.close()
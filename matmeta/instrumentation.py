@@ -0,0 +1,265 @@
+"""
+Per-stage timing of validation and emission.
+
+Functions that do a distinct part of the work (validation, template
+construction, people and citation conversion, citation formatting,
+pif.dumps, ...) are marked with the stage decorator.  While instrumentation
+is enabled, each call to them is counted and timed, and optionally its
+allocations are measured with tracemalloc, in a Stats object.
+
+Marking a function costs nothing while instrumentation is disabled: the
+decorator returns the function itself, and enable() replaces it in its
+module or class with a timing wrapper, which disable() removes again.
+Enabling is therefore global to the process, and only calls that look the
+function up in its module or class are recorded: a name bound by
+'from module import function' still refers to the unwrapped function.
+Code in matmeta calls marked functions through their module for this
+reason.
+
+Stages nest (e.g. 'emit' includes 'citrine.reference'), so their times are
+inclusive and do not add up to the total.
+
+Examples
+--------
+>>> with instrumented() as stats:
+...     list(emit_stream(records))
+>>> print(stats.summary())
+>>> json.dump(stats.as_dict(), fp)
+"""
+
+from collections import namedtuple
+import functools
+import importlib
+import threading
+import time
+import tracemalloc
+
+
+class StageStats(namedtuple('StageStats', ['calls', 'seconds', 'allocated'])):
+    """
+    calls:      number of calls
+    seconds:    cumulative wall-clock time of the calls
+    allocated:  cumulative bytes allocated and still held when the calls
+        returned (0 unless memory was measured)
+    """
+    __slots__ = ()
+
+
+class Stats(object):
+    """
+    Counts, times and allocations per stage name.
+
+    args:
+        callback:   if given, called as callback(name, seconds, allocated)
+            after each instrumented call
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, allocated=0):
+        with self._lock:
+            totals = self._stages.get(name)
+            if totals is None:
+                totals = self._stages[name] = [0, 0.0, 0]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += allocated
+        if self.callback is not None:
+            self.callback(name, seconds, allocated)
+
+    def merge(self, stages):
+        """
+        Add the totals in stages, the as_dict() of another Stats (e.g. from
+        a worker process), to these.
+        """
+        with self._lock:
+            for name, stage_stats in stages.items():
+                totals = self._stages.get(name)
+                if totals is None:
+                    totals = self._stages[name] = [0, 0.0, 0]
+                totals[0] += stage_stats['calls']
+                totals[1] += stage_stats['seconds']
+                totals[2] += stage_stats['allocated']
+
+    def get(self, name):
+        totals = self._stages.get(name)
+        return StageStats(*totals) if totals else StageStats(0, 0.0, 0)
+
+    def as_dict(self):
+        """
+        {name: {'calls': ..., 'seconds': ..., 'allocated': ...}}, sorted by
+        name, for JSON output.
+        """
+        with self._lock:
+            return {
+                name: StageStats(*self._stages[name])._asdict()
+                for name in sorted(self._stages)
+            }
+
+    def summary(self):
+        """
+        A table of the stages, slowest first.
+        """
+        with self._lock:
+            stages = [(name, StageStats(*totals)) for name, totals in self._stages.items()]
+        stages.sort(key=lambda item: -item[1].seconds)
+        width = max([len(name) for name, _ in stages] + [5])
+        lines = ['%-*s %10s %12s %13s %15s' % (
+            width, 'stage', 'calls', 'total (s)', 'per call (us)', 'allocated (KiB)'
+        )]
+        for name, stage_stats in stages:
+            lines.append('%-*s %10d %12.4f %13.1f %15.1f' % (
+                width, name, stage_stats.calls, stage_stats.seconds,
+                stage_stats.seconds * 1e6 / stage_stats.calls,
+                stage_stats.allocated / 1024.0,
+            ))
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+
+# (name, module name, qualified name) of each marked function
+_stages = []
+# while enabled: the Stats, whether memory is measured, the replaced
+# (module name, qualified name, original function) entries and whether
+# enable() started tracemalloc
+_active = None
+
+
+def _owner(module_name, qualname):
+    owner = importlib.import_module(module_name)
+    parts = qualname.split('.')
+    for part in parts[:-1]:
+        owner = getattr(owner, part)
+    return owner, parts[-1]
+
+
+def _timed(name, function, stats, memory):
+    perf_counter = time.perf_counter
+    record = stats.record
+    if memory:
+        traced = tracemalloc.get_traced_memory
+
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            before = traced()[0]
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                record(name, elapsed, max(0, traced()[0] - before))
+    else:
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, perf_counter() - start)
+    return timed
+
+
+def stage(name):
+    """
+    Mark a module-level function or a method as the stage name.
+
+    Only functions that return their result should be marked: the time of a
+    generator is the time to create it.
+    """
+    def mark(function):
+        _stages.append((name, function.__module__, function.__qualname__))
+        if _active is not None:
+            # defined while enabled (e.g. a lazily imported module): the
+            # wrapper is replaced by the function itself on disable
+            stats, memory, replaced, _ = _active
+            replaced.append((function.__module__, function.__qualname__, function))
+            return _timed(name, function, stats, memory)
+        return function
+    return mark
+
+
+def stages():
+    """
+    The names of the marked stages in the modules imported so far.
+    """
+    return sorted(set(name for name, _, _ in _stages))
+
+
+def enable(memory=False, callback=None, stats=None):
+    """
+    Start recording the marked stages.
+
+    args:
+        memory:     also measure allocations with tracemalloc, which is
+            started if needed.  This slows the instrumented code down a lot.
+        callback:   see Stats
+        stats:      the Stats to record into (default: a new one)
+
+    return:
+        the Stats
+    """
+    global _active
+    disable()
+    if stats is None:
+        stats = Stats(callback)
+    elif callback is not None:
+        stats.callback = callback
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    replaced = []
+    for name, module_name, qualname in _stages:
+        owner, attribute = _owner(module_name, qualname)
+        function = owner.__dict__[attribute]
+        replaced.append((module_name, qualname, function))
+        setattr(owner, attribute, _timed(name, function, stats, memory))
+    _active = (stats, memory, replaced, started)
+    return stats
+
+
+def disable():
+    """
+    Stop recording, and restore the marked functions.
+    """
+    global _active
+    if _active is None:
+        return
+    _, _, replaced, started = _active
+    _active = None
+    for module_name, qualname, function in reversed(replaced):
+        owner, attribute = _owner(module_name, qualname)
+        setattr(owner, attribute, function)
+    if started:
+        tracemalloc.stop()
+
+
+def active():
+    """
+    A (Stats, memory) pair for the current recording, or None if
+    instrumentation is disabled.
+    """
+    if _active is None:
+        return None
+    return _active[0], _active[1]
+
+
+class instrumented(object):
+    """
+    Context manager enabling instrumentation for its block; see enable.
+    It returns the Stats.
+    """
+
+    def __init__(self, memory=False, callback=None, stats=None):
+        self.options = {'memory': memory, 'callback': callback, 'stats': stats}
+
+    def __enter__(self):
+        return enable(**self.options)
+
+    def __exit__(self, *exc_info):
+        disable()
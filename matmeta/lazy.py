@@ -0,0 +1,25 @@
+"""
+Deferred imports.
+
+A LazyModule stands in for a module and imports it on first attribute
+access, so that optional or heavy dependencies (pypif) cost nothing for
+processes that never use them.
+"""
+
+import importlib
+
+
+class LazyModule(object):
+
+    def __init__(self, name):
+        self._lazy_name = name
+        self._lazy_module = None
+
+    def __getattr__(self, attribute):
+        # only called for attributes that are not set on the instance
+        if self._lazy_module is None:
+            self._lazy_module = importlib.import_module(self._lazy_name)
+        return getattr(self._lazy_module, attribute)
+
+    def __repr__(self):
+        return '<lazy module %r>' % self._lazy_name
@@ -0,0 +1,217 @@
+"""
+Per-record memory profiling of batch runs.
+
+A few giant records can make a batch worker run out of memory, and nothing
+says which ones.  With a MemoryProfile, emit_stream (and emit_parallel)
+convert each record for one service at a time under tracemalloc, and
+record the peak memory allocated while converting it and the size of the
+emitted JSON.  Records above a threshold are kept as outliers, along with
+the largest records seen, and per-service totals are kept for all
+records.
+
+Profiling converts each record once per service and traces every
+allocation, so it is several times slower than a normal run; it is meant
+for finding problem records, not for production runs.  To keep giant
+records from being converted at all, read the input with
+read_jsonl(fp, max_size=..., quarantine=...).
+
+Examples
+--------
+>>> with MemoryProfile(peak_threshold=50 * 2 ** 20) as profile:
+...     for result in emit_stream(read_jsonl(fp), id_key='links.landing_page', profile=profile):
+...         ...
+>>> for entry in profile.outliers:
+...     print(entry.record_id, entry.service, entry.peak, entry.size)
+>>> print(profile.summary())
+"""
+
+from collections import namedtuple
+import heapq
+import itertools
+import tracemalloc
+
+from matmeta import batch, serializers
+from matmeta.services import registry
+
+
+class RecordMemory(namedtuple('RecordMemory', ['index', 'record_id', 'service', 'peak', 'size'])):
+    """
+    The memory used to convert one record for one service.
+
+    index:      position of the record in the input stream
+    record_id:  the record's id (see matmeta.batch.EmitResult)
+    service:    the service
+    peak:       peak bytes allocated while converting it
+    size:       bytes of its emitted JSON, or None if conversion failed
+    """
+    __slots__ = ()
+
+
+class ServiceMemory(namedtuple('ServiceMemory', ['records', 'total_peak', 'max_peak',
+                                                 'total_size', 'max_size'])):
+    """
+    Totals over the records converted for one service.
+    """
+    __slots__ = ()
+
+
+def _measure(emit, record, service, interner):
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    payloads, errors = emit(record, [service], interner)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    payload = payloads.get(service)
+    size = len(serializers.dumps(payload, sort_keys=False)) if payload is not None else None
+    return payloads, errors, peak, size
+
+
+class MemoryProfile(object):
+    """
+    args:
+        peak_threshold: records whose conversion for a service allocates
+            more than this many bytes at its peak are outliers
+        size_threshold: records whose emitted JSON for a service is larger
+            than this many bytes are outliers
+        keep:       number of largest (by peak) entries kept in largest
+        callback:   if given, called with the RecordMemory of each outlier
+            as it is found
+
+    tracemalloc is started by start() (or the with statement) if it is not
+    already running, and stopped again by stop().
+    """
+
+    def __init__(self, peak_threshold=None, size_threshold=None, keep=20, callback=None):
+        self.peak_threshold = peak_threshold
+        self.size_threshold = size_threshold
+        self.keep = keep
+        self.callback = callback
+        self.outliers = []
+        # heap of (peak, tie breaker, RecordMemory)
+        self._largest = []
+        self._counter = itertools.count()
+        self._services = {}
+        # measurements of the record being converted: (service, peak, size)
+        self._pending = []
+        self._started = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        return self
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def emit_record(self, record, services=None, interner=None):
+        """
+        matmeta.batch.emit_record, measuring each service separately.  The
+        measurements are added by finish().
+        """
+        if not isinstance(record, dict):
+            return batch.emit_record(record, services, interner)
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('MemoryProfile.emit_record needs tracemalloc; call start() first')
+        payloads = {}
+        errors = []
+        for service in registry.select(services):
+            emitted, failed, peak, size = _measure(batch.emit_record, record, service, interner)
+            payloads.update(emitted)
+            errors.extend(failed)
+            self._pending.append((service, peak, size))
+        return payloads, errors
+
+    def finish(self, result):
+        """
+        Add the measurements of the record of result (an EmitResult).
+        """
+        pending, self._pending = self._pending, []
+        for service, peak, size in pending:
+            self.add(RecordMemory(result.index, result.record_id, service, peak, size))
+
+    def is_outlier(self, entry):
+        return (
+            (self.peak_threshold is not None and entry.peak > self.peak_threshold)
+            or (self.size_threshold is not None and entry.size is not None
+                and entry.size > self.size_threshold)
+        )
+
+    def add(self, entry):
+        """
+        Add one RecordMemory, e.g. measured in a worker process.
+        """
+        totals = self._services.get(entry.service)
+        if totals is None:
+            totals = self._services[entry.service] = [0, 0, 0, 0, 0]
+        size = entry.size or 0
+        totals[0] += 1
+        totals[1] += entry.peak
+        totals[2] = max(totals[2], entry.peak)
+        totals[3] += size
+        totals[4] = max(totals[4], size)
+        if self.keep:
+            item = (entry.peak, next(self._counter), entry)
+            if len(self._largest) < self.keep:
+                heapq.heappush(self._largest, item)
+            elif item[0] > self._largest[0][0]:
+                heapq.heapreplace(self._largest, item)
+        if self.is_outlier(entry):
+            self.outliers.append(entry)
+            if self.callback is not None:
+                self.callback(entry)
+
+    @property
+    def largest(self):
+        """
+        The entries with the highest peaks, highest first.
+        """
+        return [entry for _, _, entry in sorted(self._largest, reverse=True)]
+
+    def service(self, name):
+        totals = self._services.get(name)
+        return ServiceMemory(*totals) if totals else ServiceMemory(0, 0, 0, 0, 0)
+
+    def as_dict(self):
+        """
+        The profile as a JSON-serializable dictionary.
+        """
+        return {
+            'services': {
+                name: self.service(name)._asdict() for name in sorted(self._services)
+            },
+            'outliers': [entry._asdict() for entry in self.outliers],
+            'largest': [entry._asdict() for entry in self.largest],
+        }
+
+    def summary(self):
+        """
+        A table of the services, followed by the outliers.
+        """
+        lines = ['%-24s %10s %15s %15s %15s %15s' % (
+            'service', 'records', 'mean peak (KiB)', 'max peak (KiB)',
+            'mean size (KiB)', 'max size (KiB)'
+        )]
+        for name in sorted(self._services):
+            totals = self.service(name)
+            lines.append('%-24s %10d %15.1f %15.1f %15.1f %15.1f' % (
+                name, totals.records, totals.total_peak / 1024.0 / totals.records,
+                totals.max_peak / 1024.0, totals.total_size / 1024.0 / totals.records,
+                totals.max_size / 1024.0,
+            ))
+        if self.outliers:
+            lines.append('')
+            lines.append('outliers:')
+            for entry in self.outliers:
+                lines.append('  %s (index %d) %s: peak %.1f KiB, size %s' % (
+                    entry.record_id, entry.index, entry.service, entry.peak / 1024.0,
+                    '%.1f KiB' % (entry.size / 1024.0) if entry.size is not None else '-'
+                ))
+        return '\n'.join(lines)
@@ -0,0 +1,237 @@
+"""
+Random access to the records of a JSON Lines file by id.
+
+Reconverting a few records of a large catalog (e.g. the failures of the
+last run) with read_jsonl means parsing the whole file.  IndexedJSONL scans
+the file once and writes a sidecar index of the byte offset of each record
+and its id; afterwards it reads single records from a memory map of the
+file, without touching the rest.
+
+Records are numbered as read_jsonl numbers them (blank lines are skipped),
+so the index of a record is the same as in a full emit_stream run.  A
+record without an id (or with a list or object at id_key) is found by its
+index; if several records have the same id, the last one is found.
+
+The sidecar is rebuilt when the file's size or modification time, or
+id_key, differ from when it was written.
+
+Examples
+--------
+>>> with IndexedJSONL('catalog.jsonl', id_key='links.landing_page') as reader:
+...     indexes, missing = reader.select(failed_ids)
+...     for result in emit_stream(reader.records(indexes), indexes=indexes,
+...                               id_key='links.landing_page'):
+...         ...
+"""
+
+import json
+import mmap
+import os
+
+from matmeta.batch import InvalidRecord, OversizedRecord, record_id
+
+# bumped when the sidecar layout changes
+_FORMAT = 1
+
+# bytes read at a time when counting lines for an error message
+_BLOCK = 1 << 20
+
+
+class IndexedJSONL(object):
+    """
+    A JSON Lines file of common payloads, with an index of its records.
+
+    args:
+        path:       the JSON Lines file
+        id_key:     dotted path of the field identifying each record (see
+            matmeta.batch.record_id).  If None, records are found by index
+            only.
+        index_path: the sidecar index file (default: path + '.idx').  It is
+            created or rebuilt as needed.
+    """
+
+    def __init__(self, path, id_key=None, index_path=None):
+        self.path = path
+        self.id_key = id_key
+        self.index_path = index_path or path + '.idx'
+        self._file = open(path, 'rb')
+        stat = os.fstat(self._file.fileno())
+        self._signature = [stat.st_size, stat.st_mtime_ns]
+        # mmap cannot map an empty file
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if stat.st_size else b''
+        if not self._load():
+            self._build()
+            self._save()
+
+    def _build(self):
+        data = self._map
+        find = data.find
+        offsets = []
+        ids = []
+        position = 0
+        size = len(data)
+        while position < size:
+            end = find(b'\n', position)
+            if end < 0:
+                end = size
+            line = data[position:end]
+            if line.strip():
+                if self.id_key is not None:
+                    try:
+                        value = record_id(json.loads(line), self.id_key)
+                    except ValueError:
+                        value = None
+                    # such records are found by index, as emit_stream
+                    # cannot use the value as a key either
+                    ids.append(None if isinstance(value, (list, dict)) else value)
+                offsets.append(position)
+            position = end + 1
+        self._offsets = offsets
+        self._ids = ids if self.id_key is not None else None
+        self._positions = None
+
+    def _load(self):
+        try:
+            with open(self.index_path) as fp:
+                saved = json.load(fp)
+        except (IOError, ValueError):
+            return False
+        if (saved.get('format') != _FORMAT or saved.get('signature') != self._signature
+                or saved.get('id_key') != self.id_key):
+            return False
+        self._offsets = saved['offsets']
+        self._ids = saved['ids']
+        self._positions = None
+        return True
+
+    def _save(self):
+        text = json.dumps({
+            'format': _FORMAT,
+            'signature': self._signature,
+            'id_key': self.id_key,
+            'offsets': self._offsets,
+            'ids': self._ids,
+        }, separators=(',', ':'))
+        # written under another name first, so that a reader never sees a
+        # partial index
+        partial = self.index_path + '.partial'
+        with open(partial, 'w') as fp:
+            fp.write(text)
+        os.replace(partial, self.index_path)
+
+    def _id_positions(self):
+        if self._positions is None:
+            positions = {}
+            for index, value in enumerate(self._ids or ()):
+                if value is not None:
+                    positions[value] = index
+            self._positions = positions
+        return self._positions
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def index_of(self, record_id):
+        """
+        Return the index of the record with id record_id.  Records without
+        an id are found by their index.  KeyError is raised if there is no
+        such record.
+        """
+        index = self._id_positions().get(record_id)
+        if index is not None:
+            return index
+        if (type(record_id) is int and 0 <= record_id < len(self._offsets)
+                and (self._ids is None or self._ids[record_id] is None)):
+            return record_id
+        raise KeyError(record_id)
+
+    def __contains__(self, record_id):
+        try:
+            self.index_of(record_id)
+        except KeyError:
+            return False
+        return True
+
+    def select(self, record_ids):
+        """
+        Look up many ids at once.
+
+        return:
+            An (indexes, missing) tuple: the indexes of the records found,
+            sorted and without duplicates, so that reading them goes through
+            the file once in order; and the ids not found, in the order
+            given.
+        """
+        indexes = set()
+        missing = []
+        for value in record_ids:
+            try:
+                indexes.add(self.index_of(value))
+            except (KeyError, TypeError):
+                missing.append(value)
+        return sorted(indexes), missing
+
+    def line(self, index):
+        """
+        The bytes of the record at index, without the line break.
+        """
+        start = self._offsets[index]
+        end = self._map.find(b'\n', start)
+        return self._map[start:end if end >= 0 else len(self._map)]
+
+    def _line_number(self, index):
+        # only needed to report invalid JSON, so it is counted when needed
+        start = self._offsets[index]
+        count = 1
+        for block in range(0, start, _BLOCK):
+            count += self._map[block:min(block + _BLOCK, start)].count(b'\n')
+        return count
+
+    def read(self, index):
+        """
+        Parse the record at index.  Invalid JSON is returned as an
+        InvalidRecord, as read_jsonl yields it.
+        """
+        try:
+            return json.loads(self.line(index))
+        except ValueError as ex:
+            return InvalidRecord(line=self._line_number(index), error=str(ex))
+
+    def __getitem__(self, record_id):
+        """
+        Parse the record with id record_id (see index_of).
+        """
+        return self.read(self.index_of(record_id))
+
+    def records(self, indexes, max_size=None, quarantine=None):
+        """
+        Yield the records at indexes, for emit_stream(..., indexes=indexes).
+
+        args:
+            max_size, quarantine: as for read_jsonl, with the size in bytes
+        """
+        for index in indexes:
+            if max_size is not None:
+                line = self.line(index)
+                if len(line.rstrip(b'\r')) > max_size:
+                    if quarantine is not None:
+                        quarantine.write(line.decode('utf-8', 'replace') + '\n')
+                    yield OversizedRecord(
+                        line=self._line_number(index), size=len(line.rstrip(b'\r')), limit=max_size
+                    )
+                    continue
+            yield self.read(index)
+
+    def close(self):
+        if self._file is not None:
+            if self._map:
+                self._map.close()
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,243 @@
+"""
+Parallel batch conversion on a process pool.
+
+emit_parallel splits the input into chunks, converts the chunks on a
+concurrent.futures process pool and yields EmitResults in input order.  Only
+a bounded number of chunks are in flight at once, so memory use stays
+constant for arbitrarily long inputs.
+
+Failures inside a record are reported in its EmitResult, exactly as with
+emit_stream.  If a whole chunk fails, every record of that chunk gets an
+error result and the run continues.  When a worker process dies, the pool
+is replaced and the chunks it was running are run again; a chunk is only
+reported as failed if it also crashes a pool of its own.
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import itertools
+import os
+
+from matmeta import instrumentation
+from matmeta.batch import EmitResult, emit_stream, index_result, record_id
+from matmeta.fingerprint import FingerprintCache
+from matmeta.interning import Interner
+from matmeta.memprofile import MemoryProfile
+
+# each worker process interns into its own table, kept across chunks
+_interner = None
+# and opens each fingerprint cache once: {(path, version): FingerprintCache}
+_caches = {}
+
+
+def _worker_cache(path, version):
+    cache = _caches.get((path, version))
+    if cache is None:
+        cache = _caches[path, version] = FingerprintCache(path, version=version)
+    return cache
+
+
+def _worker_stats(memory):
+    current = instrumentation.active()
+    if current is None or current[1] != memory:
+        return instrumentation.enable(memory=memory)
+    # inherited from the parent by a forked worker: the parent's callback
+    # is not called from workers
+    stats = current[0]
+    stats.callback = None
+    stats.reset()
+    return stats
+
+
+class _WorkerProfile(MemoryProfile):
+    """
+    Keeps every measurement, for the parent's MemoryProfile to add.
+    """
+
+    def __init__(self):
+        super(_WorkerProfile, self).__init__(keep=0)
+        self.entries = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+
+
+def _emit_chunk(start, records, services, id_key, intern=False, cache=None,
+                skip_unchanged=False, instrument=None, indexes=None, profile=False):
+    """
+    Convert a chunk in a worker process.
+
+    return:
+        the chunk's EmitResults; the stage stats recorded while converting
+        it if instrument is not None, or else None; and if profile is true,
+        the chunk's RecordMemory measurements, or else None
+    """
+    global _interner
+    stats = None
+    if instrument is not None:
+        stats = _worker_stats(instrument)
+    interner = None
+    if intern:
+        if _interner is None:
+            _interner = Interner()
+        interner = _interner
+    if cache is not None:
+        cache = _worker_cache(*cache)
+    profiler = _WorkerProfile().start() if profile else None
+    try:
+        results = list(emit_stream(
+            records, services=services, id_key=id_key, start=start,
+            interner=interner, cache=cache, skip_unchanged=skip_unchanged,
+            indexes=indexes, profile=profiler
+        ))
+    finally:
+        if profiler is not None:
+            profiler.stop()
+    return (
+        results,
+        stats.as_dict() if stats is not None else None,
+        profiler.entries if profiler is not None else None,
+    )
+
+
+def _failed_chunk(start, records, id_key, ex, indexes=None):
+    error = {'service': None, 'error': '%s: %s' % (type(ex).__name__, ex)}
+    return [
+        EmitResult(
+            index=index,
+            record_id=record_id(record, id_key, default=index),
+            payloads={},
+            errors=[dict(error)],
+        )
+        for index, record in (
+            enumerate(records, start) if indexes is None else zip(indexes, records)
+        )
+    ]
+
+
+def _chunks(records, chunk_size, indexes=None):
+    # yield (start, records, their indexes or None) per chunk
+    iterator = iter(records)
+    if indexes is not None:
+        indexes = iter(indexes)
+    start = 0
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        chunk_indexes = None
+        if indexes is not None:
+            chunk_indexes = list(itertools.islice(indexes, len(chunk)))
+        yield start, chunk, chunk_indexes
+        start += len(chunk)
+
+
+def emit_parallel(records, services=None, id_key=None, workers=None,
+                  chunk_size=64, max_pending=None, intern=False, cache=None,
+                  skip_unchanged=False, catalog=None, indexes=None, profile=None):
+    """
+    Convert records on a process pool, yielding EmitResults in input order.
+
+    args:
+        records:    an iterable of common payload dictionaries
+        services:   a list of service names.  None means all services.
+        id_key:     see emit_stream
+        workers:    number of worker processes (default: os.cpu_count())
+        chunk_size: number of records sent to a worker at a time
+        max_pending: maximum number of chunks in flight (default: 2 per
+            worker)
+        intern:     intern repeated people, licenses and citations in each
+            worker (see matmeta.interning)
+        cache:      a matmeta.fingerprint.FingerprintCache backed by a file.
+            Each worker opens the file and reads and writes it directly.
+        skip_unchanged: see emit_stream
+        catalog:    a matmeta.catalog.CatalogIndex, updated in this process
+            as results arrive (see emit_stream)
+        indexes:    see emit_stream
+        profile:    a matmeta.memprofile.MemoryProfile.  Workers measure
+            each record, and the measurements are added to it (and its
+            callback called) in this process as chunks complete.
+
+    If instrumentation is enabled (see matmeta.instrumentation), the
+    workers record the same stages, and their stats are added to the
+    active Stats as chunks complete.  Its callback is not called for
+    stages recorded in workers.
+    """
+    workers = workers or os.cpu_count() or 1
+    if cache is not None:
+        if cache.path == ':memory:':
+            raise ValueError('emit_parallel needs a FingerprintCache backed by a file')
+        # workers see the parent's committed writes, and the parent theirs
+        cache.commit()
+        cache = (cache.path, cache.version)
+    recording = instrumentation.active()
+    instrument = recording[1] if recording is not None else None
+    max_pending = max_pending or 2 * workers
+    executor = ProcessPoolExecutor(max_workers=workers)
+    # [start, chunk, chunk_indexes, future, the executor running it]
+    pending = deque()
+
+    def submit(pool, start, chunk, chunk_indexes):
+        return pool.submit(
+            _emit_chunk, start, chunk, services, id_key, intern, cache,
+            skip_unchanged, instrument, chunk_indexes, profile is not None
+        )
+
+    def recover(broken):
+        # every chunk still running in a broken pool fails with it: run them
+        # again in a new pool, keeping the results that arrived in time
+        nonlocal executor
+        if broken is executor:
+            executor.shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers)
+        for entry in pending:
+            if entry[4] is broken and isinstance(entry[3].exception(), BrokenProcessPool):
+                entry[3] = submit(executor, *entry[:3])
+                entry[4] = executor
+
+    def run_alone(start, chunk, chunk_indexes):
+        # a chunk whose pool broke runs again in a pool of its own, so that
+        # only a chunk that crashes it by itself is reported as failed
+        pool = ProcessPoolExecutor(max_workers=1)
+        try:
+            return submit(pool, start, chunk, chunk_indexes).result()
+        finally:
+            pool.shutdown(wait=True)
+
+    def collect(start, chunk, chunk_indexes, future, pool):
+        try:
+            try:
+                results, stages, entries = future.result()
+            except BrokenProcessPool:
+                recover(pool)
+                results, stages, entries = run_alone(start, chunk, chunk_indexes)
+        except Exception as ex:
+            return _failed_chunk(start, chunk, id_key, ex, chunk_indexes)
+        if stages:
+            recording[0].merge(stages)
+        for entry in entries or ():
+            profile.add(entry)
+        if catalog is not None:
+            for result, record in zip(results, chunk):
+                index_result(catalog, result, record)
+        return results
+
+    try:
+        for start, chunk, chunk_indexes in _chunks(records, chunk_size, indexes):
+            if len(pending) >= max_pending:
+                for result in collect(*pending.popleft()):
+                    yield result
+            try:
+                future = submit(executor, start, chunk, chunk_indexes)
+            except BrokenProcessPool:
+                recover(executor)
+                future = submit(executor, start, chunk, chunk_indexes)
+            pending.append([start, chunk, chunk_indexes, future, executor])
+        while pending:
+            for result in collect(*pending.popleft()):
+                yield result
+    finally:
+        for entry in pending:
+            entry[3].cancel()
+        executor.shutdown(wait=True)
@@ -6,53 +6,61 @@ Services:
     Materials Data Facility:    <link>
     Materials Commons:          <link>
 
-TODO: move service metadata requirements (as specified in the output of 
-the get_common_payload_metadata function) to a config file.
+Service metadata requirements live in matmeta.services, where they are merged
+and cached once per subset of services.
 """
 
-from pypif import pif
-import pypif.obj as pobj
+from collections import namedtuple
 import json
-import datetime
-
-
-def _citrine_metadata_requirements():
-    return {} # no metadata is required
-
-
-def _materials_commons_metadata_requirements():
-    return {
-        'source': {
-            'name': 'string'
-        },
-        'description': 'string'
-    }
-
-
-def _materials_data_facility_metadata_requirements():
-    return {
-        'title': 'string',
-        'source': {
-            'name': 'string',
-        },
-        'data_contacts': [
-            {
-                'given_name': 'string',
-                'family_name': 'string',
-                'email': 'string',
-            }
-        ],
-        'data_contributors': [
-            {
-                'given_name': 'string',
-                'family_name': 'string',
-                'email': 'string',
-            }
-        ],
-        'links': {
-            'landing_page': 'uri (string)'
-        },
-    }
+import warnings
+
+from matmeta import incremental
+from matmeta.frozen import FrozenDict, freeze, thaw
+from matmeta.instrumentation import stage
+from matmeta.interning import converted
+from matmeta.lazy import LazyModule
+from matmeta.records import Record
+from matmeta.services import (
+    registry,
+    _citrine_metadata_requirements,
+    _materials_commons_metadata_requirements,
+    _materials_data_facility_metadata_requirements,
+)
+from matmeta.validation import (
+    ValidationError,
+    compile_requirements,
+    get_validator,
+)
+
+# Service emitters are imported on first use.  pypif in particular is only
+# needed by CITPayload.reference_metapayload.
+citations = LazyModule('matmeta.citations')
+citrine = LazyModule('matmeta.citrine')
+ingest = LazyModule('matmeta.ingest')
+serializers = LazyModule('matmeta.serializers')
+streaming = LazyModule('matmeta.streaming')
+pif = LazyModule('pypif.pif')
+pobj = LazyModule('pypif.obj')
+
+
+# id(requirements) -> (requirements, CompiledValidator), for frozen
+# requirements only: they cannot change, so compiling them once is safe.  The
+# entry holds on to them so that their id is not reused.
+_compiled_requirements = {}
+_MAX_COMPILED = 64
+
+
+def _compiled(requirements):
+    if not isinstance(requirements, FrozenDict):
+        return compile_requirements(requirements)
+    entry = _compiled_requirements.get(id(requirements))
+    if entry is None or entry[0] is not requirements:
+        if len(_compiled_requirements) >= _MAX_COMPILED:
+            _compiled_requirements.clear()
+        entry = _compiled_requirements[id(requirements)] = (
+            requirements, compile_requirements(requirements)
+        )
+    return entry[1]
 
 
 def _validate_inputs(actual_inputs, required_inputs, keypath=None):
@@ -64,27 +72,25 @@ def _validate_inputs(actual_inputs, required_inputs, keypath=None):
             PublishablePayload
         required_inputs: the object/dictionary containing keys (and subkeys)
             for required fields.  (See get_common_payload_template.)
-        keypath: used internally in recursive function calls.
+        keypath: prefix for the keypaths reported in the exception.
 
     return:
-        Nothing.  An exception will be raised if a problem is encountered.
+        Nothing.  A ValidationError listing every problem will be raised if
+        a problem is encountered.
+
+    Frozen requirements (e.g. the template's required_fields) are compiled
+    once and the result reused; other dictionaries are compiled on every
+    call.  Payload classes use the cached validators from
+    matmeta.validation.get_validator.
     """
-    actual_keys = set(actual_inputs.keys())
-    required_keys = set(required_inputs.keys())
-    if actual_keys.intersection(required_keys) != required_keys:
-        prefix = '%s.' if keypath else ''
-        output_keys = {'%s%s' % (prefix, key) for key in required_keys}
-        raise Exception("Missing input fields.  Expected %s." % ', '.join(output_keys))
-    for key in required_keys:
-        # TODO: review the following usage of isinstance.
-        # Will this always be appropriate, given duck typing?
-        if isinstance(required_inputs[key], dict):
-            new_keypath = key if not keypath else '%s.%s' % (keypath, key)
-            _validate_inputs(
-                actual_inputs=actual_inputs[key],
-                required_inputs=required_inputs[key],
-                keypath=new_keypath
-            )
+    problems = _compiled(required_inputs).validate(actual_inputs)
+    if problems:
+        if keypath:
+            problems = [
+                problem._replace(keypath='%s.%s' % (keypath, problem.keypath))
+                for problem in problems
+            ]
+        raise ValidationError(problems)
 
 
 def _citation_to_string(citation):
@@ -95,191 +101,266 @@ def _citation_to_string(citation):
         citation:   a dictionary potentially containing all fields from
             pypif.obj.Reference, and possibly a few others
 
-    TODO: This is tedious and fragile.  Find a better way to get 'er done.
-    TODO: This function assumes that citations are either to books or journals.
-        urls are ignored.
+    Formatting is done by matmeta.citations with the default ('ssf') style,
+    which handles journal, book and url references and caches its results.
 
     references: 
         http://citrineinformatics.github.io/pif-documentation/schema_definition/common/Reference.html
         http://www.scientificstyleandformat.org/Tools/SSF-Citation-Quick-Guide.html
     """
-    output = ''
-    sep = '. '
-
-    if 'authors' in citation:
-        authors = []
-        for author in citation['authors']:
-            if 'family_name' not in author:
-                continue
-            author_name = author['family_name']
-            if 'given_name' in author:
-                author_name += ' ' + author['given_name']
-            authors.append(author_name)
-        output += ', '.join(authors) + sep
-    if 'year' in citation:
-        output += str(citation['year']) + sep
-    if 'title' in citation:
-        output += citation['title'] + sep
-
-    if 'journal' in citation:
-        output += citation['journal'] + sep
-        if 'volume' in citation:
-            output += citation['volume']
-            if 'issue' in citation:
-                output += '(' + citation['issue'] + ')'
-            if 'page_location' in citation:
-                output += ':' + citation['page_location'] + sep
-    else:   # assume for now that the reference is to a book
-            # TODO(Handle url case.)
-        if 'edition' in citation:
-            output += citation['edition'] + sep
-        if 'publication_location' in citation:
-            output += citation['publication_location']
-            if 'publisher' in citation:
-                output += ': ' + citation['publisher'] + sep
-        elif 'publisher' in citation:
-            output += citation['publisher'] + sep
-        if 'extent' in citation:
-            output += citation['extent'] + sep
-        if 'notes' in citation:
-            output += citation['notes'] + sep
-
-    return output.strip()
-
-
-def get_common_payload_template(services=None):
+    return citations.format_citation(citation)
+
+
+# resolved services -> (their requirements, frozen template)
+_templates = {}
+
+
+@stage('template')
+def get_common_payload_template(services=None, mutable=False):
     """
     Get a template dictionary that can be used to create a payload object.
 
-    TODO: services s/b a list. Specify required fields for each service in list.
-        None means all services.
+    args:
+        services:   a list of service names.  Required fields are combined
+            for each service in the list.  None (or a list naming no known
+            service) means all services.
+        mutable:    if True, return a new mutable copy instead of the
+            shared, frozen template.
+
+    return:
+        The template is built once per set of services, from the
+        requirements cached by matmeta.services.registry.
     """
-    available_services = {'citrine', 'materials_commons', 'materials_data_facility'}
-    if services is None:
-        services = list(available_services)
-    else:
-        services = [service for service in services if service in available_services]
-        if not services:
-            services = list(available_services)
-    combined_requirements = {}
-    for service in services:
-        # TODO(Recursive check dictionaries to make sure all requirements fields are combined.)
-        service_requirements = eval('_%s_metadata_requirements()' % service)
-        if service_requirements:
-            for key in service_requirements:
-                if not key in combined_requirements:
-                    combined_requirements[key] = service_requirements[key]
-    return {
-        'all_fields': {
-            'title': 'string',
-            'source': {
-                'name': 'string',
-                'producer': 'string',
-                'url': 'url string',
-                'tags': ['string']
-            },
-            'data_contacts': [
-                {
-                    'given_name': 'string',
-                    'family_name': 'string',
-                    'title': 'string',
-                    'orcid': 'TBD',
-                    'email': 'string',
-                    'tags': ['string']
-                }
-            ],
-            'data_contributors': [
-                {
-                    'given_name': 'string',
-                    'family_name': 'string',
-                    'title': 'string',
-                    'orcid': 'TBD',
-                    'email': 'string',
-                    'tags': ['string']
-                }
-            ],
-            'links': {
-                'landing_page': 'uri (string)',
-                'publication': ['uri (string)'],
-                'data_doi': 'uri (string)',
-                'related_id': ['string'],
-                'parent_id': 'string'
-            },
-            'authors': [
-                {
-                    'given_name': 'string',
-                    'family_name': 'string',
-                    'title': 'string',
-                    'orcid': 'TBD',
-                    'email': 'string',
-                    'tags': ['string']
-                }
-            ],
-            'licenses': [
-                {
-                    'name': 'string',
-                    'description': 'string',
-                    'url': 'string',
-                    'tags': ['string']
-                }
-            ],
-            'citations': [
-                {
-                    'authors': [
-                        {
-                            'given_name': 'string',
-                            'family_name': 'string',
-                            'title': 'string',
-                            'orcid': 'TBD',
-                            'email': 'string',
-                            'tags': ['string']
-                        }
-                    ],
-                    'year': 'string',
-                    'title': 'string',
-                    'journal': 'string',
-                    'volume': 'string',
-                    'issue': 'string',
-                    'page_location': 'string',
-                    'edition': 'string',
-                    'publication_location': 'string',
-                    'publisher': 'string',
-                    'extent': 'string',
-                    'notes': 'string',
-                }
-            ],
-            'repository': 'not yet available',
-            'collection': 'not yet available',
-            'tags': ['string'],
-            'description': 'string',
-            'raw': 'not yet available',
-            'year': 'integer',
-            'composition': 'not yet available'
-        },
-        'required_fields': combined_requirements,
-        'usage': 'payload = <service class, e.g. CITPayload>(**input_dictionary).metapayload'
-    }
-
-
-class PublishablePayload(dict):
+    key = registry.resolve(services)
+    requirements = registry.requirements(key)
+    cached = _templates.get(key)
+    if cached is None or cached[0] is not requirements:
+        cached = _templates[key] = (requirements, freeze({
+            'all_fields': registry.all_fields(),
+            'required_fields': requirements,
+            'usage': 'payload = <service class, e.g. CITPayload>(**input_dictionary).metapayload'
+        }))
+    return thaw(cached[1]) if mutable else cached[1]
+
+
+@stage('pif.dumps')
+def _pif_dumps(metadata):
+    return pif.dumps(metadata)
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'size'])
+
+
+class PublishablePayload(Record):
+    """
+    Base class for the service payloads.
+
+    Emitted metadata is cached per payload and returned frozen (see
+    matmeta.frozen), so repeated reads of metapayload are cheap and callers
+    cannot accidentally change the cached value.  Use emit(mutable=True) for
+    a private, mutable copy.
+
+    The cache is cleared whenever the payload itself changes through item or
+    attribute assignment, del, pop, popitem, setdefault or clear.  update()
+    and apply_changes() instead re-emit only the output sections that depend
+    on the changed fields (see _sections and matmeta.incremental).  Changes made inside
+    nested values (e.g. payload['source']['name'] = ...) are not seen; call
+    invalidate() after making them.
+    """
+    # name of the service in matmeta.services.registry
+    service = None
+
+    __slots__ = ('_metapayload_cache', '_cache_hits', '_cache_misses')
+
+    def __new__(cls, *args, **kwargs):
+        payload = super(PublishablePayload, cls).__new__(cls)
+        object.__setattr__(payload, '_metapayload_cache', None)
+        object.__setattr__(payload, '_cache_hits', 0)
+        object.__setattr__(payload, '_cache_misses', 0)
+        return payload
+
     def __init__(self, **kwargs):
         """
         TODO: write more!!
         TODO: consider making this an abstract base class (package abc).
         """
-        self.__dict__ = self
         super(PublishablePayload, self).__init__()
-        for key in get_common_payload_template()['all_fields'].keys():
+        for key in registry.all_fields():
             if key in kwargs:
-                self[key] = kwargs[key]
+                dict.__setitem__(self, key, kwargs[key])
 
     @property
     def metapayload(self):
-        raise NotImplementedError
+        return self.emit()
+
+    def emit(self, mutable=False):
+        """
+        Return this payload's metadata for its service.
+
+        args:
+            mutable:    if True, return a new mutable copy instead of the
+                shared, frozen cached value.
+        """
+        return self._cached('metapayload', self._emit, mutable)
+
+    def metapayload_bytes(self, backend=None, sort_keys=True):
+        """
+        Return this payload's metadata as UTF-8 JSON bytes, ready to write,
+        hash or send.
+
+        The cached metadata is serialized once, by a matmeta.serializers
+        backend, instead of by json.dumps on each use.
 
-    def ingest(self):
+        args:
+            backend:    'json', 'orjson', ... (default: the fastest
+                installed one)
+            sort_keys:  write keys in sorted order, so that equal metadata
+                gives equal bytes
+        """
+        return serializers.dumps(self.metapayload, backend, sort_keys)
+
+    @classmethod
+    def _sections(cls):
+        """
+        The service's output as a sequence of matmeta.incremental.Sections.
+        Section functions read the payload with item access only, so that
+        they also run on the frozen inputs of matmeta.fused.emit_all.
+        """
         raise NotImplementedError
 
+    def _emit(self):
+        return incremental.emit(self._sections(), self)
+
+    def dump(self, fp, **options):
+        """
+        Write this payload's metadata to fp as JSON, streaming large lists.
+
+        The output is identical to json.dump(self.metapayload, fp), but
+        unless the metadata is already cached it is not built in memory:
+        list sections such as MDF's data_contributor are emitted and
+        written one item at a time.  Nothing is cached.
+
+        args:
+            fp:         a file-like object with a write method
+            options:    see matmeta.streaming.dump (chunk_size, encoding)
+        """
+        cache = self._metapayload_cache
+        if cache is not None and 'metapayload' in cache:
+            document = cache['metapayload']
+        else:
+            document = streaming.lazy_document(self._sections(), self)
+        streaming.dump(document, fp, **options)
+
+    def _cached(self, name, compute, mutable=False):
+        cache = self._metapayload_cache
+        if cache is not None and name in cache:
+            self._cache_hits += 1
+            value = cache[name]
+        else:
+            self._cache_misses += 1
+            value = freeze(compute())
+            if cache is None:
+                cache = self._metapayload_cache = {}
+            cache[name] = value
+        return thaw(value) if mutable else value
+
+    def invalidate(self):
+        """
+        Discard cached metadata.
+        """
+        if self._metapayload_cache is not None:
+            self._metapayload_cache = None
+
+    def cache_info(self):
+        return CacheInfo(
+            hits=self._cache_hits,
+            misses=self._cache_misses,
+            size=len(self._metapayload_cache or ()),
+        )
+
+    def __setattr__(self, name, value):
+        if name in PublishablePayload.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self[name] = value
+
+    def __setitem__(self, key, value):
+        super(PublishablePayload, self).__setitem__(key, value)
+        self.invalidate()
+
+    def __delitem__(self, key):
+        super(PublishablePayload, self).__delitem__(key)
+        self.invalidate()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs):
+        """
+        dict.update, keeping emitted metadata current: if metadata has been
+        emitted, only the sections that depend on the changed fields are
+        recomputed.  Use apply_changes to also get the difference.
+        """
+        self.apply_changes(*args, **kwargs)
+
+    def apply_changes(self, *args, **kwargs):
+        """
+        Update the payload like update(), and return how its emitted
+        metadata changed.
+
+        return:
+            an RFC 6902 patch (list of operations) from the previously
+            emitted metadata to the new metadata, or None if metadata had
+            not been emitted
+        """
+        changes = dict(*args, **kwargs)
+        cache = self._metapayload_cache
+        document = cache.get('metapayload') if cache else None
+        before = {key: self.get(key, incremental.MISSING) for key in changes}
+        super(PublishablePayload, self).update(changes)
+        self.invalidate()
+        if document is None:
+            return None
+        document, patch = incremental.reemit(self._sections(), document, before, self)
+        self._metapayload_cache = {'metapayload': document}
+        return patch
+
+    def pop(self, *args):
+        value = super(PublishablePayload, self).pop(*args)
+        self.invalidate()
+        return value
+
+    def popitem(self):
+        item = super(PublishablePayload, self).popitem()
+        self.invalidate()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def clear(self):
+        super(PublishablePayload, self).clear()
+        self.invalidate()
+
+    def ingest(self, endpoint, **options):
+        """
+        Submit this payload's metadata to its service.
+
+        args:
+            endpoint:   a matmeta.ingest.Endpoint or URL
+            options:    see matmeta.ingest.Ingester (retries, timeout, ...)
+
+        return:
+            a matmeta.ingest.IngestResult.  Failures are reported there
+            rather than raised.
+
+        Use matmeta.ingest.ingest to submit many payloads concurrently.
+        """
+        return ingest.ingest([self], {self.service: endpoint}, **options)[0]
+
 
 class CITPayload(PublishablePayload):
     """
@@ -293,23 +374,34 @@ class CITPayload(PublishablePayload):
     {'email': 'a@a.com', 'name': {'family': 'NotARobot', 'given': 'Totally', 'title': ''}, 'tags': ['contributor']}], 'licenses': [{'description': 'license description', 'name': 'license name', 'tags': ['license', 'tags'], 'url': 'http://www.licenseurl.org'}], 'source': {'producer': 'test producer', 'tags': ['these', 'are', 'source', 'tags'], 'url': 'http://www.testurl.org'}}
 
     """
+    service = 'citrine'
+
+    __slots__ = ()
 
     def __init__(self, *args, **kwargs):
-        required_inputs = get_common_payload_template(services=['citrine'])['required_fields']
-        _validate_inputs(
-            required_inputs=required_inputs,
-            actual_inputs=kwargs
-        )
+        get_validator([self.service]).check(kwargs)
         super(CITPayload, self).__init__(**kwargs)        
 
+    @classmethod
+    def _sections(cls):
+        return citrine.SECTIONS
+
     @property
-    def metapayload(self):
+    def reference_metapayload(self):
+        """
+        Build the payload through pypif objects and a pif.dumps/json.loads
+        round trip.  This is the reference that the direct emitter in
+        matmeta.citrine is tested against.
+        """
+        return self._cached('reference_metapayload', self._emit_reference)
+
+    def _emit_reference(self):
         metadata = pobj.System()
         self._add_source(metadata)
         self._add_people(metadata)
         self._add_licenses(metadata)
         self._add_citations(metadata)
-        return json.loads(pif.dumps(metadata))
+        return json.loads(_pif_dumps(metadata))
 
     def _add_source(self, metadata):
         if 'source' not in self or not isinstance(self['source'], dict):
@@ -334,10 +426,12 @@ class CITPayload(PublishablePayload):
             tags=tags
         )
 
+    @stage('pif.add_people')
     def _add_people(self, metadata):
+        # The original people logic, kept as the reference: it matches people
+        # on their exact full names only, and a merged person loses their
+        # tags.  matmeta.citrine.collect_people fixes both.
         people = []
-        # use full names instead of ids to determine whether to add a new entry
-        # TODO: find a more elegant solution
         def person_already_added(new_citrine_person):
             for citrine_person in people:
                 if (
@@ -382,6 +476,7 @@ class CITPayload(PublishablePayload):
             add_to_people(person_list=self['data_contributors'], tags=['contributor'])
         metadata.contacts = people
 
+    @stage('pif.add_licenses')
     def _add_licenses(self, metadata):
         if 'licenses' not in self or not isinstance(self['licenses'], list):
             return
@@ -393,10 +488,11 @@ class CITPayload(PublishablePayload):
                 citrine_license = pobj.License(**license)
                 citrine_licenses.append(citrine_license)
             except Exception as ex:
-                print(ex)
+                warnings.warn('Skipping invalid license: %s' % ex)
 
         metadata.licenses = citrine_licenses
     
+    @stage('pif.add_citations')
     def _add_citations(self, metadata):
         if 'citations' not in self or not isinstance(self['citations'], list):
             return 
@@ -421,7 +517,9 @@ class CITPayload(PublishablePayload):
             authors = []
             if 'authors' in filtered_citation_data:
                 for author in filtered_citation_data['authors']:
-                    # fix name keys
+                    # fix name keys, on a copy so that the caller's (possibly
+                    # shared or interned) authors are not modified
+                    author = dict(author)
                     if 'given_name' in author:
                         author['given'] = author['given_name']
                     if 'family_name' in author:
@@ -450,57 +548,70 @@ class MDFPayload(PublishablePayload):
     {'Doctest Example Script': {}, 'dc': {}, 'mdf': {'acl': ['public'],  'citations': None,  'data_contact': [{'email': 'a@a.com', 'family_name': 'NotARobot', 'given_name': 'Totally', 'institution': 'Earth'}], 'data_contributor': [{'email': 'a@a.com', 'family_name': 'NotARobot', 'given_name': 'Totally', 'institution': 'Earth'}], 'links': {'landing_page': 'http://www.globus.org'}, 'source_name': 'Doctest Example Script', 'title': 'Test Payload'}}
 
     """
+    service = 'materials_data_facility'
+
+    __slots__ = ()
 
     def __init__(self, *args, **kwargs):
-        required_inputs = get_common_payload_template(services=['materials_data_facility'])['required_fields']
-        _validate_inputs(
-            required_inputs=required_inputs,
-            actual_inputs=kwargs
-        )
+        get_validator([self.service]).check(kwargs)
         super(MDFPayload, self).__init__(*args, **kwargs)
 
-    @property
-    def metapayload(self):
-        dataset = {
-            "mdf": {
-                "title": self.title,
-                "acl": ["public"],  # TODO: allow list of globus auth uuids or "public"
-                "source_name": self.source['name'],
-                "links": self.links,
-                "data_contact": self.data_contacts,
-                "data_contributor": [dict(data_contributor) for data_contributor in self.data_contributors],
-                # "ingest_date": datetime.datetime.now().strftime('%b %d, %Y'),  # Note: these commented keys are
-                # "metadata_version": "1.1",                                     # populated automatically!
-                # "mdf_id": "1",
-                # "resource_type": "dataset",
-                # "additionalProperties": self.additionalProperties
-            },
-            "dc": {},  # TODO: allow datacite keys to go here?
-            # # TODO: review the following.
-            # self.source['name']: self.additionalProperties
-        }
+    # sections built for a (requirements, all fields) pair of the registry
+    _section_cache = (None, None, None)
+
+    @classmethod
+    def _sections(cls):
+        required_keys = registry.requirements([cls.service])
+        all_fields = registry.all_fields()
+        cached_required, cached_fields, sections = MDFPayload._section_cache
+        if cached_required is not required_keys or cached_fields is not all_fields:
+            sections = cls._build_sections(required_keys, all_fields)
+            MDFPayload._section_cache = (required_keys, all_fields, sections)
+        return sections
+
+    @staticmethod
+    def _build_sections(required_keys, all_fields):
+        section = incremental.section
+        sections = [
+            section(['mdf', 'title'], ['title'], lambda payload: payload['title']),
+            # TODO: allow list of globus auth uuids or "public"
+            section(['mdf', 'acl'], [], lambda payload: ["public"]),
+            section(['mdf', 'source_name'], ['source.name'], lambda payload: payload['source']['name']),
+            section(['mdf', 'links'], ['links'], lambda payload: payload['links']),
+            section(['mdf', 'data_contact'], ['data_contacts'], lambda payload: payload['data_contacts']),
+            section(['mdf', 'data_contributor'], ['data_contributors'], items=lambda payload: (
+                converted(data_contributor, 'mdf.data_contributor', dict)
+                for data_contributor in payload['data_contributors']
+            )),
+            # "ingest_date", "metadata_version", "mdf_id" and "resource_type"
+            # are populated automatically!
+        ]
 
         # Populate optional keys if they have been set
-        required_keys = set(
-            get_common_payload_template(
-                services=['materials_data_facility']
-            )['required_fields'].keys()
-        )
-        optional_keys = set(
-            get_common_payload_template()['all_fields'].keys()
-        ) -  required_keys
-        for key in optional_keys:
-            if key in {'citations'}:
-                continue
-            if key in self and self[key] is not None:
-                dataset['mdf'][key] = self[key]
-        if 'citations' in self:
-            dataset['mdf']['citation'] = [
-                _citation_to_string(citation)
-                for citation in self['citations']
-            ]
+        def optional(key):
+            def compute(payload):
+                if key in payload and payload[key] is not None:
+                    return payload[key]
+                return incremental.OMIT
+            return compute
+        for key in all_fields:
+            if key not in required_keys and key != 'citations':
+                sections.append(section(['mdf', key], [key], optional(key)))
+
+        def citation_strings(payload):
+            if 'citations' not in payload:
+                return incremental.OMIT
+            formatter = citations.get_formatter()
+            name = 'mdf.citation.%s' % formatter.style.name
+            return (
+                converted(citation, name, formatter.format)
+                for citation in payload['citations']
+            )
+        sections.append(section(['mdf', 'citation'], ['citations'], items=citation_strings))
 
-        return dataset
+        # TODO: allow datacite keys to go here?
+        sections.append(section(['dc'], [], lambda payload: {}))
+        return tuple(sections)
 
 
 class MCPayload(PublishablePayload):
@@ -513,27 +624,29 @@ class MCPayload(PublishablePayload):
     {'description': 'material description', 'name': 'whatever'}
 
     """
+    service = 'materials_commons'
+
+    __slots__ = ()
 
     def __init__(self, *args, **kwargs):
-        required_inputs = get_common_payload_template(services=['materials_commons'])['required_fields']
-        _validate_inputs(
-            required_inputs=required_inputs,
-            actual_inputs=kwargs
-        )
+        get_validator([self.service]).check(kwargs)
         super(MCPayload, self).__init__(*args, **kwargs)
 
-    @property
-    def metapayload(self):
-        return {
-            'name': self['source']['name'],
-            'description': self['description']
-        }
+    SECTIONS = (
+        incremental.section(['name'], ['source.name'], lambda payload: payload['source']['name']),
+        incremental.section(['description'], ['description'], lambda payload: payload['description']),
+    )
+
+    @classmethod
+    def _sections(cls):
+        return cls.SECTIONS
+
 
+class Human(Record):
+    __slots__ = ()
 
-class Human(dict):
     def __init__(self, given_name, family_name, email='', institution=''):
         super(Human, self).__init__()
-        self.__dict__ = self
         self['given_name'] = given_name
         self['family_name'] = family_name
         self['email'] = email
@@ -0,0 +1,41 @@
+"""
+Compact dictionaries with attribute access.
+
+Record is a dict whose items can also be read and written as attributes
+(record.given_name is record['given_name']).  It defines __slots__ and has
+no instance __dict__, so a record is not a reference cycle (as it would be
+with the self.__dict__ = self idiom) and is freed by reference counting
+without help from the cyclic garbage collector.
+"""
+
+
+def _rebuild(cls, items):
+    record = cls.__new__(cls)
+    dict.update(record, items)
+    return record
+
+
+class Record(dict):
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(
+                '%r object has no attribute %r' % (type(self).__name__, name)
+            )
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __delattr__(self, name):
+        try:
+            del self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __reduce__(self):
+        # rebuild from the items without calling __init__, which may
+        # validate or require arguments
+        return (_rebuild, (type(self), dict(self)))
@@ -0,0 +1,124 @@
+"""
+JSON serialization backends for emitted metadata.
+
+Every emitted payload ends up as JSON.  dumps() serializes a document to
+UTF-8 bytes once, with the backend chosen by name:
+
+    json        the standard library (always available)
+    orjson      orjson, if it is installed; several times faster
+
+The default is the fastest installed backend.  All backends write compact
+JSON (no spaces), without escaping non-ASCII characters, and with
+sort_keys, in sorted key order, so the bytes of a document can be hashed
+or compared.  Backends agree byte for byte on emitted metadata; they may
+only differ in the exponent notation of very large or very small floats
+(1e+16 or 1e16).
+
+Examples
+--------
+>>> dumps(payload.metapayload)                      # fastest backend
+>>> dumps(payload.metapayload, backend='json')
+>>> hashlib.sha256(payload.metapayload_bytes()).hexdigest()
+"""
+
+import importlib.util
+import json
+
+from matmeta.instrumentation import stage
+from matmeta.lazy import LazyModule
+
+orjson = LazyModule('orjson')
+
+
+# built once: json.dumps builds an encoder per call for non-default options
+_json_encoders = {
+    sort_keys: json.JSONEncoder(
+        sort_keys=sort_keys, separators=(',', ':'), ensure_ascii=False
+    ).encode
+    for sort_keys in (False, True)
+}
+
+
+def _json(document, sort_keys):
+    return _json_encoders[sort_keys](document).encode('utf-8')
+
+
+def _orjson(document, sort_keys):
+    # non-string keys are converted as json converts them
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(document, option=option)
+
+
+# name -> (module it needs, or None, encode(document, sort_keys) -> bytes),
+# fastest first
+_backends = {
+    'orjson': ('orjson', _orjson),
+    'json': (None, _json),
+}
+
+_default = None
+
+
+def register(name, encode, module=None):
+    """
+    Add a backend.
+
+    args:
+        name:   the backend's name
+        encode: a function (document, sort_keys) -> UTF-8 JSON bytes
+        module: the module encode needs, if it is optional.  The backend
+            is only available if it is installed.
+    """
+    global _default
+    _backends[name] = (module, encode)
+    _default = None
+
+
+def available():
+    """
+    The names of the backends that can be used here, fastest first.
+    """
+    return [
+        name for name, (module, _) in _backends.items()
+        if module is None or importlib.util.find_spec(module) is not None
+    ]
+
+
+def default_backend():
+    """
+    The name of the backend used when none is given.
+    """
+    global _default
+    if _default is None:
+        _default = available()[0]
+    return _default
+
+
+def backend(name=None):
+    """
+    Return the encode function of the backend name (default: see
+    default_backend).  ValueError is raised for unknown names.
+    """
+    try:
+        return _backends[name or default_backend()][1]
+    except KeyError:
+        raise ValueError('Unknown serializer backend %r (expected one of %s)' % (
+            name, ', '.join(_backends)
+        ))
+
+
+@stage('serialize')
+def dumps(document, backend_name=None, sort_keys=True):
+    """
+    Serialize document to UTF-8 JSON bytes.
+
+    args:
+        document:       the document, e.g. a payload's metapayload
+        backend_name:   see the module documentation (default: the fastest
+            installed backend)
+        sort_keys:      write keys in sorted order.  Otherwise they are
+            written in the document's order, as json.dumps does.
+    """
+    return backend(backend_name)(document, sort_keys)
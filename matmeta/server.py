@@ -0,0 +1,466 @@
+"""
+An HTTP conversion service.
+
+ConversionServer answers
+
+    POST /emit?services=citrine,materials_data_facility
+
+whose body is a common payload, with {"payloads": {service: metadata},
+"errors": [...]} for the requested services (default: all), as emit_stream
+converts a record.  GET /metrics returns latency, batching and throughput
+figures (see ServiceMetrics) and GET /health answers {"ok": true}.
+
+Requests are not converted one at a time on the event loop.  They are
+queued, and grouped into batches of up to batch_size requests, which are
+converted on a pool of worker processes: parsing, conversion and
+serialization of the responses all happen in the workers, and the event
+loop only moves bytes.  A batch is collected once a worker is free, and
+sent when it is full or max_wait seconds after its first request arrived.
+While every worker is busy, requests wait in the queue, so batches grow
+with the load.
+
+Examples
+--------
+>>> with ConversionServer(port=8080, batch_size=32, max_wait=0.002) as server:
+...     results = ingest(
+...         [('emit', record) for record in records],
+...         {'emit': server.url + '/emit?services=citrine'}, concurrency=64
+...     )
+...     print(server.metrics.snapshot())
+
+On the command line: matmeta serve --port 8080 --workers 4
+"""
+
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import os
+import threading
+import time
+
+from urllib.parse import parse_qs, urlsplit
+
+import matmeta.batch
+from matmeta import serializers
+from matmeta.services import registry
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable',
+}
+
+
+def _document(document):
+    return serializers.dumps(document, sort_keys=False)
+
+
+def _error_response(status, message):
+    return status, _document({'error': message})
+
+
+def _convert(body, services):
+    """
+    Convert one request body to a (status, response body) pair.
+    """
+    try:
+        record = json.loads(body)
+    except ValueError as ex:
+        return _error_response(400, 'Invalid JSON: %s' % ex)
+    if not isinstance(record, dict):
+        return _error_response(400, 'Expected a JSON object, got %s' % type(record).__name__)
+    payloads, errors = matmeta.batch.emit_record(record, services)
+    return 200, _document({'payloads': payloads, 'errors': errors})
+
+
+def convert_batch(batch):
+    """
+    Convert a batch of (request body, services) pairs in a worker.
+
+    return:
+        a list of (status, response body) pairs
+    """
+    responses = []
+    for body, services in batch:
+        try:
+            responses.append(_convert(body, services))
+        except Exception as ex:
+            responses.append(_error_response(500, '%s: %s' % (type(ex).__name__, ex)))
+    return responses
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ServiceMetrics(object):
+    """
+    Latency, batching and throughput of a ConversionServer.
+
+    args:
+        window:     number of recent requests that latency percentiles and
+            the recent throughput are computed over
+    """
+
+    def __init__(self, window=10000):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.failed = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.largest_batch = 0
+        # (completion time, seconds from request to response)
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record_request(self, seconds, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.failed += not ok
+            self._recent.append((time.monotonic(), seconds))
+
+    def record_batch(self, size):
+        with self._lock:
+            self.batches += 1
+            self.batched_requests += size
+            self.largest_batch = max(self.largest_batch, size)
+
+    def snapshot(self):
+        """
+        The metrics as a JSON-serializable dictionary.  Latencies are in
+        milliseconds; requests_per_second is over the whole uptime and
+        recent_requests_per_second over the recent window.
+        """
+        with self._lock:
+            now = time.monotonic()
+            recent = list(self._recent)
+            uptime = now - self.started
+            snapshot = {
+                'uptime': uptime,
+                'requests': self.requests,
+                'failed': self.failed,
+                'batches': self.batches,
+                'mean_batch_size': self.batched_requests / self.batches if self.batches else None,
+                'largest_batch': self.largest_batch,
+                'requests_per_second': self.requests / uptime if uptime else None,
+            }
+        latencies = sorted(seconds * 1000.0 for _, seconds in recent)
+        snapshot['latency_ms'] = {
+            'p50': _percentile(latencies, 0.5),
+            'p90': _percentile(latencies, 0.9),
+            'p99': _percentile(latencies, 0.99),
+            'max': latencies[-1] if latencies else None,
+        }
+        snapshot['recent_requests_per_second'] = None
+        if len(recent) > 1 and recent[-1][0] > recent[0][0]:
+            snapshot['recent_requests_per_second'] = (
+                (len(recent) - 1) / (recent[-1][0] - recent[0][0])
+            )
+        return snapshot
+
+
+class _Batcher(object):
+    """
+    Groups queued requests into batches and converts them on an executor.
+    """
+
+    def __init__(self, make_executor, workers, batch_size, max_wait, metrics):
+        self.make_executor = make_executor
+        self.executor = make_executor()
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.metrics = metrics
+        self.queue = asyncio.Queue()
+        # a batch is collected only when a worker is free to convert it
+        self.slots = asyncio.Semaphore(workers)
+        self.tasks = set()
+
+    async def submit(self, body, services):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((body, services, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def run(self):
+        while True:
+            await self.slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self.slots.release()
+                raise
+            task = asyncio.ensure_future(self._convert(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _convert(self, batch):
+        loop = asyncio.get_running_loop()
+        self.metrics.record_batch(len(batch))
+        try:
+            work = [(body, services) for body, services, _ in batch]
+            try:
+                responses = await loop.run_in_executor(self.executor, convert_batch, work)
+            except BrokenProcessPool as ex:
+                # a worker died: fail this batch, and carry on with a new pool
+                self.executor.shutdown(wait=False)
+                self.executor = self.make_executor()
+                responses = [_error_response(500, 'Worker failed: %s' % ex)] * len(batch)
+            for (_, _, future), response in zip(batch, responses):
+                if not future.done():
+                    future.set_result(response)
+        finally:
+            self.slots.release()
+
+    def fail_pending(self, status, message):
+        while not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_result(_error_response(status, message))
+
+
+class ConversionServer(object):
+    """
+    args:
+        host:       interface to listen on
+        port:       port to listen on (default: any free port)
+        batch_size: maximum number of requests per batch
+        max_wait:   seconds a batch waits for more requests after its first
+        workers:    number of worker processes (default: os.cpu_count())
+        processes:  if false, convert on threads instead of processes.
+            Threads start faster but share the GIL, so they do not convert
+            in parallel.
+        max_body:   largest accepted request body, in bytes
+
+    The server runs its event loop in a background thread between start()
+    and stop() (or in a with block); serve_forever() runs it in the calling
+    thread instead.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, batch_size=16, max_wait=0.002,
+                 workers=None, processes=True, max_body=16 * 2 ** 20):
+        if batch_size < 1:
+            raise ValueError('batch_size must be at least 1')
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.workers = workers or os.cpu_count() or 1
+        self.processes = processes
+        self.max_body = max_body
+        self.metrics = ServiceMetrics()
+        self._server = None
+        self._batcher = None
+        self._collector = None
+        self._handlers = set()
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopping = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % (self.host, self.port)
+
+    def _make_executor(self):
+        if self.processes:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    async def _start(self):
+        self._batcher = _Batcher(
+            self._make_executor, self.workers, self.batch_size, self.max_wait, self.metrics
+        )
+        self._collector = asyncio.ensure_future(self._batcher.run())
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, backlog=512
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def _close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._collector.cancel()
+        self._batcher.fail_pending(503, 'The service is shutting down')
+        if self._batcher.tasks:
+            await asyncio.wait(list(self._batcher.tasks))
+        # connections kept alive by their clients wait for another request
+        handlers = list(self._handlers)
+        for handler in handlers:
+            handler.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        self._batcher.executor.shutdown(wait=True)
+
+    async def _run(self):
+        self._stopping = asyncio.Event()
+        await self._start()
+        self._ready.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            await self._close()
+
+    def start(self):
+        """
+        Start serving in a background thread, and return once the server
+        accepts connections.
+        """
+        def run():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self._run())
+            finally:
+                self._loop.close()
+                self._ready.set()
+
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+        self._ready.wait()
+        if self._server is None:
+            self._thread.join()
+            raise RuntimeError('The server could not be started')
+        return self
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join()
+
+    def serve_forever(self):
+        """
+        Serve in the calling thread until interrupted.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    async def _handle(self, reader, writer):
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                start, keep_alive, response, work = request
+                if response is None:
+                    response = await self._batcher.submit(*work)
+                status, body = response
+                self._write(writer, status, body, keep_alive)
+                await writer.drain()
+                if start is not None:
+                    self.metrics.record_request(time.perf_counter() - start, status == 200)
+                if not keep_alive:
+                    break
+        except (OSError, EOFError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # cancelled by _close; ending normally keeps asyncio from
+            # logging the cancellation as an error
+            pass
+        finally:
+            self._handlers.discard(handler)
+            writer.close()
+
+    async def _read_request(self, reader):
+        """
+        Read one request.
+
+        return:
+            None if the client closed the connection, or a (start time,
+            keep_alive, response, work) tuple: either the (status, body)
+            response, or for a conversion the (body, services) to convert
+            and the time the request arrived
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        start = time.perf_counter()
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            return None, False, _error_response(400, 'Bad request line'), None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n'):
+                break
+            if not line:
+                raise EOFError('connection closed in the request headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' and (version != 'HTTP/1.0' or connection == 'keep-alive')
+
+        body = b''
+        if 'transfer-encoding' in headers:
+            return None, False, _error_response(411, 'Send a Content-Length'), None
+        length = headers.get('content-length') or '0'
+        # int() would also take signs, spaces and underscores
+        if not (length.isascii() and length.isdigit()):
+            return None, False, _error_response(400, 'Bad Content-Length %r' % length), None
+        length = int(length)
+        if length > self.max_body:
+            return None, False, _error_response(413, 'Request bodies are limited to %d bytes' % self.max_body), None
+        if length:
+            body = await reader.readexactly(length)
+
+        parts = urlsplit(target)
+        if parts.path == '/health':
+            return None, keep_alive, (200, _document({'ok': True})), None
+        if parts.path == '/metrics':
+            return None, keep_alive, (200, _document(self.metrics.snapshot())), None
+        if parts.path != '/emit':
+            return None, keep_alive, _error_response(404, 'Unknown path %r' % parts.path), None
+        if method != 'POST':
+            return None, keep_alive, _error_response(405, 'Use POST'), None
+        services = None
+        for value in parse_qs(parts.query).get('services', ()):
+            services = (services or []) + [name for name in value.split(',') if name]
+        if services is not None:
+            unknown = [name for name in services if name not in registry.services]
+            if unknown or not services:
+                return None, keep_alive, _error_response(
+                    400, 'Unknown services %s (expected some of %s)' % (
+                        ', '.join(unknown), ', '.join(registry.services)
+                    )
+                ), None
+        return start, keep_alive, None, (body, services)
+
+    def _write(self, writer, status, body, keep_alive):
+        head = (
+            'HTTP/1.1 %d %s\r\n'
+            'Content-Type: application/json\r\n'
+            'Content-Length: %d\r\n'
+            'Connection: %s\r\n\r\n'
+        ) % (status, _REASONS.get(status, ''), len(body), 'keep-alive' if keep_alive else 'close')
+        writer.write(head.encode('latin-1') + body)
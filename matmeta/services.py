@@ -0,0 +1,274 @@
+"""
+Registry of the publication services and their metadata requirements.
+
+The requirements of each service are merged and frozen once per subset of
+services, then shared by every payload that needs them.  Cached structures
+are immutable (see matmeta.frozen), so they can be read from any thread
+without copying.
+"""
+
+import importlib
+import threading
+
+from matmeta.frozen import freeze
+
+
+def _citrine_metadata_requirements():
+    return {} # no metadata is required
+
+
+def _materials_commons_metadata_requirements():
+    return {
+        'source': {
+            'name': 'string'
+        },
+        'description': 'string'
+    }
+
+
+def _materials_data_facility_metadata_requirements():
+    return {
+        'title': 'string',
+        'source': {
+            'name': 'string',
+        },
+        'data_contacts': [
+            {
+                'given_name': 'string',
+                'family_name': 'string',
+                'email': 'string',
+            }
+        ],
+        'data_contributors': [
+            {
+                'given_name': 'string',
+                'family_name': 'string',
+                'email': 'string',
+            }
+        ],
+        'links': {
+            'landing_page': 'uri (string)'
+        },
+    }
+
+
+def _person_fields():
+    return {
+        'given_name': 'string',
+        'family_name': 'string',
+        'title': 'string',
+        'orcid': 'TBD',
+        'email': 'string',
+        'tags': ['string']
+    }
+
+
+def _common_payload_fields():
+    return {
+        'title': 'string',
+        'source': {
+            'name': 'string',
+            'producer': 'string',
+            'url': 'url string',
+            'tags': ['string']
+        },
+        'data_contacts': [_person_fields()],
+        'data_contributors': [_person_fields()],
+        'links': {
+            'landing_page': 'uri (string)',
+            'publication': ['uri (string)'],
+            'data_doi': 'uri (string)',
+            'related_id': ['string'],
+            'parent_id': 'string'
+        },
+        'authors': [_person_fields()],
+        'licenses': [
+            {
+                'name': 'string',
+                'description': 'string',
+                'url': 'string',
+                'tags': ['string']
+            }
+        ],
+        'citations': [
+            {
+                'authors': [_person_fields()],
+                'year': 'string',
+                'title': 'string',
+                'journal': 'string',
+                'volume': 'string',
+                'issue': 'string',
+                'page_location': 'string',
+                'edition': 'string',
+                'publication_location': 'string',
+                'publisher': 'string',
+                'extent': 'string',
+                'notes': 'string',
+            }
+        ],
+        'repository': 'not yet available',
+        'collection': 'not yet available',
+        'tags': ['string'],
+        'description': 'string',
+        'raw': 'not yet available',
+        'year': 'integer',
+        'composition': 'not yet available'
+    }
+
+
+def merge_requirements(base, extra):
+    """
+    Recursively merge two requirement specifications.
+
+    Dictionaries are merged key by key.  Lists of dictionaries (e.g.
+    'data_contacts') are merged element template by element template.  For
+    any other conflict the value already in base wins.
+
+    Neither argument is modified.
+    """
+    if isinstance(base, dict) and isinstance(extra, dict):
+        merged = dict(base)
+        for key, value in extra.items():
+            if key in merged:
+                merged[key] = merge_requirements(merged[key], value)
+            else:
+                merged[key] = value
+        return merged
+    if (
+        isinstance(base, list) and isinstance(extra, list)
+        and base and extra
+        and isinstance(base[0], dict) and isinstance(extra[0], dict)
+    ):
+        return [merge_requirements(base[0], extra[0])]
+    return base
+
+
+class ServiceRegistry(object):
+    """
+    Known publication services and their (cached) metadata requirements.
+
+    Requirements are computed once per subset of services, frozen, and
+    cached until a service is (re-)registered.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._services = {}
+        self._emitters = {}
+        self._order = []
+        self._requirements_cache = {}
+        self._all_fields = None
+
+    def register(self, name, requirements, emitter=None):
+        """
+        Register a service.
+
+        args:
+            name:   the service name, e.g. 'citrine'
+            requirements: a callable returning the service's requirement
+                specification (see get_common_payload_template)
+            emitter: the payload class for the service, or a
+                'module:ClassName' string naming it.  Strings are imported
+                the first time the emitter is needed.
+        """
+        with self._lock:
+            if name not in self._services:
+                self._order.append(name)
+            self._services[name] = requirements
+            self._emitters[name] = emitter
+            self._requirements_cache = {}
+
+    @property
+    def services(self):
+        """Registered service names, in registration order."""
+        return tuple(self._order)
+
+    def resolve(self, services=None):
+        """
+        Return the frozenset of known services named in services.
+
+        None, or a list that names no known service, means all services.
+        """
+        if services is not None:
+            resolved = frozenset(
+                service for service in services if service in self._services
+            )
+            if resolved:
+                return resolved
+        return frozenset(self._services)
+
+    def select(self, services=None):
+        """
+        Like resolve, but return a tuple in registration order.
+        """
+        resolved = self.resolve(services)
+        return tuple(service for service in self._order if service in resolved)
+
+    def emitter(self, name):
+        """
+        Return the payload class registered for the service name.
+        """
+        emitter = self._emitters[name]
+        if isinstance(emitter, str):
+            module_name, _, attribute = emitter.partition(':')
+            emitter = getattr(importlib.import_module(module_name), attribute)
+            self._emitters[name] = emitter
+        if emitter is None:
+            raise LookupError('No emitter registered for service %r' % name)
+        return emitter
+
+    def requirements(self, services=None):
+        """
+        Return the merged, frozen requirements of the given services.
+        """
+        key = self.resolve(services)
+        try:
+            return self._requirements_cache[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._requirements_cache:
+                self._requirements_cache[key] = self._build_requirements(key)
+            return self._requirements_cache[key]
+
+    def all_fields(self):
+        """
+        Return the frozen specification of every common payload field.
+        """
+        if self._all_fields is None:
+            with self._lock:
+                if self._all_fields is None:
+                    self._all_fields = freeze(_common_payload_fields())
+        return self._all_fields
+
+    def clear_cache(self):
+        with self._lock:
+            self._requirements_cache = {}
+            self._all_fields = None
+
+    def _build_requirements(self, services):
+        combined_requirements = {}
+        for service in self._order:
+            if service in services:
+                combined_requirements = merge_requirements(
+                    combined_requirements, self._services[service]()
+                )
+        return freeze(combined_requirements)
+
+
+registry = ServiceRegistry()
+registry.register(
+    'citrine',
+    _citrine_metadata_requirements,
+    emitter='matmeta.payload_metaclass:CITPayload',
+)
+registry.register(
+    'materials_commons',
+    _materials_commons_metadata_requirements,
+    emitter='matmeta.payload_metaclass:MCPayload',
+)
+registry.register(
+    'materials_data_facility',
+    _materials_data_facility_metadata_requirements,
+    emitter='matmeta.payload_metaclass:MDFPayload',
+)
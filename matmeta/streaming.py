@@ -0,0 +1,124 @@
+"""
+Stream emitted metadata as JSON without building it in memory.
+
+A lazy document is an emitted document in which the list sections that can
+be streamed (see matmeta.incremental.Section.items), such as MDF's
+data_contributor and citation or Citrine's contacts and references, are
+iterators instead of lists.  iterencode() walks it and yields the JSON text
+in chunks, encoding one list item at a time, so the largest lists are
+never held in memory, as a whole or as one string.
+
+The output is byte-identical to json.dumps of the fully emitted document.
+
+Examples
+--------
+>>> with open('mdf.json', 'w') as fp:
+...     MDFPayload(**inputs).dump(fp)
+>>> for chunk in iterencode(lazy_document(CITPayload._sections(), inputs)):
+...     sock.sendall(chunk.encode('utf-8'))
+"""
+
+import json
+
+from matmeta.incremental import assemble
+
+# json.dumps with default arguments uses an encoder like this one, so
+# encoding the parts of a document gives the same text as encoding the
+# whole
+_encode = json.JSONEncoder().encode
+
+
+def lazy_document(sections, payload):
+    """
+    Return the document for sections, with streamable list sections left as
+    iterators.  It can be encoded (or iterated) once.
+    """
+    return assemble(sections, [
+        sec.compute(payload) if sec.items is None else sec.items(payload)
+        for sec in sections
+    ])
+
+
+def _key(key):
+    # the same conversions as json.dumps
+    if isinstance(key, str):
+        return _encode(key)
+    if key is True:
+        return '"true"'
+    if key is False:
+        return '"false"'
+    if key is None:
+        return '"null"'
+    if isinstance(key, (int, float)):
+        return _encode(_encode(key))
+    raise TypeError(
+        'keys must be str, int, float, bool or None, not %s' % type(key).__name__
+    )
+
+
+def _iterparts(obj):
+    if isinstance(obj, dict):
+        if not obj:
+            yield '{}'
+            return
+        separator = '{'
+        for key, value in obj.items():
+            yield separator
+            yield _key(key)
+            yield ': '
+            for part in _iterparts(value):
+                yield part
+            separator = ', '
+        yield '}'
+    elif isinstance(obj, (str, int, float)) or obj is None:
+        yield _encode(obj)
+    elif isinstance(obj, (list, tuple)) or hasattr(obj, '__next__'):
+        # stream lists and iterators item by item.  Items are encoded whole
+        # unless they are iterators themselves.
+        separator = '['
+        for item in obj:
+            yield separator
+            if isinstance(item, (dict, list, tuple, str, int, float)) or item is None:
+                yield _encode(item)
+            else:
+                for part in _iterparts(item):
+                    yield part
+            separator = ', '
+        yield '[]' if separator == '[' else ']'
+    else:
+        yield _encode(obj)  # raises json's TypeError for unsupported types
+
+
+def iterencode(document, chunk_size=65536):
+    """
+    Yield the JSON text of a (possibly lazy) document in chunks of about
+    chunk_size characters.
+    """
+    parts = []
+    size = 0
+    for part in _iterparts(document):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(parts)
+            parts = []
+            size = 0
+    if parts:
+        yield ''.join(parts)
+
+
+def dump(document, fp, chunk_size=65536, encoding=None):
+    """
+    Write the JSON text of a (possibly lazy) document to fp.
+
+    args:
+        fp:     a file-like object with a write method
+        chunk_size: approximate number of characters per write
+        encoding: if given, write bytes in this encoding (e.g. 'utf-8' for
+            a binary file or socket.makefile('wb'))
+
+    If emission fails part-way (e.g. an invalid license), what was written
+    before the error stays written.
+    """
+    for chunk in iterencode(document, chunk_size):
+        fp.write(chunk.encode(encoding) if encoding else chunk)
@@ -0,0 +1,163 @@
+"""
+A local HTTP endpoint for testing ingest offline.
+
+StubServer accepts JSON POSTs on any path, records them and answers
+{"received": <number of payloads>}.  It speaks HTTP/1.1 with keep-alive, can
+add latency to every request and can be told to fail the next requests,
+either with an error status or by dropping the connection.
+
+Examples
+--------
+>>> with StubServer(latency=0.01) as server:
+...     server.fail(2, status=503)
+...     results = ingest(payloads, {'citrine': server.url + '/citrine'})
+...     print(len(server.requests), server.connection_count)
+"""
+
+from collections import namedtuple
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+# pass as the status to StubServer.fail to close the connection without
+# answering
+DROP = 'drop'
+
+
+class StubRequest(namedtuple('StubRequest', ['path', 'body', 'connection'])):
+    """
+    A request received by StubServer.
+
+    path:       the request path
+    body:       the parsed JSON body
+    connection: (host, port) of the client connection it arrived on
+    """
+    __slots__ = ()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately; without TCP_NODELAY each
+    # keep-alive response waits for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        stub = self.server.stub
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if stub.latency:
+            time.sleep(stub.latency)
+
+        failure = stub._next_failure()
+        if failure == DROP:
+            self.close_connection = True
+            return
+        if failure is not None:
+            self._respond(failure, {'error': 'injected failure'}, retry_after=stub.retry_after)
+            return
+
+        try:
+            body = json.loads(data.decode('utf-8'))
+        except ValueError:
+            self._respond(400, {'error': 'invalid JSON'})
+            return
+        stub._record(StubRequest(self.path, body, self.client_address))
+        self._respond(200, {'received': len(body) if isinstance(body, list) else 1})
+
+    def _respond(self, status, document, retry_after=None):
+        data = json.dumps(document).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # the default backlog of 5 drops connection attempts from concurrent
+    # clients, which then wait a second to retry
+    request_queue_size = 128
+
+
+class StubServer(object):
+    """
+    args:
+        host:   interface to listen on
+        port:   port to listen on (default: any free port)
+        latency: seconds to wait before answering each request
+        retry_after: Retry-After value sent with injected failures
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, retry_after=None):
+        self.latency = latency
+        self.retry_after = retry_after
+        self.requests = []
+        self._failures = []
+        self._lock = threading.Lock()
+        self._server = _ThreadingHTTPServer((host, port), _Handler)
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+    @property
+    def connection_count(self):
+        """
+        Number of distinct client connections that delivered a request.
+        """
+        with self._lock:
+            return len(set(request.connection for request in self.requests))
+
+    @property
+    def payload_count(self):
+        with self._lock:
+            return sum(
+                len(request.body) if isinstance(request.body, list) else 1
+                for request in self.requests
+            )
+
+    def fail(self, count=1, status=503):
+        """
+        Fail the next count requests with status, or by dropping the
+        connection if status is DROP.
+        """
+        with self._lock:
+            self._failures.extend([status] * count)
+
+    def _next_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def _record(self, request):
+        with self._lock:
+            self.requests.append(request)
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05}
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
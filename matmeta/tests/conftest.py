@@ -0,0 +1,72 @@
+"""
+Factories for the common payloads used across the tests.
+
+The fixtures return functions, so that a test can build as many records as
+it needs:
+
+    def test_something(make_record):
+        records = [make_record(i) for i in range(3)]
+"""
+
+import pytest
+
+
+def _person(index, **extra):
+    person = {
+        'given_name': 'Given%d' % index,
+        'family_name': 'Family%d' % index,
+        'email': 'p%d@a.org' % index,
+    }
+    person.update(extra)
+    return person
+
+
+def _record(index=0, people=1, **overrides):
+    """
+    A common payload that every service accepts.  index numbers its title
+    and landing page; people is the number of contacts, who are also the
+    contributors.
+    """
+    contacts = [_person(i) for i in range(people)]
+    record = {
+        'title': 'title %d' % index,
+        'description': 'description',
+        'source': {'name': 'source'},
+        'data_contacts': contacts,
+        'data_contributors': contacts,
+        'links': {'landing_page': 'http://landing.page/%d' % index},
+    }
+    record.update(overrides)
+    return record
+
+
+def _full_record(index=0, **overrides):
+    """
+    A record that fills every section of every service: distinct
+    contributors, authors (one with an ORCID), a license and a citation.
+    """
+    record = _record(
+        index,
+        source={'name': 'source', 'producer': 'producer', 'url': 'http://source.org', 'tags': ['a']},
+        data_contributors=[_person(1), _person(2)],
+        authors=[_person(0), _person(3, orcid='0000-0003')],
+        licenses=[{'name': 'CC-BY', 'url': 'http://cc.org'}],
+        citations=[{'title': 'Ref', 'year': '2001', 'journal': 'J', 'authors': [_person(4)]}],
+    )
+    record.update(overrides)
+    return record
+
+
+@pytest.fixture
+def make_person():
+    return _person
+
+
+@pytest.fixture
+def make_record():
+    return _record
+
+
+@pytest.fixture
+def make_full_record():
+    return _full_record
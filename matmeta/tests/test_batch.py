@@ -0,0 +1,65 @@
+import io
+import json
+import os
+
+import matmeta
+from matmeta.batch import InvalidRecord, read_jsonl
+from matmeta.cli import main
+
+
+def test_emit_stream_reports_errors_per_service(make_record):
+    records = [make_record(), make_record(title=None), {'description': 'only MC fields'}]
+    del records[1]['title']
+    results = list(matmeta.emit_stream(records, id_key='links.landing_page'))
+    assert [result.ok for result in results] == [True, False, False]
+    assert results[0].record_id == 'http://landing.page/0'
+    assert results[2].record_id == 2
+    assert set(results[0].payloads) == {
+        'citrine', 'materials_commons', 'materials_data_facility'
+    }
+    assert set(results[1].payloads) == {'citrine', 'materials_commons'}
+    assert results[1].errors[0]['service'] == 'materials_data_facility'
+    assert results[1].errors[0]['problems'] == [
+        {'keypath': 'title', 'message': 'missing required field'}
+    ]
+
+
+def test_emit_stream_is_lazy(make_record):
+    def records():
+        yield make_record()
+        raise AssertionError('consumed too far')
+    stream = matmeta.emit_stream(records(), services=['materials_commons'])
+    assert next(stream).payloads == {
+        'materials_commons': {'name': 'source', 'description': 'description'}
+    }
+
+
+def test_read_jsonl_marks_bad_lines():
+    fp = io.StringIO(u'{"title": "a"}\n\nnot json\n')
+    records = list(read_jsonl(fp))
+    assert records[0] == {'title': 'a'}
+    assert isinstance(records[1], InvalidRecord) and records[1].line == 3
+    result = list(matmeta.emit_stream(records))[1]
+    assert not result.ok and not result.payloads
+
+
+def test_cli_writes_per_service_outputs(tmpdir, make_record):
+    source = tmpdir.join('catalog.jsonl')
+    source.write('\n'.join([
+        json.dumps(make_record()),
+        json.dumps({'title': 'missing most fields'}),
+        '{broken',
+    ]) + '\n')
+    status = main([
+        'emit', str(source), '--output-dir', str(tmpdir),
+        '--services', 'materials_commons', 'materials_data_facility',
+    ])
+    assert status == 0
+    assert not os.path.exists(str(tmpdir.join('catalog.citrine.jsonl')))
+    mc_lines = tmpdir.join('catalog.materials_commons.jsonl').readlines()
+    assert [json.loads(line) for line in mc_lines] == [
+        {'name': 'source', 'description': 'description'}
+    ]
+    assert len(tmpdir.join('catalog.materials_data_facility.jsonl').readlines()) == 1
+    errors = [json.loads(line) for line in tmpdir.join('catalog.errors.jsonl').readlines()]
+    assert [error['index'] for error in errors] == [1, 2]
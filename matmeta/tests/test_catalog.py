@@ -0,0 +1,146 @@
+import json
+import random
+
+import pytest
+
+import matmeta
+from matmeta.catalog import FIELDS, CatalogIndex, terms
+from matmeta.cli import main
+from matmeta.parallel import emit_parallel
+
+
+@pytest.fixture
+def make_catalog_record(make_record, make_person):
+    def build(index, people=(), tags=(), license_url=None):
+        # an upper case email, which is indexed in lower case
+        contact = make_person(index, email='P%d@a.org' % index)
+        return make_record(
+            index,
+            source={'name': 'source', 'tags': list(tags)},
+            authors=[make_person(i, orcid='0000-%04d' % i) for i in people],
+            data_contacts=[contact],
+            data_contributors=[contact],
+            licenses=[{'name': 'CC-BY', 'url': license_url}] if license_url else [],
+            links={
+                'landing_page': 'http://landing.page/%d' % index,
+                'publication': ['http://doi.org/%d' % index],
+                'data_doi': {'url': 'http://data.doi/%d' % index},
+            },
+        )
+    return build
+
+
+def test_terms(make_catalog_record):
+    found = terms(make_catalog_record(1, people=[2], tags=['dft'], license_url='http://cc.org'))
+    assert ('orcid', '0000-0002') in found
+    assert ('family_name', 'family2') in found and ('family_name', 'family1') in found
+    assert ('email', 'p1@a.org') in found
+    assert ('license_url', 'http://cc.org') in found and ('license_name', 'CC-BY') in found
+    assert ('source_tag', 'dft') in found
+    assert {value for field, value in found if field == 'link'} == {
+        'http://landing.page/1', 'http://doi.org/1', 'http://data.doi/1'
+    }
+    assert terms({'authors': 'not a list', 'links': None, 'licenses': [None, {'url': 1}]}) == set()
+
+
+def test_lookup_query_and_normalization(make_catalog_record):
+    index = CatalogIndex()
+    index.add('a', make_catalog_record(0, people=[1, 2], tags=['dft', 'x'], license_url='http://cc.org'))
+    index.add('b', make_catalog_record(1, people=[2], tags=['dft']))
+    index.add('c', make_catalog_record(2, people=[3], tags=['x']))
+    assert index.lookup('orcid', ' 0000-0002 ') == {'a', 'b'}
+    assert index.lookup('family_name', '  FAMILY2 ') == {'a', 'b', 'c'}
+    assert index.lookup('email', 'p1@A.org') == {'a', 'b'}
+    assert index.lookup('license_url', 'http://cc.org') == {'a'}
+    assert index.lookup('link', 'http://doi.org/2') == {'c'}
+    assert index.lookup('orcid', 'missing') == frozenset()
+    assert index.query(source_tag='dft', orcid='0000-0002') == {'a', 'b'}
+    assert index.query(source_tag='x', orcid='0000-0002') == {'a'}
+    assert index.query(source_tag='x', orcid='missing') == frozenset()
+    assert index.count('source_tag', 'dft') == 2
+    assert set(index.values('source_tag')) == {'dft', 'x'}
+    assert len(index) == 3 and 'a' in index
+    with pytest.raises(ValueError):
+        index.lookup('title', 'title 0')
+    with pytest.raises(ValueError):
+        index.query()
+
+
+def test_add_replaces_and_remove(make_catalog_record):
+    index = CatalogIndex()
+    index.add(1, make_catalog_record(1, people=[5], tags=['old']))
+    index.add(2, make_catalog_record(2, people=[5]))
+    index.add(1, make_catalog_record(1, tags=['new']))
+    assert len(index) == 2
+    assert index.lookup('orcid', '0000-0005') == {2}
+    assert index.lookup('source_tag', 'old') == frozenset()
+    assert index.lookup('source_tag', 'new') == {1}
+    index.remove(2)
+    assert index.lookup('orcid', '0000-0005') == frozenset()
+    assert 'old' not in index.values('source_tag')
+    with pytest.raises(KeyError):
+        index.remove(2)
+
+
+def _contents(index):
+    return {
+        field: {value: index.lookup(field, value) for value in index.values(field)}
+        for field in FIELDS
+    }
+
+
+def test_save_and_load_match_random_edits(tmpdir, make_catalog_record):
+    rng = random.Random(3)
+    index = CatalogIndex()
+    for step in range(300):
+        record_id = rng.choice([rng.randrange(40), 'id%d' % rng.randrange(40)])
+        if record_id in index and rng.random() < 0.3:
+            index.remove(record_id)
+        else:
+            index.add(record_id, make_catalog_record(
+                rng.randrange(20), people=rng.sample(range(10), 2), tags=rng.sample('abcde', 2)
+            ))
+    index.add('empty', {})
+    path = str(tmpdir.join('catalog.index'))
+    index.save(path)
+    loaded = CatalogIndex.load(path)
+    assert len(loaded) == len(index)
+    assert 'empty' in loaded
+    assert _contents(loaded) == _contents(index)
+    # a loaded index can be saved again, and edited
+    loaded.save(path)
+    assert _contents(CatalogIndex.load(path)) == _contents(index)
+    for record_id in list(index._terms)[:10]:
+        index.remove(record_id)
+        loaded.remove(record_id)
+    loaded.add('new', make_catalog_record(99, people=[1]))
+    index.add('new', make_catalog_record(99, people=[1]))
+    assert _contents(loaded) == _contents(index)
+
+
+def test_built_alongside_batch_emission(make_catalog_record):
+    records = [make_catalog_record(i, people=[i % 3]) for i in range(6)]
+    del records[5]['title']  # fails for MDF only, so it is still indexed
+    records.append(['not', 'a', 'record'])
+    index = CatalogIndex()
+    results = list(matmeta.emit_stream(records, id_key='links.landing_page', catalog=index))
+    assert len(index) == 6
+    assert index.lookup('orcid', '0000-0001') == {'http://landing.page/1', 'http://landing.page/4'}
+    assert results[6].record_id not in index
+
+    parallel = CatalogIndex()
+    list(emit_parallel(records, id_key='links.landing_page', workers=2, chunk_size=2, catalog=parallel))
+    assert _contents(parallel) == _contents(index)
+
+
+def test_cli_index_and_query(tmpdir, capsys, make_catalog_record):
+    source = tmpdir.join('catalog.jsonl')
+    index_path = str(tmpdir.join('catalog.index'))
+    source.write(''.join(json.dumps(make_catalog_record(i, people=[i % 2])) + '\n' for i in range(4)))
+    assert main(['emit', str(source), '-o', str(tmpdir), '--id-key', 'links.landing_page', '--index', index_path]) == 0
+    capsys.readouterr()
+    assert main(['query', index_path, '--orcid', '0000-0001']) == 0
+    assert capsys.readouterr().out.splitlines() == ['"http://landing.page/1"', '"http://landing.page/3"']
+    assert main(['query', index_path, '--orcid', '0000-0001', '--family-name', 'family3']) == 0
+    assert capsys.readouterr().out.splitlines() == ['"http://landing.page/3"']
+    assert main(['query', index_path]) == 2
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+from matmeta.citations import (
+    CitationFormatter,
+    CitationStyle,
+    Field,
+    format_citation,
+    get_formatter,
+)
+from matmeta.payload_metaclass import MDFPayload
+
+
+def _legacy_citation_to_string(citation):
+    # the formatter that matmeta.citations replaced (journal and book only)
+    output = ''
+    sep = '. '
+    if 'authors' in citation:
+        authors = []
+        for author in citation['authors']:
+            if 'family_name' not in author:
+                continue
+            author_name = author['family_name']
+            if 'given_name' in author:
+                author_name += ' ' + author['given_name']
+            authors.append(author_name)
+        output += ', '.join(authors) + sep
+    if 'year' in citation:
+        output += str(citation['year']) + sep
+    if 'title' in citation:
+        output += citation['title'] + sep
+    if 'journal' in citation:
+        output += citation['journal'] + sep
+        if 'volume' in citation:
+            output += citation['volume']
+            if 'issue' in citation:
+                output += '(' + citation['issue'] + ')'
+            if 'page_location' in citation:
+                output += ':' + citation['page_location'] + sep
+    else:
+        if 'edition' in citation:
+            output += citation['edition'] + sep
+        if 'publication_location' in citation:
+            output += citation['publication_location']
+            if 'publisher' in citation:
+                output += ': ' + citation['publisher'] + sep
+        elif 'publisher' in citation:
+            output += citation['publisher'] + sep
+        if 'extent' in citation:
+            output += citation['extent'] + sep
+        if 'notes' in citation:
+            output += citation['notes'] + sep
+    return output.strip()
+
+
+FIELDS = ['year', 'title', 'journal', 'volume', 'issue', 'page_location',
+          'edition', 'publication_location', 'publisher', 'extent', 'notes']
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_ssf_matches_legacy_formatter(seed):
+    rng = random.Random(seed)
+    citation = {
+        field: '%s %d' % (field, rng.randint(0, 9))
+        for field in FIELDS if rng.random() < 0.5
+    }
+    if rng.random() < 0.5:
+        citation['authors'] = [
+            {'family_name': 'Curie', 'given_name': 'M'},
+            {'given_name': 'No family name'},
+            {'family_name': 'Turing'},
+        ][:rng.randint(0, 3)]
+    assert format_citation(citation) == _legacy_citation_to_string(citation)
+
+
+def test_url_references():
+    assert format_citation({
+        'authors': [{'family_name': 'Doe', 'given_name': 'J'}],
+        'year': 2017,
+        'title': 'A web page',
+        'url': 'http://example.org',
+    }) == 'Doe J. 2017. A web page. Available from: http://example.org'
+    assert format_citation({
+        'journal': 'J Data', 'volume': '3', 'url': 'http://doi.org/x'
+    }) == 'J Data. 3 Available from: http://doi.org/x'
+    assert format_citation({
+        'journal': 'J Data', 'volume': '3', 'page_location': '1-2',
+        'url': 'http://doi.org/x'
+    }) == 'J Data. 3:1-2. Available from: http://doi.org/x'
+
+
+def test_custom_style():
+    style = CitationStyle('short', {
+        'book': [Field('title', '"{}"'), Field('year', ' ({})')],
+    })
+    formatter = CitationFormatter(style)
+    assert formatter.format({'title': 'Dune', 'year': 1965}) == '"Dune" (1965)'
+
+
+def test_mdf_payload_uses_shared_formatter():
+    contact = {'given_name': 'Jane', 'family_name': 'Doe', 'email': 'jd@a.org'}
+    citation = {'title': 'Shared reference', 'journal': 'J', 'volume': '1'}
+    payload = MDFPayload(
+        title='t', source={'name': 's'}, data_contacts=[contact],
+        data_contributors=[contact], links={'landing_page': 'http://a.org'},
+        citations=[citation],
+    )
+    assert payload.metapayload['mdf']['citation'] == ['Shared reference. J. 1']
+    assert get_formatter() is get_formatter('ssf')
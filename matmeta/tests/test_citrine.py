@@ -0,0 +1,253 @@
+import copy
+import json
+import random
+
+import pytest
+
+from matmeta.payload_metaclass import CITPayload
+
+GIVEN = ['Ada', 'Grace', 'Alan', 'Marie', 'Linus']
+FAMILY = ['Lovelace', 'Hopper', 'Turing', 'Curie']
+
+
+def _maybe(rng, probability=0.5):
+    return rng.random() < probability
+
+
+def _word(rng):
+    return rng.choice(['alpha', 'beta', 'gamma', 'delta']) + str(rng.randint(0, 99))
+
+
+def _person(rng):
+    person = {'family_name': rng.choice(FAMILY)}
+    if _maybe(rng, 0.9):
+        person['given_name'] = rng.choice(GIVEN)
+    for key in ('title', 'email', 'orcid'):
+        if _maybe(rng, 0.3):
+            person[key] = _word(rng)
+    if _maybe(rng, 0.2):
+        person['tags'] = [_word(rng)]
+    return person
+
+
+def _license(rng):
+    license = {}
+    for key in ('name', 'url', 'description'):
+        if _maybe(rng, 0.7):
+            license[key] = _word(rng)
+    if _maybe(rng, 0.4):
+        license['tags'] = [_word(rng), rng.randint(0, 9)]
+    if _maybe(rng, 0.15):
+        license['extra_field'] = _word(rng)
+    if _maybe(rng, 0.1):
+        license['name'] = 42  # rejected by pypif, skipped by both emitters
+    return license
+
+
+def _citation(rng):
+    citation = {}
+    for key in ('doi', 'isbn', 'issn', 'url', 'title', 'publisher', 'journal',
+                'volume', 'issue', 'year', 'edition', 'notes', 'page_location'):
+        if _maybe(rng, 0.4):
+            citation[key] = _word(rng)
+    if _maybe(rng, 0.6):
+        citation['authors'] = []
+        for _ in range(rng.randint(0, 3)):
+            author = _person(rng)
+            if _maybe(rng, 0.2):
+                author['suffix'] = 'Jr.'
+            citation['authors'].append(author)
+    if _maybe(rng, 0.3):
+        citation['pages'] = rng.choice([
+            '1-10', 7, {'start': 1, 'end': '9'}, {'start': 'iv'}
+        ])
+    if _maybe(rng, 0.2):
+        citation['figure'] = {'number': '3', 'caption': _word(rng)}
+    if _maybe(rng, 0.2):
+        citation['editors'] = ['E. Ditor', {'given': 'Ed', 'family': 'Itor'}]
+    for key in ('affiliations', 'acknowledgements', 'tags'):
+        if _maybe(rng, 0.2):
+            citation[key] = [_word(rng)]
+    return citation
+
+
+def _payload(rng):
+    payload = {}
+    if _maybe(rng, 0.8):
+        payload['source'] = {}
+        for key in ('name', 'producer', 'url'):
+            if _maybe(rng):
+                payload['source'][key] = _word(rng)
+        if _maybe(rng):
+            payload['source']['tags'] = [_word(rng) for _ in range(rng.randint(0, 3))]
+    for key in ('authors', 'data_contacts', 'data_contributors'):
+        if _maybe(rng, 0.7):
+            payload[key] = [_person(rng) for _ in range(rng.randint(0, 5))]
+    if _maybe(rng, 0.6):
+        payload['licenses'] = [_license(rng) for _ in range(rng.randint(0, 3))]
+    if _maybe(rng, 0.6):
+        payload['citations'] = [_citation(rng) for _ in range(rng.randint(0, 4))]
+    return payload
+
+
+def _without_repeated_people(payload):
+    # The direct emitter merges repeated people differently from the
+    # reference (see test_repeated_people_differ_from_the_reference), so
+    # each person appears once, under a name and ORCID of their own.
+    names, orcids = set(), set()
+    for key in ('authors', 'data_contacts', 'data_contributors'):
+        people = []
+        for person in payload.get(key, []):
+            name = (person['family_name'], person.get('given_name', ''))
+            if name in names or person.get('orcid') in orcids:
+                continue
+            names.add(name)
+            if 'orcid' in person:
+                orcids.add(person['orcid'])
+            people.append(person)
+        if key in payload:
+            payload[key] = people
+    return payload
+
+
+@pytest.mark.filterwarnings('ignore:Skipping invalid license')
+@pytest.mark.parametrize('seed', range(300))
+def test_direct_emitter_matches_pypif(seed):
+    rng = random.Random(seed)
+    payload = _without_repeated_people(_payload(rng))
+    original = copy.deepcopy(payload)
+    direct = CITPayload(**payload).metapayload
+    assert payload == original
+    reference = CITPayload(**copy.deepcopy(payload)).reference_metapayload
+    # compare serialized forms so that key order is checked too
+    assert json.dumps(direct) == json.dumps(reference)
+
+
+def test_type_errors_match_pypif():
+    payload = {'citations': [{'title': 'x', 'year': 2017}]}
+    with pytest.raises(TypeError):
+        CITPayload(**payload).reference_metapayload
+    with pytest.raises(TypeError):
+        CITPayload(**payload).metapayload
+
+
+def test_invalid_licenses_are_skipped_with_a_warning():
+    payload = {'licenses': [{'name': 'CC-BY'}, 'not a license']}
+    with pytest.warns(UserWarning, match='Skipping invalid license'):
+        direct = CITPayload(**payload).metapayload
+    with pytest.warns(UserWarning, match='Skipping invalid license'):
+        reference = CITPayload(**payload).reference_metapayload
+    assert direct['licenses'] == reference['licenses'] == [{'name': 'CC-BY'}]
+
+
+def test_readme_example():
+    payload = CITPayload(
+        data_contacts=[{'given_name': 'John', 'family_name': 'Smith', 'email': 'js@a.org'}],
+        data_contributors=[{'given_name': 'Jane', 'family_name': 'Doe', 'email': 'jd@a.org'}],
+        source={'name': 'test source'},
+    )
+    assert payload.metapayload == {
+        'contacts': [
+            {'tags': ['contact'], 'name': {'title': '', 'given': 'John', 'family': 'Smith'},
+             'email': 'js@a.org'},
+            {'tags': ['contributor'], 'name': {'title': '', 'given': 'Jane', 'family': 'Doe'},
+             'email': 'jd@a.org'},
+        ],
+        'source': {'tags': []},
+        'category': 'system',
+    }
+
+
+def _contacts(payload):
+    return CITPayload(**payload).metapayload['contacts']
+
+
+def test_duplicate_people_merge_tags_in_first_seen_order():
+    ada = {'given_name': 'Ada', 'family_name': 'Lovelace', 'email': 'ada@a.org'}
+    alan = {'given_name': 'Alan', 'family_name': 'Turing'}
+    contacts = _contacts({
+        'authors': [ada, alan],
+        'data_contacts': [{'given_name': ' ada ', 'family_name': 'LOVELACE'}],
+        'data_contributors': [alan, ada],
+    })
+    assert [(c['name']['given'], c['tags']) for c in contacts] == [
+        ('Ada', ['author', 'contact', 'contributor']),
+        ('Alan', ['author', 'contributor']),
+    ]
+    assert contacts[0]['email'] == 'ada@a.org'
+
+
+def test_orcid_identifies_people():
+    contacts = _contacts({
+        'authors': [
+            {'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0001'},
+            {'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0002'},
+            {'given_name': 'Jo', 'family_name': 'Smyth', 'orcid': '0000-0001'},
+        ],
+        'data_contacts': [{'given_name': 'J.', 'family_name': 'Smith'}],
+    })
+    assert [(c['orcid'], c['tags']) for c in contacts] == [
+        ('0000-0001', ['author', 'contact']),
+        ('0000-0002', ['author']),
+    ]
+
+
+def test_orcid_conflicts_are_checked_against_every_match():
+    # the second Smith gives the first one an ORCID, so the third, with
+    # another ORCID, is a different person
+    contacts = _contacts({
+        'authors': [
+            {'given_name': 'J.', 'family_name': 'Smith'},
+            {'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0001'},
+            {'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0002'},
+        ],
+        'data_contacts': [{'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0002'}],
+    })
+    assert [(c.get('orcid'), c['tags']) for c in contacts] == [
+        (None, ['author']),
+        ('0000-0002', ['author', 'contact']),
+    ]
+
+
+def test_repeated_people_differ_from_the_reference():
+    # The reference keeps the original behavior: exact names only, and a
+    # person seen twice loses their tags.
+    payload = {
+        'authors': [
+            {'given_name': 'Ada', 'family_name': 'Lovelace'},
+            {'given_name': 'J.', 'family_name': 'Smith', 'orcid': '0000-0001'},
+        ],
+        'data_contacts': [
+            {'given_name': 'Ada', 'family_name': 'Lovelace'},
+            {'given_name': 'ada', 'family_name': 'LOVELACE'},
+            {'given_name': 'Jo', 'family_name': 'Smith', 'orcid': '0000-0001'},
+        ],
+    }
+    direct = CITPayload(**payload).metapayload['contacts']
+    reference = CITPayload(**payload).reference_metapayload['contacts']
+    assert [(c['name']['given'], c['tags']) for c in direct] == [
+        ('Ada', ['author', 'contact']),
+        ('J.', ['author', 'contact']),
+    ]
+    assert [(c['name']['given'], c.get('tags')) for c in reference] == [
+        ('Ada', None),
+        ('J.', ['author']),
+        ('ada', ['contact']),
+        ('Jo', ['contact']),
+    ]
+
+
+def test_large_author_lists():
+    authors = [
+        {'given_name': 'Given%d' % i, 'family_name': 'Family%d' % i}
+        for i in range(5000)
+    ]
+    contacts = _contacts({
+        'authors': authors,
+        'data_contacts': authors[::2],
+        'data_contributors': list(reversed(authors)),
+    })
+    assert len(contacts) == 5000
+    assert [c['name']['family'] for c in contacts] == [a['family_name'] for a in authors]
+    assert contacts[0]['tags'] == ['author', 'contact', 'contributor']
+    assert contacts[1]['tags'] == ['author', 'contributor']
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+import matmeta
+from matmeta.cli import main
+from matmeta.fingerprint import FingerprintCache, fingerprint
+from matmeta.parallel import emit_parallel
+
+
+def _dumps(results):
+    return [json.dumps([result.payloads, result.errors]) for result in results]
+
+
+def test_fingerprint_keeps_key_order():
+    assert fingerprint({'a': 1, 'b': 2}) == fingerprint({'a': 1, 'b': 2})
+    assert fingerprint({'a': 1, 'b': 2}) != fingerprint({'b': 2, 'a': 1})
+    assert fingerprint({'a': True}) != fingerprint({'a': 1})
+
+
+def test_warm_run_returns_cached_payloads(tmpdir, make_record):
+    path = str(tmpdir.join('cache.sqlite'))
+    records = [make_record(i) for i in range(6)] + ['not a record']
+    del records[5]['title']
+    expected = _dumps(matmeta.emit_stream(records))
+
+    with FingerprintCache(path) as cache:
+        cold = list(matmeta.emit_stream(records, cache=cache))
+        assert all(result.changed for result in cold)
+        assert cache.cache_info().size == 5 * 3 + 2  # MDF requires a title
+
+    records[2] = make_record(2, description='changed')
+    with FingerprintCache(path) as cache:
+        warm = list(matmeta.emit_stream(records, cache=cache))
+        assert [result.changed for result in warm] == [False, False, True, False, False, True, True]
+        assert warm[0].cached == ('citrine', 'materials_commons', 'materials_data_facility')
+        assert warm[5].cached == ('citrine', 'materials_commons')
+        assert not warm[5].ok
+        assert cache.cache_info().hits == 4 * 3 + 2
+    expected[2] = _dumps(matmeta.emit_stream(records[2:3]))[0]
+    assert _dumps(warm) == expected
+    # cached payloads are frozen, like emitted ones
+    with pytest.raises(TypeError):
+        warm[0].payloads['citrine']['category'] = 'other'
+
+
+def test_partial_hits_emit_only_missing_services(make_record):
+    cache = FingerprintCache(':memory:')
+    record = make_record(0)
+    first = next(matmeta.emit_stream([record], services=['citrine'], cache=cache))
+    assert first.changed
+    second = next(matmeta.emit_stream([record], cache=cache))
+    assert second.cached == ('citrine',)
+    assert second.changed
+    assert list(second.payloads) == ['citrine', 'materials_commons', 'materials_data_facility']
+    assert not next(matmeta.emit_stream([record], cache=cache)).changed
+
+
+def test_skip_unchanged_looks_up_each_record_once(make_record):
+    cache = FingerprintCache(':memory:')
+    records = [make_record(0), make_record(1)]
+    list(matmeta.emit_stream(records[:1], services=['citrine'], cache=cache))
+    results = list(matmeta.emit_stream(
+        records, services=['citrine', 'materials_commons'], cache=cache, skip_unchanged=True
+    ))
+    assert results[0].cached == ('citrine',)
+    assert list(results[0].payloads) == ['citrine', 'materials_commons']
+    assert cache.cache_info()[:2] == (1, 1 + 3)
+    results = list(matmeta.emit_stream(
+        records, services=['citrine', 'materials_commons'], cache=cache, skip_unchanged=True
+    ))
+    assert [result.payloads for result in results] == [{}, {}]
+    assert not any(result.changed for result in results)
+    assert cache.cache_info()[:2] == (1 + 4, 4)
+
+
+def test_other_versions_and_unused_entries_are_evicted(tmpdir, make_record):
+    path = str(tmpdir.join('cache.sqlite'))
+    with FingerprintCache(path, version='0.0.1') as cache:
+        list(matmeta.emit_stream([make_record(0)], cache=cache))
+    with FingerprintCache(path) as cache:
+        assert cache.version == matmeta.__version__
+        assert cache.cache_info().size == 0
+        list(matmeta.emit_stream([make_record(0)], cache=cache))
+        assert cache.evict() == 0
+        assert cache.evict(max_age=-1) == 3
+
+
+def test_hits_flush_use_times_as_they_go(make_record):
+    cache = FingerprintCache(':memory:', commit_every=3)
+    keys = [cache.key(make_record(i)) for i in range(7)]
+    for key in keys:
+        cache.put(key, {'citrine': {}})
+    cache.commit()
+    cache._connection.execute('UPDATE records SET used = 0')
+    for key in keys:
+        cache.get(key, ['citrine'])
+    # a run of hits keeps fewer than commit_every use times in memory
+    assert cache._used == keys[6:]
+    used = cache._connection.execute('SELECT fingerprint FROM records WHERE used > 0')
+    assert sorted(row[0] for row in used) == sorted(keys[:6])
+
+
+def test_parallel_workers_share_the_cache(tmpdir, make_record):
+    path = str(tmpdir.join('cache.sqlite'))
+    records = [make_record(i) for i in range(10)]
+    with FingerprintCache(path) as cache:
+        cold = list(emit_parallel(records, workers=2, chunk_size=3, cache=cache))
+        warm = list(emit_parallel(records, workers=2, chunk_size=3, cache=cache))
+    assert _dumps(cold) == _dumps(warm) == _dumps(matmeta.emit_stream(records))
+    assert not any(result.changed for result in warm)
+    with pytest.raises(ValueError):
+        list(emit_parallel(records, cache=FingerprintCache(':memory:')))
+
+
+def test_cli_changed_only(tmpdir, capsys, make_record):
+    source = tmpdir.join('catalog.jsonl')
+    cache = str(tmpdir.join('cache.sqlite'))
+    records = [make_record(i) for i in range(3)]
+    source.write(''.join(json.dumps(record) + '\n' for record in records))
+    arguments = ['emit', str(source), '-o', str(tmpdir), '-s', 'citrine', '--cache', cache, '--changed-only']
+    assert main(arguments) == 0
+    assert len(tmpdir.join('catalog.citrine.jsonl').readlines()) == 3
+
+    records[1]['title'] = 'changed'
+    source.write(''.join(json.dumps(record) + '\n' for record in records))
+    assert main(arguments) == 0
+    assert len(tmpdir.join('catalog.citrine.jsonl').readlines()) == 1
+    assert 'unchanged records: 2' in capsys.readouterr().err
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+import matmeta
+from matmeta.frozen import FrozenDict
+from matmeta.payload_metaclass import CITPayload, MCPayload, MDFPayload, PublishablePayload
+from matmeta.services import ServiceRegistry, registry
+from matmeta.validation import ValidationError
+from matmeta import fused
+
+
+def test_emit_all_matches_payload_classes(make_full_record):
+    inputs = make_full_record(unknown_field='ignored')
+    outputs = matmeta.emit_all(inputs)
+    assert list(outputs) == ['citrine', 'materials_commons', 'materials_data_facility']
+    for payload_class in (CITPayload, MDFPayload, MCPayload):
+        expected = payload_class(**inputs).metapayload
+        assert json.dumps(outputs[payload_class.service]) == json.dumps(expected)
+        assert isinstance(outputs[payload_class.service], FrozenDict)
+
+
+def test_emit_all_selected_services(make_full_record):
+    outputs = fused.emit_all(make_full_record(), services=['materials_commons'])
+    assert outputs == {'materials_commons': {'name': 'source', 'description': 'description'}}
+
+
+def test_emit_all_validates_merged_requirements_once(make_full_record):
+    inputs = make_full_record()
+    del inputs['title'], inputs['description']
+    with pytest.raises(ValidationError) as info:
+        fused.emit_all(inputs)
+    assert sorted(problem.keypath for problem in info.value.problems) == ['description', 'title']
+
+
+def test_emitters_without_sections_are_constructed(monkeypatch, make_full_record):
+    class Legacy(PublishablePayload):
+        service = 'legacy'
+        __slots__ = ()
+
+        def _emit(self):
+            return {'title': self['title']}
+
+    local = ServiceRegistry()
+    local.register('legacy', lambda: {'title': 'string'}, Legacy)
+    monkeypatch.setattr(fused, 'registry', local)
+    monkeypatch.setattr('matmeta.validation.registry', local)
+    assert fused.emit_all(make_full_record()) == {'legacy': {'title': 'title 0'}}
+
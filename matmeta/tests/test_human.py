@@ -5,3 +5,24 @@ def test_construct_human():
     assert someone.given_name == "Steve"
     assert someone["given_name"] == "Steve"
     assert someone.institution == "TV"
+
+
+def test_human_attribute_assignment():
+    someone = Human("Steve", "Holt")
+    someone.email = "steve@holt.org"
+    assert someone["email"] == "steve@holt.org"
+    assert not hasattr(someone, "__dict__")
+
+
+def test_human_is_not_a_reference_cycle():
+    import gc
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(1000):
+            Human("Steve", "Holt")
+        # with self.__dict__ = self every instance would be left for the
+        # cyclic collector
+        assert gc.collect() < 1000
+    finally:
+        gc.enable()
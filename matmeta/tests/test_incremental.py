@@ -0,0 +1,125 @@
+import copy
+import json
+import random
+
+import pytest
+
+from matmeta import incremental
+from matmeta.incremental import apply_patch, diff, pointer
+from matmeta.payload_metaclass import CITPayload, MCPayload, MDFPayload
+
+PAYLOAD_CLASSES = [CITPayload, MDFPayload, MCPayload]
+
+
+def _changes(make_person):
+    return [
+        {'data_contributors': [make_person(1), make_person(2), make_person(5)]},
+        {'data_contributors': [make_person(1)]},
+        {'source': {'name': 'renamed', 'producer': 'producer', 'url': 'http://source.org', 'tags': ['a']}},
+        {'source': {'name': 'source', 'producer': 'producer', 'url': 'http://elsewhere.org', 'tags': ['a', 'b']}},
+        {'links': {'landing_page': 'http://other.page', 'publication': ['http://doi.org/x']}},
+        {'licenses': None},
+        {'licenses': [{'name': 'CC0'}, {'name': 'MIT', 'url': 'http://mit'}]},
+        {'citations': [{'title': 'Other', 'year': '1999', 'url': 'http://ref.org'}]},
+        {'authors': [make_person(3, orcid='0000-0003'), make_person(6)], 'year': '2020', 'tags': ['x/y', 'z~']},
+        {'description': 'new description', 'title': 'new title'},
+    ]
+
+
+@pytest.mark.parametrize('payload_class', PAYLOAD_CLASSES)
+@pytest.mark.parametrize('change', range(10))  # an index into _changes
+def test_update_matches_full_emission(payload_class, change, make_full_record, make_person):
+    changes = _changes(make_person)[change]
+    payload = payload_class(**make_full_record())
+    before = payload.emit(mutable=True)
+    patch = payload.apply_changes(copy.deepcopy(changes))
+    expected = payload_class(**dict(payload)).metapayload
+    # same content and key order as emitting from scratch
+    assert json.dumps(payload.metapayload) == json.dumps(expected)
+    assert apply_patch(before, patch) == expected
+    json.dumps(patch)
+
+
+def test_random_edit_sequences(make_full_record, make_person):
+    changes = _changes(make_person)
+    rng = random.Random(7)
+    for payload_class in PAYLOAD_CLASSES:
+        payload = payload_class(**make_full_record())
+        document = payload.emit(mutable=True)
+        for _ in range(30):
+            patch = payload.apply_changes(copy.deepcopy(rng.choice(changes)))
+            document = apply_patch(document, patch)
+            assert document == payload_class(**dict(payload)).metapayload
+
+
+def test_only_affected_sections_are_recomputed(make_full_record, make_person):
+    payload = CITPayload(**make_full_record())
+    before = payload.metapayload
+    assert payload.apply_changes(links={'landing_page': 'http://other.page'}) == []
+    assert payload.metapayload is before
+
+    patch = payload.apply_changes(source=dict(payload['source'], name='renamed'))
+    assert patch == []  # Citrine does not use the source name
+
+    patch = payload.apply_changes(data_contributors=payload['data_contributors'] + [make_person(5)])
+    assert patch == [{
+        'op': 'add', 'path': '/contacts/4',
+        'value': {'tags': ['contributor'], 'name': {'title': '', 'given': 'Given5', 'family': 'Family5'}, 'email': 'p5@a.org'},
+    }]
+    # untouched sections are shared with the previous document
+    assert payload.metapayload['references'] is before['references']
+    assert payload.metapayload['licenses'] is before['licenses']
+
+
+def test_nested_input_dependencies(make_full_record):
+    mc = MCPayload(**make_full_record())
+    mdf = MDFPayload(**make_full_record())
+    mc.metapayload, mdf.metapayload
+    patches = incremental.update([mc, mdf], {'source': dict(make_full_record()['source'], url='http://elsewhere')})
+    # neither service emits the source URL
+    assert patches == {'materials_commons': [], 'materials_data_facility': []}
+    patches = incremental.update([mc, mdf], {'source': {'name': 'renamed'}})
+    assert patches['materials_commons'] == [{'op': 'replace', 'path': '/name', 'value': 'renamed'}]
+    assert {'op': 'replace', 'path': '/mdf/source_name', 'value': 'renamed'} in patches['materials_data_facility']
+
+
+def test_changes_before_emission_return_none(make_full_record):
+    payload = MDFPayload(**make_full_record())
+    assert payload.apply_changes(title='new') is None
+    assert payload.metapayload['mdf']['title'] == 'new'
+
+
+def test_update_keeps_dict_semantics(make_full_record):
+    payload = MDFPayload(**make_full_record())
+    before = payload.metapayload
+    assert payload.update([('title', 'new')], description='changed') is None
+    assert payload['title'] == 'new'
+    assert payload.metapayload['mdf']['title'] == 'new'
+    # only the affected sections were re-emitted
+    assert payload.metapayload['mdf']['data_contributor'] is before['mdf']['data_contributor']
+    payload |= {'title': 'newer'}
+    assert payload.metapayload['mdf']['title'] == 'newer'
+    assert payload.cache_info().misses == 1
+
+
+def test_failed_reemission_leaves_no_stale_cache(make_full_record):
+    payload = MCPayload(**make_full_record())
+    payload.metapayload
+    with pytest.raises(TypeError):
+        payload.apply_changes(source='not a mapping')
+    assert payload.cache_info().size == 0
+
+
+def test_pointer_escaping_and_diff():
+    assert pointer(['a/b', 'c~d', 0]) == '/a~1b/c~0d/0'
+    old = {'a': [1, 2, 3], 'b': {'c': True}, 'gone': 1}
+    new = {'a': [1, 5], 'b': {'c': 1}, 'new/key': None}
+    patch = diff(old, new)
+    assert patch == [
+        {'op': 'remove', 'path': '/gone'},
+        {'op': 'replace', 'path': '/a/1', 'value': 5},
+        {'op': 'remove', 'path': '/a/2'},
+        {'op': 'replace', 'path': '/b/c', 'value': 1},
+        {'op': 'add', 'path': '/new~1key', 'value': None},
+    ]
+    assert apply_patch(old, patch) == new
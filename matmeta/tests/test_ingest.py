@@ -0,0 +1,132 @@
+import contextlib
+import socketserver
+import threading
+
+import pytest
+
+from matmeta import payload_metaclass as pm
+from matmeta.ingest import Endpoint, ingest
+from matmeta.stub_server import DROP, StubServer
+
+
+@contextlib.contextmanager
+def _raw_server(response):
+    """
+    A server that answers every request with the bytes response.
+    """
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            length = 0
+            for line in iter(self.rfile.readline, b'\r\n'):
+                name, _, value = line.partition(b':')
+                if name.strip().lower() == b'content-length':
+                    length = int(value)
+            self.rfile.read(length)
+            self.wfile.write(response)
+
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def server():
+    with StubServer() as server:
+        yield server
+
+
+def test_payload_ingest(server, make_record):
+    payload = pm.CITPayload(**make_record())
+    result = payload.ingest(server.url + '/citrine')
+    assert result.ok
+    assert (result.index, result.service, result.status, result.attempts) == (0, 'citrine', 200, 1)
+    assert result.response == {'received': 1}
+    assert server.requests[0].path == '/citrine'
+    assert server.requests[0].body == payload.metapayload
+
+
+def test_many_payloads_share_pooled_connections(server, make_record):
+    payloads = [pm.MDFPayload(**make_record(i)) for i in range(50)]
+    results = ingest(payloads, {'materials_data_facility': server.url}, concurrency=4)
+    assert [result.index for result in results] == list(range(50))
+    assert all(result.ok for result in results)
+    assert sorted(request.body['mdf']['title'] for request in server.requests) == sorted(
+        'title %d' % i for i in range(50)
+    )
+    assert server.connection_count <= 4
+
+
+def test_retries_with_backoff(server, make_record):
+    server.fail(2, status=503)
+    result = pm.MCPayload(**make_record()).ingest(server.url, retries=3, backoff=0.001)
+    assert result.ok and result.attempts == 3
+
+
+def test_dropped_connections_are_retried(server, make_record):
+    server.fail(1, status=DROP)
+    result = pm.MCPayload(**make_record()).ingest(server.url, retries=1, backoff=0.001)
+    assert result.ok and result.attempts == 2
+
+
+def test_failures_are_reported_per_record(server):
+    server.fail(3, status=503)
+    results = ingest(
+        [('materials_commons', {'name': 'a'}), ('citrine', {'name': 'b'})],
+        {'materials_commons': server.url},
+        retries=2, backoff=0.001,
+    )
+    assert not results[0].ok
+    assert (results[0].status, results[0].error, results[0].attempts) == (503, 'HTTP 503', 3)
+    assert results[0].response == {'error': 'injected failure'}
+    assert results[1].error == "no endpoint for service 'citrine'"
+    assert server.requests == []
+
+
+def test_client_errors_are_not_retried(server, make_record):
+    server.fail(1, status=400)
+    result = pm.MCPayload(**make_record()).ingest(server.url, retries=3, backoff=0.001)
+    assert (result.ok, result.status, result.attempts) == (False, 400, 1)
+
+
+def test_grouped_requests(server):
+    items = [('materials_commons', {'name': str(i)}) for i in range(25)]
+    results = ingest(items, {'materials_commons': Endpoint(server.url, batch_size=10)})
+    assert all(result.ok for result in results)
+    assert sorted(len(request.body) for request in server.requests) == [5, 10, 10]
+    assert server.payload_count == 25
+
+
+def test_unreachable_endpoint(make_record):
+    with StubServer() as server:
+        url = server.url
+    result = pm.MCPayload(**make_record()).ingest(url, retries=1, backoff=0.001)
+    assert not result.ok
+    assert result.status is None and result.attempts == 2
+
+
+def test_endpoint_url_must_be_http():
+    with pytest.raises(ValueError):
+        Endpoint('ftp://example.org')
+
+
+@pytest.mark.parametrize('response, error', [
+    (b'HTTP/1.1 200 OK\r\nContent-Length: twelve\r\n\r\n{}', "bad Content-Length 'twelve'"),
+    (b'HTTP/1.1 200 OK\r\nContent-Length: -2\r\n\r\n{}', "bad Content-Length '-2'"),
+    (b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n{}\r\n0\r\n\r\n',
+     "bad chunk size b'zz\\r\\n'"),
+])
+def test_malformed_lengths_fail_the_record(response, error):
+    with _raw_server(response) as url:
+        results = ingest(
+            [('materials_commons', {'name': 'a'}), ('materials_commons', {'name': 'b'})],
+            {'materials_commons': url}, retries=1, backoff=0.001,
+        )
+    assert [result.ok for result in results] == [False, False]
+    assert results[0].error == 'HTTPProtocolError: %s' % error
+    assert results[0].attempts == 2
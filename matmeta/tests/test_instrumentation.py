@@ -0,0 +1,110 @@
+import json
+import tracemalloc
+
+import pytest
+
+import matmeta
+from matmeta import citrine, instrumentation, validation
+from matmeta.cli import main
+from matmeta.instrumentation import Stats, instrumented
+from matmeta.memprofile import MemoryProfile
+from matmeta.parallel import emit_parallel
+from matmeta.payload_metaclass import CITPayload
+
+
+def test_disabled_stages_are_the_functions_themselves():
+    unique_people = citrine.unique_people
+    validate = validation.CompiledValidator.__dict__['validate']
+    with instrumented():
+        assert citrine.unique_people is not unique_people
+        assert citrine.unique_people.__wrapped__ is unique_people
+        assert validation.CompiledValidator.__dict__['validate'] is not validate
+    assert citrine.unique_people is unique_people
+    assert validation.CompiledValidator.__dict__['validate'] is validate
+    assert instrumentation.active() is None
+
+
+def test_only_calls_through_the_module_are_recorded(make_record):
+    from matmeta.batch import emit_record
+    with instrumented() as stats:
+        emit_record(make_record(0))
+        assert stats.get('record').calls == 0
+        matmeta.batch.emit_record(make_record(0))
+        assert stats.get('record').calls == 1
+        # matmeta's own callers go through the module
+        with MemoryProfile() as profile:
+            profile.emit_record(make_record(0), ['citrine'])
+        assert stats.get('record').calls == 2
+
+
+def test_stages_are_counted_and_timed(make_full_record):
+    calls = []
+    with instrumented(callback=lambda *args: calls.append(args)) as stats:
+        results = list(matmeta.emit_stream([make_full_record(i) for i in range(3)]))
+    assert all(result.ok for result in results)
+    assert stats.get('record').calls == 3
+    assert stats.get('validate').calls == 3
+    assert stats.get('emit').calls == 9  # one per service
+    assert stats.get('citrine.people').calls == 3
+    assert stats.get('citrine.reference').calls == 3
+    assert stats.get('citation_string').calls == 3
+    assert stats.get('record').seconds >= stats.get('emit').seconds > 0
+    assert stats.get('pif.dumps') == (0, 0.0, 0)
+    assert len(calls) == sum(stage['calls'] for stage in stats.as_dict().values())
+    assert 'citrine.reference' in instrumentation.stages()
+    # nothing is recorded after disabling
+    list(matmeta.emit_stream([make_full_record(0)]))
+    assert stats.get('record').calls == 3
+
+
+def test_reference_path_stages(make_full_record):
+    pytest.importorskip('pypif')
+    with instrumented() as stats:
+        CITPayload(**make_full_record(0)).reference_metapayload
+    for name in ('pif.add_people', 'pif.add_citations', 'pif.dumps'):
+        assert stats.get(name).calls == 1
+
+
+def test_memory_measurement(make_full_record):
+    assert not tracemalloc.is_tracing()
+    with instrumented(memory=True) as stats:
+        assert tracemalloc.is_tracing()
+        kept = [matmeta.emit_all(make_full_record(i)) for i in range(3)]
+    assert not tracemalloc.is_tracing()
+    assert stats.get('emit').allocated > 0
+    assert stats.get('validate').allocated < stats.get('emit').allocated
+    del kept
+
+
+def test_summary_merge_and_json():
+    stats = Stats()
+    stats.record('a', 0.5, 1024)
+    stats.record('b', 1.5)
+    other = Stats()
+    other.merge(json.loads(json.dumps(stats.as_dict())))
+    other.merge(stats.as_dict())
+    assert other.get('a') == (2, 1.0, 2048)
+    lines = other.summary().splitlines()
+    assert lines[0].split()[0] == 'stage'
+    assert [line.split()[0] for line in lines[1:]] == ['b', 'a']
+
+
+def test_parallel_workers_report_stages(make_full_record):
+    records = [make_full_record(i) for i in range(7)]
+    with instrumented() as stats:
+        results = list(emit_parallel(records, workers=2, chunk_size=2))
+    assert len(results) == 7
+    assert stats.get('record').calls == 7
+    assert stats.get('citrine.reference').calls == 7
+
+
+def test_cli_stats(tmpdir, capsys, make_full_record):
+    source = tmpdir.join('catalog.jsonl')
+    source.write(''.join(json.dumps(make_full_record(i)) + '\n' for i in range(2)))
+    stats_path = tmpdir.join('stats.json')
+    assert main([
+        'emit', str(source), '-o', str(tmpdir), '--stats', '--stats-json', str(stats_path)
+    ]) == 0
+    assert 'citrine.reference' in capsys.readouterr().err
+    assert json.loads(stats_path.read())['record']['calls'] == 2
+    assert instrumentation.active() is None
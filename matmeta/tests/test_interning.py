@@ -0,0 +1,144 @@
+import copy
+import json
+
+import pytest
+
+import matmeta
+from matmeta.cli import main
+from matmeta.interning import Interned, Interner, converted
+from matmeta.parallel import emit_parallel
+from matmeta.payload_metaclass import CITPayload, MDFPayload
+
+
+@pytest.fixture
+def make_repeating_record(make_record, make_person):
+    """
+    Records that repeat people, licenses and citations.
+    """
+    def build(index):
+        return make_record(
+            index,
+            source={'name': 'source', 'producer': 'producer', 'tags': ['a']},
+            data_contacts=[make_person(0)],
+            data_contributors=[make_person(1), make_person(index % 3 + 2)],
+            authors=[make_person(0), make_person(9, orcid='0000-0009')],
+            licenses=[{'name': 'CC-BY', 'url': 'http://cc.org'}, 'not a license'],
+            citations=[
+                {'title': 'Ref', 'year': '2001', 'journal': 'J', 'authors': [make_person(0), make_person(4)]},
+                {'title': 'Ref %d' % (index % 2), 'url': 'http://ref.org'},
+            ],
+        )
+    return build
+
+
+def _dumps(results):
+    return [json.dumps([result.payloads, result.errors]) for result in results]
+
+
+@pytest.mark.filterwarnings('ignore:Skipping invalid license')
+def test_interned_output_is_identical(make_repeating_record):
+    records = [make_repeating_record(i) for i in range(6)]
+    records.append({'title': 'invalid', 'authors': 'not a list'})
+    interner = Interner()
+    plain = _dumps(matmeta.emit_stream(copy.deepcopy(records)))
+    interned = _dumps(matmeta.emit_stream(records, interner=interner))
+    assert interned == plain
+    # the records themselves are not modified
+    assert records[:6] == [make_repeating_record(i) for i in range(6)]
+    assert not any(isinstance(person, Interned) for person in records[0]['authors'])
+
+
+def test_repeated_objects_are_shared(make_person, make_repeating_record):
+    interner = Interner()
+    first = interner.intern_record(make_repeating_record(0))
+    second = interner.intern_record(make_repeating_record(1))
+    assert first['authors'][0] is second['authors'][0] is first['data_contacts'][0]
+    assert first['licenses'][0] is second['licenses'][0]
+    assert first['citations'][0] is second['citations'][0]
+    assert first['citations'][0]['authors'][0] is first['authors'][0]
+    assert first['citations'][1] is not second['citations'][1]
+    # key order is part of an object's identity, since it shows in the output
+    reordered = dict(reversed(list(make_person(0).items())))
+    assert interner.intern(reordered) is not first['authors'][0]
+    unhashable = {'name': 'x', 'tags': set()}
+    assert interner.intern(unhashable) is unhashable
+    assert interner.info().size == len(interner._table)
+    interner.clear()
+    assert interner.info() == (0, 0, 0)
+
+
+def test_interned_objects_are_immutable(make_person):
+    person = Interner().intern(make_person(0))
+    with pytest.raises(TypeError):
+        person['email'] = 'other@a.org'
+    assert json.loads(json.dumps(person)) == make_person(0)
+
+
+@pytest.mark.filterwarnings('ignore:Skipping invalid license')
+def test_conversions_are_cached_and_shared(make_person, make_repeating_record):
+    interner = Interner()
+    calls = []
+
+    def convert(obj):
+        calls.append(obj)
+        return {'converted': dict(obj)}
+
+    person = interner.intern(make_person(0))
+    first = converted(person, 'test', convert)
+    assert converted(interner.intern(make_person(0)), 'test', convert) is first
+    assert len(calls) == 1
+    # plain objects are converted every time
+    converted(make_person(0), 'test', convert)
+    converted(make_person(0), 'test', convert)
+    assert len(calls) == 3
+
+    outputs = [
+        matmeta.emit_all(interner.intern_record(make_repeating_record(i)), services=['citrine', 'materials_data_facility'])
+        for i in range(2)
+    ]
+    citrine = [output['citrine'] for output in outputs]
+    mdf = [output['materials_data_facility']['mdf'] for output in outputs]
+    assert citrine[0]['references'][0] is citrine[1]['references'][0]
+    assert citrine[0]['licenses'][0] is citrine[1]['licenses'][0]
+    assert citrine[0]['contacts'][0]['name'] is citrine[1]['contacts'][0]['name']
+    assert mdf[0]['citation'][0] is mdf[1]['citation'][0]
+    assert mdf[0]['data_contributor'][0] is mdf[1]['data_contributor'][0]
+
+
+@pytest.mark.filterwarnings('ignore:Skipping invalid license')
+def test_reference_metapayload_does_not_modify_citations(make_repeating_record):
+    pytest.importorskip('pypif')
+    record = make_repeating_record(0)
+    original = copy.deepcopy(record)
+    payload = CITPayload(**record)
+    # the record repeats people, whom the reference merges differently
+    references = payload.metapayload['references']
+    assert payload.reference_metapayload['references'] == references
+    assert record == original
+    # interned inputs are immutable, and give the same output
+    interned = CITPayload(**Interner().intern_record(record))
+    assert interned.reference_metapayload['references'] == references
+
+
+def test_mdf_payload_accepts_interned_inputs(make_repeating_record):
+    record = make_repeating_record(0)
+    payload = MDFPayload(**Interner().intern_record(record))
+    assert json.dumps(payload.metapayload) == json.dumps(MDFPayload(**record).metapayload)
+
+
+@pytest.mark.filterwarnings('ignore:Skipping invalid license')
+def test_parallel_and_cli_interning(tmpdir, make_repeating_record):
+    records = [make_repeating_record(i) for i in range(8)]
+    expected = _dumps(matmeta.emit_stream(records))
+    results = emit_parallel(records, workers=2, chunk_size=3, intern=True)
+    assert _dumps(results) == expected
+
+    path = tmpdir.join('catalog.jsonl')
+    path.write(''.join(json.dumps(record) + '\n' for record in records))
+    for options in ([], ['--intern']):
+        output_dir = tmpdir.join('intern' if options else 'plain')
+        assert main(['emit', str(path), '-o', str(output_dir), '-s', 'citrine'] + options) == 0
+    assert (
+        tmpdir.join('plain', 'catalog.citrine.jsonl').read()
+        == tmpdir.join('intern', 'catalog.citrine.jsonl').read()
+    )
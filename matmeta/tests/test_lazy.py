@@ -0,0 +1,64 @@
+import subprocess
+import sys
+
+
+def _imported_after(code):
+    output = subprocess.check_output([
+        sys.executable, '-c',
+        code + '\nimport sys\n'
+        'print(" ".join(sorted(m for m in sys.modules if m.startswith(("pypif", "matmeta")))))'
+    ], universal_newlines=True)
+    return set(output.split())
+
+
+def test_import_does_not_load_pypif():
+    modules = _imported_after('import matmeta, matmeta.payload_metaclass')
+    assert not any(module.startswith('pypif') for module in modules)
+    assert 'matmeta.citrine' not in modules
+    assert 'matmeta.batch' not in modules
+
+
+def test_emission_loads_only_what_it_needs():
+    modules = _imported_after(
+        'import matmeta\n'
+        'list(matmeta.emit_stream([{"description": "d", "source": {"name": "n"}}],'
+        ' services=["materials_commons", "citrine"]))'
+    )
+    assert 'matmeta.batch' in modules and 'matmeta.citrine' in modules
+    assert not any(module.startswith('pypif') for module in modules)
+
+
+def test_reference_path_imports_pypif():
+    modules = _imported_after(
+        'from matmeta.payload_metaclass import CITPayload\n'
+        'CITPayload().reference_metapayload'
+    )
+    assert 'pypif.pif' in modules
+
+
+def test_lazy_module_imports_on_first_attribute_access():
+    from matmeta.lazy import LazyModule
+    module = LazyModule('json')
+    assert module._lazy_module is None
+    assert module.dumps([1]) == '[1]'
+    assert module._lazy_module is sys.modules['json']
+
+
+def test_package_attributes_are_lazy():
+    import matmeta
+    from matmeta.batch import emit_stream
+    assert matmeta.emit_stream is emit_stream
+    assert 'emit_stream' in dir(matmeta)
+    try:
+        matmeta.no_such_attribute
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('expected AttributeError')
+
+
+def test_submodule_attribute_is_the_module():
+    import matmeta
+    import matmeta.ingest
+    assert matmeta.ingest is sys.modules['matmeta.ingest']
+    assert 'ingest' not in matmeta.__all__
@@ -0,0 +1,125 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+
+import matmeta
+from matmeta import serializers
+from matmeta.batch import OversizedRecord, read_jsonl
+from matmeta.cli import main
+from matmeta.memprofile import MemoryProfile, RecordMemory
+from matmeta.offsets import IndexedJSONL
+from matmeta.parallel import emit_parallel
+
+
+def _records(make_record):
+    records = [make_record(i) for i in range(4)]
+    records[2] = make_record(2, people=2000)
+    del records[3]['title']  # fails for MDF
+    return records
+
+
+def test_profile_finds_the_giant_record(make_record):
+    records = _records(make_record)
+    expected = list(matmeta.emit_stream(records, id_key='links.landing_page'))
+    found = []
+    with MemoryProfile(peak_threshold=256 * 1024, keep=3, callback=found.append) as profile:
+        results = list(matmeta.emit_stream(records, id_key='links.landing_page', profile=profile))
+    assert not tracemalloc.is_tracing()
+    assert results == expected
+    # the Materials Commons payload does not grow with the people
+    assert {(entry.record_id, entry.service) for entry in profile.outliers} == {
+        ('http://landing.page/2', 'citrine'),
+        ('http://landing.page/2', 'materials_data_facility'),
+    }
+    assert found == profile.outliers
+    largest = profile.largest
+    assert len(largest) == 3
+    assert largest[0].index == 2 and largest[0].peak >= largest[1].peak >= largest[2].peak
+    mdf = profile.service('materials_data_facility')
+    assert mdf.records == 4
+    assert mdf.max_size == len(serializers.dumps(
+        results[2].payloads['materials_data_facility'], sort_keys=False
+    ))
+    assert 'http://landing.page/2' in profile.summary()
+
+    with MemoryProfile(keep=12) as profile:
+        list(matmeta.emit_stream(records, profile=profile))
+    sizes = {(entry.index, entry.service): entry.size for entry in profile.largest}
+    assert len(sizes) == 12
+    assert sizes[3, 'materials_data_facility'] is None
+    assert sizes[3, 'citrine'] > 0
+
+
+def test_size_threshold_and_failures():
+    profile = MemoryProfile(size_threshold=1000)
+    profile.add(RecordMemory(0, 'a', 'citrine', 10, 2000))
+    profile.add(RecordMemory(1, 'b', 'citrine', 20, None))
+    profile.add(RecordMemory(2, 'c', 'citrine', 30, 500))
+    assert [entry.record_id for entry in profile.outliers] == ['a']
+    assert [entry.record_id for entry in profile.largest] == ['c', 'b', 'a']
+    assert profile.service('citrine') == (3, 60, 30, 2500, 2000)
+    assert profile.service('other').records == 0
+    assert json.loads(json.dumps(profile.as_dict()))['services']['citrine']['max_size'] == 2000
+
+
+def test_profile_needs_tracemalloc(make_record):
+    with pytest.raises(RuntimeError):
+        list(matmeta.emit_stream([make_record(0)], profile=MemoryProfile()))
+
+
+def test_parallel_profile(make_record):
+    records = _records(make_record)
+    found = []
+    with MemoryProfile(peak_threshold=256 * 1024, callback=found.append) as profile:
+        results = list(emit_parallel(records, workers=2, chunk_size=1, profile=profile))
+    assert all(result.payloads for result in results)
+    assert profile.service('citrine').records == 4
+    assert {entry.index for entry in found} == {2}
+    assert found == profile.outliers
+
+
+def test_oversized_records_are_not_parsed(make_record):
+    lines = [json.dumps(make_record(0)), '', json.dumps(make_record(1, people=50)), json.dumps(make_record(2))]
+    quarantine = io.StringIO()
+    records = list(read_jsonl(io.StringIO('\n'.join(lines)), max_size=2000, quarantine=quarantine))
+    assert records[1] == OversizedRecord(line=3, size=len(lines[2]), limit=2000)
+    assert quarantine.getvalue() == lines[2] + '\n'
+    results = list(matmeta.emit_stream(records))
+    assert [result.ok for result in results] == [True, False, True]
+    assert results[1].errors[0]['service'] is None
+    assert 'over the limit of 2000' in results[1].errors[0]['error']
+
+
+def test_oversized_records_by_offset(tmpdir, make_record):
+    lines = [json.dumps(make_record(0)), '', json.dumps(make_record(1, people=50))]
+    source = tmpdir.join('catalog.jsonl')
+    source.write('\n'.join(lines) + '\n')
+    quarantine = io.StringIO()
+    with IndexedJSONL(str(source)) as reader:
+        records = list(reader.records([0, 1], max_size=2000, quarantine=quarantine))
+    assert records[0] == make_record(0)
+    assert records[1] == OversizedRecord(line=3, size=len(lines[2]), limit=2000)
+    assert quarantine.getvalue() == lines[2] + '\n'
+
+
+def test_cli_memory_profile_and_quarantine(tmpdir, capsys, make_record):
+    source = tmpdir.join('catalog.jsonl')
+    source.write(''.join(json.dumps(record) + '\n' for record in _records(make_record)))
+    report = tmpdir.join('memory.json')
+    quarantine = tmpdir.join('quarantine.jsonl')
+    assert main([
+        'emit', str(source), '-o', str(tmpdir), '--id-key', 'links.landing_page',
+        '--memory-profile', str(report), '--memory-threshold', '0.25'
+    ]) == 0
+    assert 'outliers:' in capsys.readouterr().err
+    profile = json.loads(report.read())
+    assert {entry['record_id'] for entry in profile['outliers']} == {'http://landing.page/2'}
+    assert main([
+        'emit', str(source), '-o', str(tmpdir), '--max-record-size', '5000',
+        '--quarantine', str(quarantine)
+    ]) == 0
+    assert [json.loads(line) for line in quarantine.readlines()] == [_records(make_record)[2]]
+    errors = [json.loads(line) for line in tmpdir.join('catalog.errors.jsonl').readlines()]
+    assert [error['index'] for error in errors] == [2, 3]
@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+import matmeta
+from matmeta.batch import InvalidRecord, read_jsonl
+from matmeta.cli import main
+from matmeta.offsets import IndexedJSONL
+from matmeta.parallel import emit_parallel
+
+
+@pytest.fixture
+def catalog(tmpdir, make_record):
+    lines = [json.dumps(make_record(i)) for i in range(5)]
+    lines.insert(2, '')
+    lines.insert(3, '{not json')
+    lines.append(json.dumps(make_record(5, links={'landing_page': ['a', 'list']})))
+    lines.append(json.dumps(make_record(6, links={})))
+    lines.append(json.dumps(make_record(7, links={'landing_page': 'http://landing.page/1'})))
+    source = tmpdir.join('catalog.jsonl')
+    source.write('\n'.join(lines))  # no final line break
+    return str(source)
+
+
+def test_records_match_read_jsonl(catalog, make_record):
+    path = catalog
+    with open(path) as fp:
+        expected = list(read_jsonl(fp))
+    with IndexedJSONL(path) as reader:
+        assert len(reader) == len(expected) == 9
+        assert list(reader.records(range(len(reader)))) == expected
+        assert reader[4] == expected[4]
+        assert reader.read(2) == InvalidRecord(line=4, error=expected[2].error)
+        assert reader.line(8) == json.dumps(make_record(7, links={'landing_page': 'http://landing.page/1'})).encode()
+        with pytest.raises(KeyError):
+            reader.index_of(9)
+
+
+def test_lookup_by_id(catalog):
+    path = catalog
+    with IndexedJSONL(path, id_key='links.landing_page') as reader:
+        assert reader['http://landing.page/3']['title'] == 'title 3'
+        # the last record with an id wins
+        assert reader.index_of('http://landing.page/1') == 8
+        # records without a usable id are found by index
+        assert reader.index_of(6) == 6 and reader.index_of(7) == 7
+        assert reader.index_of(2) == 2  # invalid JSON
+        assert 0 not in reader
+        assert 'http://landing.page/99' not in reader
+        indexes, missing = reader.select(
+            ['http://landing.page/4', 7, 'missing', 'http://landing.page/0', 7, ['x']]
+        )
+        assert indexes == [0, 5, 7]
+        assert missing == ['missing', ['x']]
+
+
+def test_sidecar_is_reused_and_rebuilt(catalog, make_record):
+    path = catalog
+    IndexedJSONL(path, id_key='links.landing_page').close()
+    assert os.path.exists(path + '.idx')
+    with open(path + '.idx') as fp:
+        saved = json.load(fp)
+    saved['offsets'][0] = 1  # the saved index is used as is when current
+    with open(path + '.idx', 'w') as fp:
+        json.dump(saved, fp)
+    with IndexedJSONL(path, id_key='links.landing_page') as reader:
+        assert reader.line(0).startswith(b'"title"')
+    # a different id_key, or a changed file, rebuilds it
+    with IndexedJSONL(path) as reader:
+        assert reader.line(0).startswith(b'{')
+    with open(path, 'a') as fp:
+        fp.write('\n' + json.dumps(make_record(9)) + '\n')
+    with IndexedJSONL(path, id_key='links.landing_page') as reader:
+        assert reader.line(0).startswith(b'{')
+        assert reader['http://landing.page/9']['title'] == 'title 9'
+        assert len(reader) == 10
+
+
+def test_empty_file(tmpdir):
+    source = tmpdir.join('empty.jsonl')
+    source.write('')
+    with IndexedJSONL(str(source), id_key='id') as reader:
+        assert len(reader) == 0
+        assert reader.select(['x']) == ([], ['x'])
+
+
+def test_emit_selected_records(catalog):
+    path = catalog
+    with open(path) as fp:
+        full = list(matmeta.emit_stream(read_jsonl(fp), id_key='links.landing_page'))
+    with IndexedJSONL(path, id_key='links.landing_page') as reader:
+        indexes, _ = reader.select(['http://landing.page/3', 2, 6])
+        selected = list(matmeta.emit_stream(
+            reader.records(indexes), id_key='links.landing_page', indexes=indexes
+        ))
+        assert indexes == [2, 4, 6]
+        assert selected == [full[2], full[4], full[6]]
+        parallel = list(emit_parallel(
+            reader.records(indexes), id_key='links.landing_page', indexes=indexes,
+            workers=2, chunk_size=2
+        ))
+        assert parallel == selected
+
+
+def test_cli_ids(catalog, tmpdir, capsys):
+    path = catalog
+    assert main(['emit', path, '-o', str(tmpdir), '--id-key', 'links.landing_page']) == 0
+    errors = tmpdir.join('catalog.errors.jsonl')
+    failed = [json.loads(line)['id'] for line in errors.readlines()]
+    assert failed == [2, 7]  # invalid JSON, and no landing page for MDF
+    ids = tmpdir.join('ids.txt')
+    ids.write(errors.read() + 'http://landing.page/4\n"missing"\n')
+    capsys.readouterr()
+    assert main([
+        'emit', path, '-o', str(tmpdir), '-p', 'retry', '--id-key', 'links.landing_page',
+        '--ids', str(ids), '-s', 'citrine'
+    ]) == 0
+    assert 'records with errors: 2' in capsys.readouterr().err
+    payloads = tmpdir.join('retry.citrine.jsonl').readlines()
+    assert len(payloads) == 2
+    reports = [json.loads(line) for line in tmpdir.join('retry.errors.jsonl').readlines()]
+    assert [report['id'] for report in reports] == ['missing', 2]
+    assert main(['emit', '--ids', str(ids)]) == 2
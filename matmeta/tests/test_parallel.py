@@ -0,0 +1,47 @@
+import os
+
+import matmeta
+from matmeta.parallel import emit_parallel
+
+
+def test_parallel_matches_serial_and_keeps_order(make_record):
+    records = [make_record(i) for i in range(25)]
+    records[7] = {'title': 'incomplete'}
+    serial = list(matmeta.emit_stream(records, id_key='links.landing_page'))
+    parallel = list(emit_parallel(
+        records, id_key='links.landing_page', workers=2, chunk_size=4
+    ))
+    assert [result.index for result in parallel] == list(range(25))
+    assert parallel == serial
+    assert not parallel[7].ok
+    assert parallel[8].record_id == 'http://landing.page/8'
+
+
+def test_chunk_failures_become_record_errors(make_record):
+    # a generator cannot be pickled, so the whole chunk fails to submit
+    records = [make_record(0), {'title': (i for i in range(3))}, make_record(2)]
+    results = list(emit_parallel(records, workers=1, chunk_size=2))
+    assert [result.index for result in results] == [0, 1, 2]
+    assert not results[0].ok and not results[1].ok
+    assert results[2].ok
+
+
+class _Crash(object):
+    # kills the worker process that unpickles it
+    def __reduce__(self):
+        return (os._exit, (1,))
+
+
+def test_crashed_workers_fail_only_their_own_chunk(make_record):
+    records = [make_record(i) for i in range(16)]
+    records[5] = make_record(5, title=_Crash())
+    records[12] = make_record(12, title=_Crash())
+    results = list(emit_parallel(records, workers=2, chunk_size=2, max_pending=4))
+    assert [result.index for result in results] == list(range(16))
+    failed = [result.index for result in results if not result.ok]
+    assert failed == [4, 5, 12, 13]
+    assert 'BrokenProcessPool' in results[5].errors[0]['error']
+    serial = list(matmeta.emit_stream(records[:4] + records[6:12] + records[14:]))
+    assert [result.payloads for result in results if result.ok] == [
+        result.payloads for result in serial
+    ]
@@ -0,0 +1,82 @@
+import json
+import pickle
+
+import pytest
+
+from matmeta.payload_metaclass import CITPayload, MCPayload, MDFPayload
+
+
+@pytest.mark.parametrize('payload_class', [CITPayload, MDFPayload, MCPayload])
+def test_metapayload_is_cached(payload_class, make_record):
+    payload = payload_class(**make_record())
+    first = payload.metapayload
+    assert payload.metapayload is first
+    info = payload.cache_info()
+    assert (info.hits, info.misses, info.size) == (1, 1, 1)
+
+
+def test_metapayload_is_frozen_unless_asked(make_record):
+    payload = MDFPayload(**make_record())
+    with pytest.raises(TypeError):
+        payload.metapayload['mdf']['title'] = 'changed'
+    with pytest.raises(TypeError):
+        payload.metapayload['mdf']['data_contact'].append({})
+    copy = payload.emit(mutable=True)
+    copy['mdf']['title'] = 'changed'
+    assert payload.metapayload['mdf']['title'] == 'title 0'
+    assert json.loads(json.dumps(payload.metapayload)) == payload.metapayload
+    assert pickle.loads(pickle.dumps(payload.metapayload)) == payload.metapayload
+
+
+def test_frozen_output_does_not_alias_inputs(make_record):
+    kwargs = make_record()
+    payload = MDFPayload(**kwargs)
+    payload.metapayload
+    kwargs['links']['landing_page'] = 'http://elsewhere'
+    assert payload.metapayload['mdf']['links'] == {'landing_page': 'http://landing.page/0'}
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda p: p.__setitem__('description', 'new'),
+    lambda p: setattr(p, 'description', 'new'),
+    lambda p: p.pop('description'),
+    lambda p: p.setdefault('tags', ['new']),
+    lambda p: p.clear(),
+])
+def test_mutation_invalidates(mutate, make_record):
+    payload = MCPayload(**make_record())
+    payload.metapayload
+    mutate(payload)
+    try:
+        payload.metapayload
+    except KeyError:
+        pass  # the mutation removed a required field
+    assert payload.cache_info().misses == 2
+
+
+def test_update_reemits_instead_of_invalidating(make_record):
+    payload = MCPayload(**make_record())
+    payload.metapayload
+    assert payload.apply_changes(description='new') == [
+        {'op': 'replace', 'path': '/description', 'value': 'new'}
+    ]
+    assert payload.metapayload == {'name': 'source', 'description': 'new'}
+    assert payload.cache_info().misses == 1
+
+
+def test_attribute_access_still_works(make_record):
+    payload = MCPayload(**make_record())
+    payload.description = 'via attribute'
+    assert payload['description'] == 'via attribute'
+    assert payload.metapayload['description'] == 'via attribute'
+    del payload.title
+    assert 'title' not in payload
+
+
+def test_nested_mutation_needs_invalidate(make_record):
+    payload = MCPayload(**make_record())
+    payload.metapayload
+    payload['source']['name'] = 'renamed'
+    assert payload.metapayload['name'] == 'source'
+    payload.invalidate()
+    assert payload.metapayload['name'] == 'renamed'
@@ -0,0 +1,82 @@
+import hashlib
+import json
+
+import pytest
+
+from matmeta import payload_metaclass as pm
+from matmeta import serializers
+from matmeta.cli import main
+
+
+@pytest.fixture
+def inputs(make_full_record, make_person):
+    # non-ASCII text, which the backends must not escape
+    return make_full_record(
+        title='Ångström-scale title',
+        data_contacts=[make_person(0, given_name='Jöns')],
+    )
+
+
+@pytest.mark.parametrize('cls', [pm.CITPayload, pm.MDFPayload, pm.MCPayload])
+@pytest.mark.parametrize('backend', serializers.available())
+def test_metapayload_bytes(cls, backend, inputs):
+    payload = cls(**inputs)
+    data = payload.metapayload_bytes(backend)
+    assert json.loads(data) == payload.metapayload
+    assert data == json.dumps(
+        payload.metapayload, sort_keys=True, separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8')
+    unsorted = payload.metapayload_bytes(backend, sort_keys=False)
+    assert list(json.loads(unsorted)) == list(payload.metapayload)
+
+
+def test_backends_agree_and_sorting_is_deterministic(inputs):
+    document = {'b': [1, {'z': None, 'y': 2.5}], 'a': 'é', 'c': True}
+    shuffled = {'c': True, 'a': 'é', 'b': [1, {'y': 2.5, 'z': None}]}
+    outputs = set()
+    for name in serializers.available():
+        outputs.add(serializers.dumps(document, name))
+        outputs.add(serializers.dumps(shuffled, name))
+    assert outputs == {'{"a":"é","b":[1,{"y":2.5,"z":null}],"c":true}'.encode('utf-8')}
+    first = pm.MDFPayload(**inputs)
+    second = pm.MDFPayload(**dict(reversed(list(inputs.items()))))
+    assert hashlib.sha256(first.metapayload_bytes()).digest() == \
+        hashlib.sha256(second.metapayload_bytes()).digest()
+
+
+def test_backend_selection():
+    assert serializers.available()[-1] == 'json'
+    assert serializers.default_backend() == serializers.available()[0]
+    with pytest.raises(ValueError):
+        serializers.dumps({}, 'nope')
+    calls = []
+
+    def encode(document, sort_keys):
+        calls.append(sort_keys)
+        return b'custom'
+
+    serializers.register('custom', encode, module='no_such_module_here')
+    try:
+        assert 'custom' not in serializers.available()
+        serializers.register('custom', encode)
+        assert 'custom' in serializers.available()
+        assert serializers.dumps({}, 'custom', sort_keys=False) == b'custom'
+        assert calls == [False]
+    finally:
+        del serializers._backends['custom']
+        serializers._default = None
+
+
+def test_orjson_backend():
+    pytest.importorskip('orjson')
+    assert serializers.default_backend() == 'orjson'
+    assert serializers.dumps({1: 'a', None: 'b'}, 'orjson', sort_keys=False) == \
+        serializers.dumps({1: 'a', None: 'b'}, 'json', sort_keys=False)
+
+
+def test_cli_serializer(tmpdir, inputs):
+    source = tmpdir.join('catalog.jsonl')
+    source.write(json.dumps(inputs) + '\n')
+    assert main(['emit', str(source), '-o', str(tmpdir), '-s', 'citrine', '--serializer', 'json']) == 0
+    expected = pm.CITPayload(**inputs).metapayload_bytes('json') + b'\n'
+    assert tmpdir.join('catalog.citrine.jsonl').read_binary() == expected
@@ -0,0 +1,122 @@
+import http.client
+import json
+
+import pytest
+
+from matmeta.batch import emit_record
+from matmeta.ingest import ingest
+from matmeta.server import ConversionServer, ServiceMetrics
+
+
+@pytest.fixture
+def server():
+    with ConversionServer(batch_size=8, max_wait=0.05, workers=1, processes=False) as server:
+        yield server
+
+
+def _request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read()), response.getheader('Connection')
+    finally:
+        connection.close()
+
+
+def _expected(record, services=None):
+    payloads, errors = emit_record(record, services)
+    return json.loads(json.dumps({'payloads': payloads, 'errors': errors}))
+
+
+def test_emit(server, make_record):
+    record = make_record()
+    status, document, _ = _request(server, 'POST', '/emit', json.dumps(record))
+    assert status == 200
+    assert document == _expected(record)
+    del record['title']
+    status, document, _ = _request(
+        server, 'POST', '/emit?services=citrine,materials_data_facility', json.dumps(record)
+    )
+    assert status == 200
+    assert set(document['payloads']) == {'citrine'}
+    assert document['errors'][0]['service'] == 'materials_data_facility'
+    assert document == _expected(record, ['citrine', 'materials_data_facility'])
+
+
+def test_bad_requests(server, make_record):
+    assert _request(server, 'POST', '/emit', '{not json')[0] == 400
+    assert _request(server, 'POST', '/emit', '[1, 2]')[0] == 400
+    status, document, _ = _request(server, 'POST', '/emit?services=nope', '{}')
+    assert status == 400 and 'nope' in document['error']
+    assert _request(server, 'GET', '/emit')[0] == 405
+    assert _request(server, 'GET', '/elsewhere')[0] == 404
+    assert _request(server, 'GET', '/health')[:2] == (200, {'ok': True})
+    small = ConversionServer(max_body=10, processes=False, workers=1)
+    with small:
+        assert _request(small, 'POST', '/emit', json.dumps(make_record()))[0] == 413
+
+
+@pytest.mark.parametrize('length, status', [
+    ('abc', 400), ('-1', 400), ('+2', 400), ('1_0', 400), (str(10 ** 12), 413),
+])
+def test_content_length_is_validated(server, length, status, make_record):
+    response = _request(server, 'POST', '/emit', json.dumps(make_record()), {'Content-Length': length})
+    assert response[0] == status
+    assert response[2] == 'close'
+
+
+def test_keep_alive_and_close(server, make_record):
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=10)
+    try:
+        for index in range(3):
+            connection.request('POST', '/emit', body=json.dumps(make_record(index)))
+            response = connection.getresponse()
+            assert response.getheader('Connection') == 'keep-alive'
+            assert json.loads(response.read())['payloads']['materials_data_facility']['mdf']['title'] == 'title %d' % index
+    finally:
+        connection.close()
+    assert _request(server, 'GET', '/health', headers={'Connection': 'close'})[2] == 'close'
+
+
+def test_concurrent_requests_are_batched(server, make_record):
+    records = [make_record(i) for i in range(40)]
+    results = ingest(
+        [('emit', record) for record in records],
+        {'emit': server.url + '/emit?services=citrine'}, concurrency=16
+    )
+    assert all(result.ok for result in results)
+    for record, result in zip(records, results):
+        assert result.response == _expected(record, ['citrine'])
+    status, metrics, _ = _request(server, 'GET', '/metrics')
+    assert status == 200
+    assert metrics['requests'] == 40 and metrics['failed'] == 0
+    assert 1 < metrics['largest_batch'] <= 8
+    assert metrics['batches'] < 40
+    assert metrics['latency_ms']['p50'] <= metrics['latency_ms']['p99'] <= metrics['latency_ms']['max']
+    assert metrics['requests_per_second'] > 0
+
+
+def test_worker_processes(make_record):
+    with ConversionServer(batch_size=4, workers=2) as server:
+        records = [make_record(i) for i in range(10)]
+        results = ingest(
+            [('emit', record) for record in records], {'emit': server.url + '/emit'}, concurrency=5
+        )
+        assert [result.response for result in results] == [_expected(record) for record in records]
+
+
+def test_metrics_snapshot():
+    metrics = ServiceMetrics(window=3)
+    snapshot = metrics.snapshot()
+    assert snapshot['requests'] == 0 and snapshot['latency_ms']['p50'] is None
+    for seconds in (0.004, 0.001, 0.002, 0.003):
+        metrics.record_request(seconds)
+    metrics.record_request(0.01, ok=False)
+    metrics.record_batch(2)
+    metrics.record_batch(4)
+    snapshot = metrics.snapshot()
+    assert (snapshot['requests'], snapshot['failed'], snapshot['mean_batch_size']) == (5, 1, 3.0)
+    # percentiles cover the last three requests
+    assert snapshot['latency_ms']['p50'] == pytest.approx(3.0)
+    assert snapshot['latency_ms']['max'] == pytest.approx(10.0)
@@ -0,0 +1,85 @@
+import pytest
+
+from matmeta.frozen import FrozenDict, FrozenList, freeze, thaw
+from matmeta.payload_metaclass import get_common_payload_template
+from matmeta.services import ServiceRegistry, merge_requirements, registry
+
+
+def test_merge_requirements_is_recursive():
+    base = {
+        'source': {'name': 'string'},
+        'data_contacts': [{'email': 'string'}],
+    }
+    extra = {
+        'source': {'url': 'string'},
+        'data_contacts': [{'given_name': 'string'}],
+        'title': 'string',
+    }
+    merged = merge_requirements(base, extra)
+    assert merged == {
+        'source': {'name': 'string', 'url': 'string'},
+        'data_contacts': [{'email': 'string', 'given_name': 'string'}],
+        'title': 'string',
+    }
+    assert base == {
+        'source': {'name': 'string'},
+        'data_contacts': [{'email': 'string'}],
+    }
+
+
+def test_requirements_are_cached_and_frozen():
+    first = registry.requirements(['materials_data_facility'])
+    second = registry.requirements(['materials_data_facility', 'unknown'])
+    assert first is second
+    assert isinstance(first, FrozenDict)
+    assert isinstance(first['data_contacts'], FrozenList)
+    with pytest.raises(TypeError):
+        first['title'] = 'changed'
+    with pytest.raises(TypeError):
+        first['data_contacts'].append({})
+
+
+def test_resolve_falls_back_to_all_services():
+    everything = frozenset(registry.services)
+    assert registry.resolve(None) == everything
+    assert registry.resolve(['nonexistent']) == everything
+    assert registry.resolve(['citrine']) == frozenset(['citrine'])
+
+
+def test_register_invalidates_cache():
+    local = ServiceRegistry()
+    local.register('a', lambda: {'source': {'name': 'string'}})
+    assert local.requirements() == {'source': {'name': 'string'}}
+    local.register('b', lambda: {'source': {'url': 'string'}})
+    assert local.requirements() == {'source': {'name': 'string', 'url': 'string'}}
+
+
+def test_template_is_shared_and_frozen():
+    template = get_common_payload_template(services=['materials_commons'])
+    assert template['required_fields'] == {
+        'source': {'name': 'string'},
+        'description': 'string',
+    }
+    assert get_common_payload_template(services=['materials_commons']) is template
+    with pytest.raises(TypeError):
+        template['required_fields']['title'] = 'string'
+
+
+def test_mutable_template_is_a_copy():
+    template = get_common_payload_template(services=['materials_commons'], mutable=True)
+    template['required_fields']['title'] = 'string'
+    template['all_fields']['source']['tags'].append('more')
+    fresh = get_common_payload_template(services=['materials_commons'], mutable=True)
+    assert 'title' not in fresh['required_fields']
+    assert fresh['all_fields']['source']['tags'] == ['string']
+    assert fresh == get_common_payload_template(services=['materials_commons'])
+
+
+def test_freeze_round_trip():
+    value = {'a': [1, {'b': (2, 3)}]}
+    frozen = freeze(value)
+    assert frozen == {'a': [1, {'b': [2, 3]}]}
+    assert freeze(frozen) is frozen
+    thawed = thaw(frozen)
+    assert type(thawed) is dict and type(thawed['a'][1]) is dict
+    thawed['a'].append(4)
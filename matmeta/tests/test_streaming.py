@@ -0,0 +1,100 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+
+from matmeta.payload_metaclass import CITPayload, MCPayload, MDFPayload
+from matmeta.streaming import dump, iterencode, lazy_document
+
+
+class _Sink(object):
+    """A file-like object that only counts what is written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, chunk):
+        self.size += len(chunk)
+
+
+@pytest.fixture
+def make_inputs(make_record, make_person):
+    def build(people=3, citations=2):
+        # non-ASCII names, so that encoding is checked
+        def person(index):
+            return make_person(index, given_name=u'G\xe9n%d' % index)
+        return make_record(
+            source={'name': 'source', 'producer': 'producer', 'tags': []},
+            data_contacts=[person(0)],
+            data_contributors=[person(i) for i in range(1, people + 1)],
+            authors=[person(0)],
+            licenses=[{'name': 'CC-BY'}, {'name': 'MIT', 'url': 'http://mit'}],
+            citations=[
+                {'title': 'Ref', 'year': '2001', 'journal': 'J', 'authors': [person(0)]}
+            ] * citations,
+        )
+    return build
+
+
+@pytest.mark.parametrize('payload_class', [CITPayload, MDFPayload, MCPayload])
+@pytest.mark.parametrize('sizes', [{}, {'people': 0, 'citations': 0}])
+def test_dump_is_byte_identical(payload_class, sizes, make_inputs):
+    inputs = make_inputs(**sizes)
+    fp = io.StringIO()
+    payload_class(**inputs).dump(fp, chunk_size=16)
+    assert fp.getvalue() == json.dumps(payload_class(**inputs).metapayload)
+
+
+def test_dump_uses_cached_metadata_and_encoding(make_inputs):
+    payload = MDFPayload(**make_inputs())
+    payload.metapayload
+    fp = io.BytesIO()
+    payload.dump(fp, encoding='utf-8')
+    assert fp.getvalue() == json.dumps(payload.metapayload).encode('utf-8')
+
+
+def test_iterencode_matches_json():
+    document = {
+        'a': iter([{'x': [1, 2.5, None]}, iter([True, u'☃'])]),
+        'b': (),
+        'c': {},
+        1: 'int key',
+        None: [iter([])],
+    }
+    expected = json.dumps({
+        'a': [{'x': [1, 2.5, None]}, [True, u'☃']], 'b': [], 'c': {}, 1: 'int key', None: [[]],
+    })
+    assert ''.join(iterencode(document, chunk_size=1)) == expected
+    with pytest.raises(TypeError):
+        list(iterencode({'a': b'bytes'}))
+
+
+def test_lazy_document_leaves_lists_unbuilt(make_inputs):
+    document = lazy_document(MDFPayload._sections(), make_inputs())
+    assert not isinstance(document['mdf']['data_contributor'], list)
+    assert not isinstance(document['mdf']['citation'], list)
+
+
+def _peak(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('payload_class', [MDFPayload, CITPayload])
+def test_streaming_peak_memory_is_bounded(payload_class, make_inputs):
+    small = payload_class(**make_inputs(people=300, citations=300))
+    large = payload_class(**make_inputs(people=3000, citations=3000))
+    # with a small chunk size both runs reach steady state
+    streamed_small = _peak(lambda: small.dump(_Sink(), chunk_size=4096))
+    streamed_large = _peak(lambda: large.dump(_Sink(), chunk_size=4096))
+    built_large = _peak(lambda: _Sink().write(json.dumps(large.emit())))
+    if payload_class is MDFPayload:
+        # nothing grows with the lists
+        assert streamed_large < 2 * streamed_small
+    # Citrine keeps an index of the people, but not their contact entries
+    assert streamed_large < built_large / 4
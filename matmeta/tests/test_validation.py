@@ -0,0 +1,96 @@
+import pytest
+
+from matmeta.frozen import freeze
+from matmeta.payload_metaclass import MCPayload, MDFPayload, _validate_inputs
+from matmeta.validation import (
+    ValidationError,
+    compile_requirements,
+    get_validator,
+    validate_many,
+)
+
+
+def _valid_record():
+    contact = {'given_name': 'Jane', 'family_name': 'Doe', 'email': 'jd@a.org'}
+    return {
+        'title': 'title',
+        'description': 'description',
+        'source': {'name': 'source'},
+        'data_contacts': [contact],
+        'data_contributors': [contact, contact],
+        'links': {'landing_page': 'http://landing.page'},
+    }
+
+
+def test_valid_record_has_no_problems():
+    assert get_validator().validate(_valid_record()) == []
+
+
+def test_every_problem_is_reported_with_keypath():
+    record = _valid_record()
+    del record['title']
+    record['source'] = {}
+    record['data_contributors'] = [
+        {'given_name': 'Jane', 'family_name': 'Doe', 'email': 'jd@a.org'},
+        {'given_name': 'John'},
+    ]
+    record['links'] = 'http://not.an.object'
+    problems = get_validator(['materials_data_facility']).validate(record)
+    assert sorted(problem.keypath for problem in problems) == [
+        'data_contributors[1].email',
+        'data_contributors[1].family_name',
+        'links',
+        'source.name',
+        'title',
+    ]
+
+
+def test_check_raises_validation_error():
+    record = _valid_record()
+    del record['description']
+    with pytest.raises(ValidationError) as excinfo:
+        MCPayload(**record)
+    assert [p.keypath for p in excinfo.value.problems] == ['description']
+    with pytest.raises(Exception):
+        MDFPayload(title='only a title')
+
+
+def test_validate_many_does_not_stop_at_bad_records():
+    good = _valid_record()
+    bad = dict(good, data_contacts=[{}])
+    results = validate_many([good, bad, good], services=['materials_data_facility'])
+    assert results[0] == [] and results[2] == []
+    assert len(results[1]) == 3
+
+
+def test_validators_are_cached():
+    assert get_validator(['citrine']) is get_validator(['citrine'])
+
+
+def test_validate_inputs_prefixes_keypath():
+    validator = compile_requirements({'name': 'string'})
+    assert validator.validate({'name': 'x'}) == []
+    with pytest.raises(ValidationError) as excinfo:
+        _validate_inputs({}, {'name': 'string'}, keypath='source')
+    assert excinfo.value.problems[0].keypath == 'source.name'
+
+
+def test_validate_inputs_compiles_frozen_specifications_once(monkeypatch):
+    from matmeta import payload_metaclass as pm
+    compiled = []
+
+    def compile_counted(requirements):
+        compiled.append(requirements)
+        return compile_requirements(requirements)
+    monkeypatch.setattr(pm, 'compile_requirements', compile_counted)
+    required = freeze({'name': 'string'})
+    for _ in range(3):
+        _validate_inputs({'name': 'x'}, required)
+    assert len(compiled) == 1
+    # plain dictionaries may change between calls, so they are not cached
+    required = {'name': 'string'}
+    _validate_inputs({'name': 'x'}, required)
+    required['title'] = 'string'
+    with pytest.raises(ValidationError):
+        _validate_inputs({'name': 'x'}, required)
+    assert len(compiled) == 3
@@ -0,0 +1,188 @@
+"""
+Compiled validators for common payload inputs.
+
+A requirement specification (see get_common_payload_template) is compiled
+once into a tree of small validator objects.  Checking a record is then a
+single pass over the record that collects every problem, including problems
+inside list-of-dict requirements such as 'data_contacts', instead of
+stopping at the first one.
+
+Compiled validators are cached per subset of services and recompiled only
+when the service registry's requirements change.
+"""
+
+from collections import namedtuple
+
+from matmeta.instrumentation import stage
+from matmeta.services import registry
+
+
+class ValidationProblem(namedtuple('ValidationProblem', ['keypath', 'message'])):
+    """
+    A single problem found in a record.
+
+    keypath is a dotted path to the offending field, with list indices in
+    brackets, e.g. 'data_contacts[0].email'.
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return '%s: %s' % (self.keypath, self.message)
+
+
+class ValidationError(Exception):
+    """
+    Raised when a record does not satisfy a service's requirements.
+
+    The problems attribute lists every ValidationProblem that was found.
+    """
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        super(ValidationError, self).__init__(
+            'Invalid input fields: %s' % '; '.join(str(p) for p in self.problems)
+        )
+
+
+def _keypath(path):
+    output = ''
+    for part in path:
+        if isinstance(part, int):
+            output += '[%d]' % part
+        elif output:
+            output += '.' + part
+        else:
+            output = part
+    return output or '<record>'
+
+
+class _Validator(object):
+    __slots__ = ()
+
+    def check(self, value, path, problems):
+        raise NotImplementedError
+
+
+class _Present(_Validator):
+    """Leaf requirement: the field only needs to be present."""
+    __slots__ = ()
+
+    def check(self, value, path, problems):
+        pass
+
+
+class _ListOf(_Validator):
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+    def check(self, value, path, problems):
+        if not isinstance(value, (list, tuple)):
+            problems.append(ValidationProblem(_keypath(path), 'expected a list'))
+            return
+        item = self.item
+        if isinstance(item, _Present):
+            return
+        for index, element in enumerate(value):
+            item.check(element, path + (index,), problems)
+
+
+class _Object(_Validator):
+    __slots__ = ('required', 'nested')
+
+    def __init__(self, required, nested):
+        self.required = required
+        self.nested = nested
+
+    def check(self, value, path, problems):
+        if not isinstance(value, dict):
+            problems.append(ValidationProblem(_keypath(path), 'expected an object'))
+            return
+        for key in self.required:
+            if key not in value:
+                problems.append(
+                    ValidationProblem(_keypath(path + (key,)), 'missing required field')
+                )
+        for key, validator in self.nested:
+            if key in value:
+                validator.check(value[key], path + (key,), problems)
+
+
+_PRESENT = _Present()
+
+
+def _compile(spec):
+    if isinstance(spec, dict):
+        return _Object(
+            required=tuple(spec),
+            nested=tuple(
+                (key, _compile(value)) for key, value in spec.items()
+                if isinstance(value, (dict, list))
+            )
+        )
+    if isinstance(spec, list):
+        return _ListOf(_compile(spec[0]) if spec else _PRESENT)
+    return _PRESENT
+
+
+class CompiledValidator(object):
+    """
+    A requirement specification compiled for repeated, single-pass checks.
+    """
+
+    def __init__(self, requirements):
+        self.requirements = requirements
+        self._root = _compile(requirements)
+
+    @stage('validate')
+    def validate(self, record):
+        """
+        Return a list of every ValidationProblem in record (empty if valid).
+        """
+        problems = []
+        self._root.check(record, (), problems)
+        return problems
+
+    def check(self, record):
+        """
+        Raise ValidationError if record has any problems.
+        """
+        problems = self.validate(record)
+        if problems:
+            raise ValidationError(problems)
+
+
+def compile_requirements(requirements):
+    return CompiledValidator(requirements)
+
+
+_validator_cache = {}
+
+
+def get_validator(services=None):
+    """
+    Return the compiled validator for the merged requirements of services.
+    """
+    key = registry.resolve(services)
+    requirements = registry.requirements(key)
+    cached = _validator_cache.get(key)
+    if cached is None or cached.requirements is not requirements:
+        cached = _validator_cache[key] = CompiledValidator(requirements)
+    return cached
+
+
+def validate_many(records, services=None):
+    """
+    Validate a batch of records without raising.
+
+    args:
+        records:    an iterable of common payload dictionaries
+        services:   a list of service names (None means all services)
+
+    return:
+        A list with one entry per record: the list of ValidationProblems
+        found in that record (empty if the record is valid).
+    """
+    validate = get_validator(services).validate
+    return [validate(record) for record in records]
@@ -9,7 +9,13 @@ setup(
     author_email="jasonthiese@gmail.com",
     license="Apache v2",
     packages=find_packages(),
+    python_requires='>=3.9',
     install_requires=[
         'pypif'
-    ]
+    ],
+    entry_points={
+        'console_scripts': [
+            'matmeta = matmeta.cli:main',
+        ],
+    },
 )